@@ -15,6 +15,7 @@ Example for llrf.filters and llrf.cavity_feedback
 
 import numpy as np
 from scipy.constants import e
+import scipy.signal
 import matplotlib.pyplot as plt
 import logging
 
@@ -242,8 +243,10 @@ if FINE_COARSE == True:
 
     OTFB = SPSOneTurnFeedback(rf, beam2, profile2, 3, n_cavities=1,
         Commissioning=CavityFeedbackCommissioning(open_FF=True))
-    V_beam_fine = -OTFB.matr_conv(rf_current_fine, h_beam_fine)
-    V_beam_coarse = -OTFB.matr_conv(rf_current_coarse, h_beam_coarse)
+    V_beam_fine = -scipy.signal.fftconvolve(rf_current_fine, h_beam_fine,
+        mode='full')[:rf_current_fine.shape[0]]
+    V_beam_coarse = -scipy.signal.fftconvolve(rf_current_coarse, h_beam_coarse,
+        mode='full')[:rf_current_coarse.shape[0]]
     print(len(time_fine), rf_current_fine.shape, V_beam_fine.shape)
     print(len(time_coarse), rf_current_coarse.shape, V_beam_coarse.shape)
 
@@ -21,9 +21,14 @@ import warnings
 import copy
 import matplotlib.pyplot as plt
 import numpy.random as rand
+from concurrent.futures import ThreadPoolExecutor
+from scipy.special import ndtri
+from scipy.stats import qmc
 
 #BLonD imports
 import blond.utils.exceptions as blExcept
+from blond.beam.distributions import _allocate_coordinates
+from blond.utils import bmath as bm
 
 
 
@@ -34,10 +39,26 @@ import blond.utils.exceptions as blExcept
 #according to dE/E = beta**2 * dP/P energy_offset gives an offset in dE for
 #the two standard distributions if a user_distribution is used it is taken as
 #being in dE
+#
+#dt and dE are drawn from the inverse cumulative distributions of a sequence
+#of points in the unit square, written in place into Beam.dt and Beam.dE by
+#chunks of chunk_size particles, generated by n_threads threads:
+#- sequence = 'random' with a seed: the point of the particle i is the block i
+#  of the counter-based random number generator (Philox) with key seed, so
+#  that the beam does not depend on chunk_size and n_threads; without a seed,
+#  the global numpy random number generator is used as before
+#- sequence = 'bit_reversed': quiet start, dt is uniformly spaced and dE is
+#  drawn from the bit-reversed particle index (Hammersley set)
+#- sequence = 'sobol': quiet start from the Sobol' sequence, scrambled with
+#  seed, with the best uniformity for a power of two of macroparticles
+#The quiet start loadings have a much lower initial noise than the random
+#one for the same number of macroparticles.
 def generate_coasting_beam(Beam, t_start, t_stop, spread = 1E-3, 
                            spread_type = 'dp/p', energy_offset = 0, 
                            distribution = 'gaussian' , user_distribution = None,
-                           user_probability = None):
+                           user_probability = None, seed = None,
+                           sequence = 'random', chunk_size = 2**20,
+                           n_threads = 1):
 
     if spread_type == 'dp/p':
         energy_spread = Beam.energy * Beam.beta**2 * spread
@@ -52,6 +73,108 @@ def generate_coasting_beam(Beam, t_start, t_stop, spread = 1E-3,
                                    " not recognised")
 
 
+    if distribution == 'gaussian':
+        def inverse_cdf(uniform):
+            dE = ndtri(uniform)
+            dE *= energy_spread
+            dE += energy_offset
+            return dE
+
+    elif distribution == 'parabolic':
+        #Inverse of the cumulative distribution (3x - x**3 + 2)/4
+        def inverse_cdf(uniform):
+            return energy_offset + 2 * energy_spread \
+                * np.sin(np.arcsin(2*uniform - 1) / 3)
+
+    #If distribution == 'user' is selected the user must supply a uniformly
+    #spaced distribution and the assosciated probability for each bin
+    #momentum_spread and energy_offset are not used in this instance.
+    elif distribution == 'user':
+        if user_distribution is None or user_probability is None:
+            raise blExcept.DistributionError("""Distribution 'user' requires
+                                             'user_distribution' and 
+                                             'user_probability' to be defined""")
+
+        #Piecewise linear cumulative distribution of the uniformly filled bins
+        user_distribution = np.asarray(user_distribution, dtype=float)
+        bin_size = user_distribution[1] - user_distribution[0]
+        edges = np.append(user_distribution - bin_size/2,
+                          user_distribution[-1] + bin_size/2)
+        cumulative = np.append(0, np.cumsum(user_probability, dtype=float))
+        cumulative /= cumulative[-1]
+
+        def inverse_cdf(uniform):
+            return np.interp(uniform, cumulative, edges)
+
+    else:
+        raise blExcept.DistributionError("distribution type not recognised")
+
+    if sequence not in ['random', 'bit_reversed', 'sobol']:
+        raise blExcept.DistributionError("sequence " + str(sequence) + \
+                                         " not recognised")
+    if chunk_size < 1 or n_threads < 1:
+        raise blExcept.GenerationError("chunk_size and n_threads should be "
+                                       + "at least 1")
+
+    if sequence == 'random' and seed is None:
+        _generate_numpy_random(Beam, t_start, t_stop, energy_spread,
+                               energy_offset, distribution, user_distribution,
+                               user_probability)
+        return
+
+    if seed is None:
+        seed = rand.SeedSequence().generate_state(1, np.uint64)[0]
+
+    n_macroparticles = int(Beam.n_macroparticles)
+    _allocate_coordinates(Beam)
+    n_bits = max(int(np.ceil(np.log2(n_macroparticles))), 1)
+
+    def generate_chunk(first):
+        last = min(first + chunk_size, n_macroparticles)
+
+        if sequence == 'random':
+            uniform_dt, uniform_dE = bm.philox_uniform(last - first, seed,
+                                                       first=first)
+
+        elif sequence == 'bit_reversed':
+            index = np.arange(first, last, dtype=np.uint64)
+            uniform_dt = (index + 0.5) / n_macroparticles
+            reversed_index = np.zeros_like(index)
+            for bit in range(n_bits):
+                reversed_index = (reversed_index << np.uint64(1)) \
+                    | ((index >> np.uint64(bit)) & np.uint64(1))
+            uniform_dE = (reversed_index + 0.5) / 2**n_bits
+
+        else:
+            sampler = qmc.Sobol(2, seed=seed)
+            if first > 0:
+                sampler.fast_forward(first)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                uniform = sampler.random(last - first)
+            uniform_dt = uniform[:, 0]
+            uniform_dE = uniform[:, 1]
+
+            #Open interval (0, 1) for the unbounded distributions
+            uniform_dE = np.clip(uniform_dE, 2**-54, 1 - 2**-53)
+
+        Beam.dt[first:last] = t_start + uniform_dt * (t_stop - t_start)
+        Beam.dE[first:last] = inverse_cdf(uniform_dE)
+
+    chunks = range(0, n_macroparticles, int(chunk_size))
+    if n_threads > 1:
+        with ThreadPoolExecutor(n_threads) as executor:
+            list(executor.map(generate_chunk, chunks))
+    else:
+        for first in chunks:
+            generate_chunk(first)
+
+
+
+def _generate_numpy_random(Beam, t_start, t_stop, energy_spread,
+                           energy_offset, distribution, user_distribution,
+                           user_probability):
+
     if distribution == 'gaussian':
         Beam.dE = rand.normal(loc = energy_offset, scale = energy_spread, \
                         size = Beam.n_macroparticles)
@@ -67,21 +190,10 @@ def generate_coasting_beam(Beam, t_start, t_stop, spread = 1E-3,
                             * (energyRange[1] - energyRange[0]) \
                             + energy_offset
 
-    #If distribution == 'user' is selected the user must supply a uniformly
-    #spaced distribution and the assosciated probability for each bin
-    #momentum_spread and energy_offset are not used in this instance.
     elif distribution == 'user':
-        if user_distribution is None or user_probability is None:
-            raise blExcept.DistributionError("""Distribution 'user' requires
-                                             'user_distribution' and 
-                                             'user_probability' to be defined""")
-            
         Beam.dE = rand.choice(user_distribution, size = Beam.n_macroparticles, \
                               p = user_probability) \
                               + (rand.rand(Beam.n_macroparticles) - 0.5) \
                               * (user_distribution[1] - user_distribution[0])
 
-    else:
-        raise blExcept.DistributionError("distribution type not recognised")
-
     Beam.dt = rand.rand(Beam.n_macroparticles)*(t_stop - t_start) + t_start
@@ -19,14 +19,18 @@ from __future__ import division, print_function, absolute_import
 from builtins import str
 from builtins import range
 import numpy as np
+import numpy.random as rnd
 import warnings
 import copy
 import gc
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 from scipy.integrate import cumtrapz
-from ..trackers.utilities import is_in_separatrix
+from ..trackers.utilities import BucketState
 from ..beam.profile import Profile, CutOptions
-from ..trackers.utilities import potential_well_cut, minmax_location
+from ..trackers.utilities import potential_well_cut, minmax_location, \
+    action_from_potential_well
 from ..utils import bmath as bm
 
 def matched_from_line_density(beam, full_ring_and_RF, line_density_input=None,
@@ -230,49 +234,22 @@ def matched_from_line_density(beam, full_ring_and_RF, line_density_input=None,
         line_den_diff_abel = np.interp(time_abel, time_half, line_den_diff)
         potential_abel = np.interp(time_abel, time_half, potential_half)
         
-        distribution_function_ = np.zeros(n_points_abel)
-        hamiltonian_coord = np.zeros(n_points_abel) 
-        
-        # Abel transform
-        warnings.filterwarnings("ignore")
-        
+        # Abel transform, integrating from the edge of the half towards the
+        # center; the singular end point is integrated analytically
         if (half_option == 'first') or (half_option == 'both' and
                                         abel_index == 0):
-            for i in range(0, n_points_abel):
-                integrand = (line_den_diff_abel[:i+1] /
-                             np.sqrt(potential_abel[:i+1] - potential_abel[i]))
-                        
-                if len(integrand)>2:
-                    integrand[-1] = integrand[-2] + (integrand[-2] -
-                                                     integrand[-3])
-                elif len(integrand)>1:
-                    integrand[-1] = integrand[-2]
-                else:
-                    integrand = np.array([0])
-                    
-                distribution_function_[i] = (np.sqrt(eom_factor_dE) / np.pi *
-                    np.trapz(integrand, dx=line_den_resolution))
-        
-                hamiltonian_coord[i] = potential_abel[i]
-                
+            distribution_function_ = (np.sqrt(eom_factor_dE) / np.pi *
+                bm.abel_transform(potential_abel, line_den_diff_abel,
+                                  dx=line_den_resolution))
+
         if (half_option == 'second') or (half_option == 'both' and
                                          abel_index == 1):
-            for i in range(0, n_points_abel):
-                integrand = (line_den_diff_abel[i:] /
-                             np.sqrt(potential_abel[i:] - potential_abel[i]))
-    
-                if len(integrand)>2:
-                    integrand[0] = integrand[1] + (integrand[2] - integrand[1])
-                if len(integrand)>1:
-                    integrand[0] = integrand[1]
-                else:
-                    integrand = np.array([0])
-    
-                distribution_function_[i] = -(np.sqrt(eom_factor_dE) / np.pi *
-                                   np.trapz(integrand, dx=line_den_resolution))
-                hamiltonian_coord[i] = potential_abel[i]
-        
-        warnings.filterwarnings("default")
+            distribution_function_ = -(np.sqrt(eom_factor_dE) / np.pi *
+                bm.abel_transform(potential_abel[::-1],
+                                  line_den_diff_abel[::-1],
+                                  dx=line_den_resolution)[::-1])
+
+        hamiltonian_coord = np.copy(potential_abel)
     
         # Cleaning the distribution function from unphysical results
         distribution_function_[np.isnan(distribution_function_)] = 0
@@ -364,6 +341,213 @@ def matched_from_line_density(beam, full_ring_and_RF, line_density_input=None,
         return [hamiltonian_coord, distribution_function_],\
                [time_line_den, line_density_]
 
+class MatchedBucket(object):
+    '''
+    *Potential well cut around the separatrix, with the H and J grids in
+    phase space and the H(J) relation, on which matched_from_distribution_function
+    generates a bunch. The H(J) relation is computed from a single potential
+    well at high resolution with action_from_potential_well. The bucket does
+    not depend on the distribution, so
+    that bunches of any distribution type, emittance or bunch length can be
+    generated in the same bucket; the buckets of the RF potential well alone
+    are cached by matched_bucket.*
+
+    Parameters
+    ----------
+    full_ring_and_RF : class
+        A FullRingAndRF type class
+    time_potential : float array
+        Time coordinates of the potential well [s]
+    potential_well : float array
+        Total potential well, RF and intensity effects
+    eom_factor_dE : float
+        Factor of the kinetic part of the Hamiltonian, abs(eta)/(2 beta^2 E)
+    turn_number : int
+        Turn of the RF parameters of the high resolution potential well
+    main_harmonic_option : str or float
+        Main harmonic of the high resolution potential well
+    n_points_grid : int
+        Number of points of the grids in time and energy
+    n_points_high_res : int
+        Number of points of the high resolution potential well across the
+        separatrix, on which the action is computed
+    process_pot_well : bool
+        Cut the potential well around the separatrix
+    added_potential : float array
+        Potential added to the high resolution potential well, on
+        time_potential, e.g. the induced potential
+
+    Attributes
+    ----------
+    time_potential_low_res : float array
+        Time coordinates of the grid [s]
+    deltaE_coord_array : float array
+        Energy coordinates of the grid [eV]
+    time_grid, deltaE_grid : float matrix
+        Time and energy of the grid points
+    H_array_dE0, J_array_dE0 : float array
+        Hamiltonian and action of the particles at zero energy offset
+    sorted_H_dE0, sorted_J_dE0 : float array
+        H(J) relation sorted in H
+    H_grid, J_grid : float matrix
+        Hamiltonian and action of the grid points
+    '''
+
+    def __init__(self, full_ring_and_RF, time_potential, potential_well,
+                 eom_factor_dE, turn_number=0,
+                 main_harmonic_option='lowest_freq', n_points_grid=int(1e3),
+                 n_points_high_res=int(1e6), process_pot_well=True,
+                 added_potential=None):
+
+        n_points_grid = int(n_points_grid)
+        n_points_high_res = int(n_points_high_res)
+
+        # Process the potential well in order to take a frame around the separatrix
+        if process_pot_well == False:
+            time_potential_sep, potential_well_sep = time_potential, potential_well
+        else:
+            time_potential_sep, potential_well_sep = potential_well_cut(time_potential, potential_well)
+
+        # Potential is shifted to put the minimum on 0
+        potential_well_sep = potential_well_sep - np.min(potential_well_sep)
+
+        # Compute deltaE frame corresponding to the separatrix
+        max_potential = np.max(potential_well_sep)
+        max_deltaE = np.sqrt(max_potential / eom_factor_dE)
+
+        # Initializing the grids by reducing the resolution to a
+        # n_points_grid*n_points_grid frame
+        self.time_potential_low_res = np.linspace(float(time_potential_sep[0]),
+                                                  float(time_potential_sep[-1]),
+                                                  n_points_grid)
+        self.time_resolution_low = (self.time_potential_low_res[1] -
+                                    self.time_potential_low_res[0])
+        self.deltaE_coord_array = np.linspace(-float(max_deltaE),
+                                              float(max_deltaE), n_points_grid)
+        potential_well_low_res = np.interp(self.time_potential_low_res,
+                                        time_potential_sep, potential_well_sep)
+        self.time_grid, self.deltaE_grid = np.meshgrid(
+            self.time_potential_low_res, self.deltaE_coord_array)
+        potential_well_grid = np.meshgrid(potential_well_low_res,
+                                          potential_well_low_res)[0]
+
+        # Computing the action J from the potential well at high resolution
+        time_potential_high_res = np.linspace(float(time_potential_sep[0]),
+                                              float(time_potential_sep[-1]),
+                                              n_points_high_res)
+        full_ring_and_RF2 = copy.deepcopy(full_ring_and_RF)
+        full_ring_and_RF2.potential_well_generation(
+                                 turn=turn_number, n_points=n_points_high_res,
+                                 time_array=time_potential_high_res,
+                                 main_harmonic_option=main_harmonic_option)
+        pot_well_high_res = full_ring_and_RF2.potential_well
+        del full_ring_and_RF2
+
+        if added_potential is not None:
+            pot_well_high_res += np.interp(time_potential_high_res,
+                                           time_potential, added_potential,
+                                           left=0, right=0)
+            pot_well_high_res -= pot_well_high_res.min()
+
+        self.J_array_dE0 = action_from_potential_well(time_potential_high_res,
+                                                      pot_well_high_res,
+                                                      potential_well_low_res,
+                                                      eom_factor_dE)
+
+        # Sorting the H and J functions to be able to interpolate J(H)
+        self.H_array_dE0 = potential_well_low_res
+        self.sorted_H_dE0 = self.H_array_dE0[self.H_array_dE0.argsort()]
+        self.sorted_J_dE0 = self.J_array_dE0[self.H_array_dE0.argsort()]
+
+        # Calculating the H and J grid
+        self.H_grid = eom_factor_dE * self.deltaE_grid**2 + potential_well_grid
+        self.J_grid = np.interp(self.H_grid, self.sorted_H_dE0,
+                                self.sorted_J_dE0, left=0, right=np.inf)
+
+
+#: *Buckets of the RF potential wells, by RF parameters and options, from
+#: the least to the most recently used*
+_matched_buckets = OrderedDict()
+
+#: *Maximum number of buckets kept by matched_bucket; 0 disables the cache*
+max_matched_buckets = 2
+
+
+def clear_matched_buckets():
+    '''
+    *Remove the buckets kept by matched_bucket.*
+    '''
+
+    _matched_buckets.clear()
+
+
+def _rf_state(full_ring_and_RF, turn):
+    '''
+    *RF parameters entering the potential well at the given turn.*
+    '''
+
+    state = []
+    for RingAndRFSectionElement in full_ring_and_RF.RingAndRFSection_list:
+        rf_params = RingAndRFSectionElement.rf_params
+        state += [rf_params.Particle.charge, rf_params.t_rev[turn],
+                  rf_params.eta_0[turn], rf_params.beta[turn],
+                  rf_params.energy[turn],
+                  RingAndRFSectionElement.acceleration_kick[turn]]
+        for rf_system in range(rf_params.n_rf):
+            state += [rf_params.voltage[rf_system, turn],
+                      rf_params.omega_rf[rf_system, turn],
+                      rf_params.phi_rf[rf_system, turn]]
+
+    return tuple(float(value) for value in state)
+
+
+def matched_bucket(full_ring_and_RF, turn_number=0,
+                   main_harmonic_option='lowest_freq', n_points_potential=1e4,
+                   n_points_grid=int(1e3), dt_margin_percent=0.40,
+                   process_pot_well=True):
+    '''
+    *MatchedBucket of the RF potential well of full_ring_and_RF at the turn
+    turn_number, without intensity effects. The bucket is computed once for
+    given RF parameters and options, and reused as long as they are the same;
+    the max_matched_buckets most recently used buckets are kept.*
+    '''
+
+    key = (_rf_state(full_ring_and_RF, turn_number), main_harmonic_option,
+           int(n_points_potential), int(n_points_grid),
+           float(dt_margin_percent), bool(process_pot_well))
+
+    if max_matched_buckets > 0 and key in _matched_buckets:
+        _matched_buckets.move_to_end(key)
+        return _matched_buckets[key]
+
+    else:
+        rf_params = full_ring_and_RF.RingAndRFSection_list[0].rf_params
+        eom_factor_dE = (abs(rf_params.eta_0[turn_number]) /
+                         (2*rf_params.beta[turn_number]**2. *
+                          rf_params.energy[turn_number]))
+
+        full_ring_and_RF.potential_well_generation(turn=turn_number,
+                                    n_points=int(n_points_potential),
+                                    dt_margin_percent=dt_margin_percent,
+                                    main_harmonic_option=main_harmonic_option)
+
+        bucket = MatchedBucket(full_ring_and_RF,
+                               full_ring_and_RF.potential_well_coordinates,
+                               full_ring_and_RF.potential_well,
+                               eom_factor_dE, turn_number=turn_number,
+                               main_harmonic_option=main_harmonic_option,
+                               n_points_grid=n_points_grid,
+                               process_pot_well=process_pot_well)
+
+        while _matched_buckets and \
+                len(_matched_buckets) >= max_matched_buckets:
+            _matched_buckets.popitem(last=False)
+        if max_matched_buckets > 0:
+            _matched_buckets[key] = bucket
+
+        return bucket
+
+
 def matched_from_distribution_function(beam, full_ring_and_RF,
                                distribution_function_input=None,
                                distribution_user_table=None,
@@ -450,7 +634,6 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
         induced_voltage_object = copy.deepcopy(TotalInducedVoltage)
         profile = induced_voltage_object.profile
         
-    dE_trajectory = np.zeros(n_points_potential)
     for i in range(n_iterations):    
         old_potential = copy.deepcopy(total_potential)
         
@@ -463,82 +646,35 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
         print('Matching the bunch... (iteration: ' + str(i) + ' and sse: ' +
               str(sse) +')')
                 
-        # Process the potential well in order to take a frame around the separatrix
-        if process_pot_well == False:
-            time_potential_sep, potential_well_sep = time_potential, total_potential
+        if i == 0 and extraVoltageDict is None:
+            # Bucket of the RF potential well alone, shared between calls
+            bucket = matched_bucket(full_ring_and_RF,
+                                    turn_number=turn_number,
+                                    main_harmonic_option=main_harmonic_option,
+                                    n_points_potential=n_points_potential,
+                                    n_points_grid=n_points_grid,
+                                    dt_margin_percent=dt_margin_percent,
+                                    process_pot_well=process_pot_well)
         else:
-            time_potential_sep, potential_well_sep = potential_well_cut(time_potential, total_potential)
+            bucket = MatchedBucket(full_ring_and_RF, time_potential,
+                                   total_potential, eom_factor_dE,
+                                   turn_number=turn_number,
+                                   main_harmonic_option=main_harmonic_option,
+                                   n_points_grid=n_points_grid,
+                                   process_pot_well=process_pot_well,
+                                   added_potential=total_potential -
+                                   potential_well)
 
-        # Potential is shifted to put the minimum on 0
-        potential_well_sep = potential_well_sep - np.min(potential_well_sep)
-        
-        # Compute deltaE frame corresponding to the separatrix
-        max_potential = np.max(potential_well_sep)
-        max_deltaE = np.sqrt(max_potential / eom_factor_dE)
-        
-        # Initializing the grids by reducing the resolution to a
-        # n_points_grid*n_points_grid frame
-        time_potential_low_res = np.linspace(float(time_potential_sep[0]),
-                                             float(time_potential_sep[-1]),
-                                             n_points_grid)
-        time_resolution_low = (time_potential_low_res[1] -
-                               time_potential_low_res[0])
-        deltaE_coord_array = np.linspace(-float(max_deltaE), float(max_deltaE),
-                                         n_points_grid)
-        potential_well_low_res = np.interp(time_potential_low_res,
-                                        time_potential_sep, potential_well_sep)
-        time_grid, deltaE_grid = np.meshgrid(time_potential_low_res,
-                                             deltaE_coord_array)
-        potential_well_grid = np.meshgrid(potential_well_low_res,
-                                          potential_well_low_res)[0]
-        
-        # Computing the action J by integrating the dE trajectories
-        J_array_dE0 = np.zeros(n_points_grid)
-        
-        full_ring_and_RF2 = copy.deepcopy(full_ring_and_RF)
-        for j in range(n_points_grid):
-            # Find left and right time coordinates for a given hamiltonian 
-            # value
-            time_indexes = np.where(potential_well_low_res <= 
-                                    potential_well_low_res[j])[0]
-            left_time = time_potential_low_res[np.max((0,time_indexes[0]))]
-            right_time = time_potential_low_res[np.min((time_indexes[-1],
-                                                        n_points_grid-1))]
-            # Potential well calculation with high resolution in that frame
-            time_potential_high_res = np.linspace(float(left_time), float(right_time),
-                                                  n_points_potential)
-            full_ring_and_RF2.potential_well_generation(
-                                     n_points=n_points_potential,
-                                     time_array=time_potential_high_res,
-                                     main_harmonic_option=main_harmonic_option)
-            pot_well_high_res = full_ring_and_RF2.potential_well
-            
-            if TotalInducedVoltage is not None and i != 0:
-                induced_potential_hires = np.interp(time_potential_high_res,
-                                           time_potential, induced_potential +
-                                           extra_potential, left=0, right=0)
-                pot_well_high_res += induced_potential_hires
-                pot_well_high_res -= pot_well_high_res.min()
-            
-            # Integration to calculate action
-            dE_trajectory[pot_well_high_res <= potential_well_low_res[j]] = \
-                np.sqrt((potential_well_low_res[j] - 
-                pot_well_high_res[pot_well_high_res <= 
-                potential_well_low_res[j]]) / eom_factor_dE)
-            dE_trajectory[pot_well_high_res > potential_well_low_res[j]] = 0
-            
-            J_array_dE0[j] = 1 / np.pi * np.trapz(dE_trajectory,
-                    dx=time_potential_high_res[1] - time_potential_high_res[0])
-            
-        # Sorting the H and J functions to be able to interpolate J(H)
-        H_array_dE0 = potential_well_low_res
-        sorted_H_dE0 = H_array_dE0[H_array_dE0.argsort()]
-        sorted_J_dE0 = J_array_dE0[H_array_dE0.argsort()]
-        
-        # Calculating the H and J grid
-        H_grid = eom_factor_dE * deltaE_grid**2 + potential_well_grid
-        J_grid = np.interp(H_grid, sorted_H_dE0, sorted_J_dE0, left=0,
-                           right=np.inf)
+        time_potential_low_res = bucket.time_potential_low_res
+        time_resolution_low = bucket.time_resolution_low
+        deltaE_coord_array = bucket.deltaE_coord_array
+        time_grid = bucket.time_grid
+        deltaE_grid = bucket.deltaE_grid
+        H_array_dE0 = bucket.H_array_dE0
+        sorted_H_dE0 = bucket.sorted_H_dE0
+        sorted_J_dE0 = bucket.sorted_J_dE0
+        H_grid = bucket.H_grid
+        J_grid = bucket.J_grid
         
         # Choice of either H or J as the variable used
         if distribution_variable == 'Action':
@@ -612,7 +748,6 @@ def matched_from_distribution_function(beam, full_ring_and_RF,
             induced_potential = np.interp(time_potential,
                              time_potential_low_res, induced_potential_low_res,
                              left=0, right=0)
-        del full_ring_and_RF2
         gc.collect()            
     # Populating the bunch
     populate_bunch(beam, time_grid, deltaE_grid, density_grid, 
@@ -710,24 +845,92 @@ def X0_from_bunch_length(bunch_length, bunch_length_fit, X_grid, sorted_X_dE0,
 #    return 0.5 * (X_low + X_hi)
     return X0
 
+def _allocate_coordinates(beam):
+    '''
+    *Allocates beam.dt and beam.dE, unless they already are contiguous
+    arrays of n_macroparticles in the precision of the simulation, to be
+    filled in place.*
+    '''
+
+    n_macroparticles = int(beam.n_macroparticles)
+    for coordinate in ['dt', 'dE']:
+        array = getattr(beam, coordinate)
+        if (array.shape != (n_macroparticles,)
+                or array.dtype != bm.precision.real_t
+                or not array.flags['C_CONTIGUOUS']):
+            setattr(beam, coordinate,
+                    np.empty(n_macroparticles, dtype=bm.precision.real_t))
+
+
 def populate_bunch(beam, time_grid, deltaE_grid, density_grid, time_step,
-                   deltaE_step, seed):
+                   deltaE_step, seed, chunk_size=2**20, n_threads=1):
     '''
     *Method to populate the bunch using a random number generator from the
     particle density in phase space.*
+
+    *The grid cell of each particle is drawn by inverse transform sampling
+    of the cumulative density of the occupied cells, accelerated by a guide
+    table, then the particle is placed uniformly inside its cell. The random numbers of the
+    particle i are the block i of the counter-based random number generator
+    (Philox) with key 'seed', so that the bunch depends neither on the number
+    of particles generated at once (chunk_size) nor on the number of threads
+    generating the chunks (n_threads). The coordinates are written in place
+    into beam.dt and beam.dE.*
     '''
-    # Initialise the random number generator
-    np.random.seed(seed=seed)
-    # Generating particles randomly inside the grid cells according to the
-    # provided density_grid
-    indexes = np.random.choice(np.arange(0,np.size(density_grid)), 
-                               beam.n_macroparticles, p=density_grid.flatten())
-    
-    # Randomize particles inside each grid cell (uniform distribution)
-    beam.dt = (np.ascontiguousarray(time_grid.flatten()[indexes] +
-                                    (np.random.rand(beam.n_macroparticles) - 0.5) * time_step)).astype(dtype=bm.precision.real_t, order='C', copy=False)
-    beam.dE = (np.ascontiguousarray(deltaE_grid.flatten()[indexes] +
-                                    (np.random.rand(beam.n_macroparticles) - 0.5) * deltaE_step)).astype(dtype=bm.precision.real_t, order='C', copy=False)
+
+    if chunk_size < 1 or n_threads < 1:
+        #GenerationError
+        raise RuntimeError('The chunk_size and n_threads of populate_bunch ' +
+                           'should be at least 1')
+    if seed is None:
+        seed = rnd.SeedSequence().entropy
+
+    # Cumulative density of the occupied cells
+    cells = np.flatnonzero(density_grid)
+    cumulative_density = np.cumsum(np.ravel(density_grid)[cells],
+                                   dtype=np.float64)
+    cumulative_density /= cumulative_density[-1]
+    time_cells = np.ravel(time_grid)[cells]
+    deltaE_cells = np.ravel(deltaE_grid)[cells]
+
+    # Guide table, first cell of each of the n_guide equal intervals of the
+    # cumulative density
+    n_guide = len(cells)
+    guide = np.searchsorted(cumulative_density,
+                            np.arange(n_guide) / n_guide, side='right')
+
+    n_macroparticles = int(beam.n_macroparticles)
+    _allocate_coordinates(beam)
+
+    def populate_chunk(first):
+        last = min(first + chunk_size, n_macroparticles)
+        # One block of four random numbers per particle: cell, dt, dE
+        random = rnd.Generator(rnd.Philox(key=seed).advance(first)).random(
+            (last - first, 4))
+        # The cell is one of the first ones of the interval of the random
+        # number in the guide table, or, rarely, found by binary search
+        uniform = random[:, 0]
+        indexes = guide[(uniform * n_guide).astype(int)]
+        search = np.flatnonzero(cumulative_density[indexes] <= uniform)
+        for step in range(4):
+            indexes[search] += 1
+            search = search[cumulative_density[indexes[search]] <=
+                            uniform[search]]
+        indexes[search] = np.searchsorted(cumulative_density,
+                                          uniform[search], side='right')
+        # Randomize particles inside each grid cell (uniform distribution)
+        beam.dt[first:last] = (time_cells[indexes] +
+                               (random[:, 1] - 0.5) * time_step)
+        beam.dE[first:last] = (deltaE_cells[indexes] +
+                               (random[:, 2] - 0.5) * deltaE_step)
+
+    chunks = range(0, n_macroparticles, int(chunk_size))
+    if n_threads > 1:
+        with ThreadPoolExecutor(n_threads) as executor:
+            list(executor.map(populate_chunk, chunks))
+    else:
+        for first in chunks:
+            populate_chunk(first)
 
 def distribution_function(action_array, dist_type, length, exponent=None):
     '''
@@ -815,7 +1018,8 @@ def bigaussian(Ring, RFStation, Beam, sigma_dt, sigma_dE = None, seed = 1234,
         R.m.s. extension of the Gaussian in energy; default is None and will
         match the energy coordinate according to bucket height and sigma_dt
     seed : int (optional)
-        Fixed seed to have a reproducible distribution
+        Fixed seed to have a reproducible distribution, for any number of
+        threads; a random seed is used if None
     reinsertion : bool (optional)
         Re-insert particles that are generated outside the separatrix into the
         bucket; default in False
@@ -860,26 +1064,23 @@ def bigaussian(Ring, RFStation, Beam, sigma_dt, sigma_dE = None, seed = 1234,
     Beam.sigma_dt = sigma_dt
     Beam.sigma_dE = sigma_dE
     
-    # Generate coordinates. For reproducibility, a separate random number stream is used for dt and dE
-    rng_dt = np.random.default_rng(seed)
-    rng_dE = np.random.default_rng(seed+1)
-    
-    Beam.dt = sigma_dt * rng_dt.normal(size=Beam.n_macroparticles).astype(dtype=bm.precision.real_t, order='C', copy=False) + \
-        (phi_s - phi_rf)/omega_rf
-    Beam.dE = sigma_dE * rng_dE.normal(size=Beam.n_macroparticles).astype(dtype=bm.precision.real_t, order='C')
-    
-    # Re-insert if necessary
+    if seed is None:
+        seed = rnd.SeedSequence().generate_state(1, np.uint64)[0]
+
+    # Generate coordinates in place. The particle i is drawn from the block
+    # (i, 0) of the counter-based random number generator (Philox) with key
+    # 'seed', and reinserted from the blocks (i, 1), (i, 2)..., so that the
+    # beam depends neither on the number of threads nor on the splitting of
+    # the particles
+    _allocate_coordinates(Beam)
+    hamiltonian_parameters = None
     if reinsertion == True:
-        
-        itemindex = np.where(is_in_separatrix(Ring, 
-            RFStation, Beam, Beam.dt, Beam.dE) == False)[0]
-         
-        while itemindex.size != 0:
-            
-            Beam.dt[itemindex] = sigma_dt * rng_dt.normal(size=itemindex.size).astype(dtype=bm.precision.real_t, order='C', copy=False) \
-                + (phi_s - phi_rf)/omega_rf
-            
-            Beam.dE[itemindex] = sigma_dE * rng_dE.normal(size=itemindex.size).astype(dtype=bm.precision.real_t, order='C')
-            
-            itemindex = np.where(is_in_separatrix(Ring,
-                                                  RFStation, Beam, Beam.dt, Beam.dE) == False)[0]
+        hamiltonian_parameters = BucketState(Ring, RFStation, Beam). \
+            hamiltonian_parameters
+    n_outside = bm.bigaussian(Beam.dt, Beam.dE, seed,
+                              (phi_s - phi_rf)/omega_rf, sigma_dt, sigma_dE,
+                              hamiltonian_parameters=hamiltonian_parameters)
+    if n_outside > 0:
+        #DistributionError
+        raise RuntimeError('In bigaussian(), %d particles could not be ' %
+                           n_outside + 'reinserted into the bucket')
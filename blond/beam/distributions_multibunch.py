@@ -8,6 +8,8 @@ from __future__ import division, print_function, absolute_import
 from builtins import range
 import numpy as np
 import copy
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import matplotlib.pyplot as plt
 from scipy.integrate import cumtrapz
 import gc
@@ -19,25 +21,222 @@ from ..beam.distributions import matched_from_distribution_function,\
                            distribution_function, potential_well_cut,\
                            X0_from_bunch_length
 
-def matched_from_distribution_density_multibunch(beam, Ring, FullRingAndRF, distribution_options_list,
-                                      n_bunches, bunch_spacing_buckets,
-                                      intensity_list = None,
-                                      minimum_n_macroparticles = None,
-                                      main_harmonic_option = 'lowest_freq',
-                                      TotalInducedVoltage = None,
-                                      n_iterations_input = 1,
-                                      plot_option = False, seed=None):
+# Ring, RF and induced voltage of the bunches matched in a worker process
+_worker_state = None
+
+
+def _init_worker(Ring, FullRingAndRF, TotalInducedVoltage):
     '''
-    *Function to generate a multi-bunch beam using the matched_from_distribution_density
-    function for each bunch. The extra parameters to include are the number of
-    bunches and the spacing between two bunches (assumed constant presently).
-    Moreover, the distribution_options_list corresponds to the distribution_options
-    of the matched_from_distribution_density function. It can be inputed as
-    a dictionary just like the matched_from_distribution_density function (assuming
-    the same parameters for all bunches), or as a list of length n_bunches
-    to have different parameters for each bunch.*
+    *Stores the objects shared by all the bunches matched in a worker
+    process, sent once per process.*
+    '''
+
+    global _worker_state
+    _worker_state = (Ring, FullRingAndRF, TotalInducedVoltage)
+
+
+def _match_bunch(match_function, n_macroparticles, intensity, options,
+                 state=None):
+    '''
+    *Generates one bunch with the matching function and the options of the
+    bunch; returns its coordinates.*
     '''
 
+    if state is None:
+        state = _worker_state
+    Ring, FullRingAndRF, TotalInducedVoltage = state
+
+    bunch = Beam(Ring, n_macroparticles, intensity)
+    match_function(bunch, FullRingAndRF,
+                   TotalInducedVoltage=TotalInducedVoltage, **options)
+
+    return bunch.dt, bunch.dE
+
+
+def _bunch_seeds(seed, n_bunches):
+    '''
+    *Seed of each bunch, derived deterministically from the seed of the beam;
+    without seed, from a random one.*
+    '''
+
+    return [int(bunch_seed) for bunch_seed in
+            np.random.SeedSequence(seed).generate_state(n_bunches)]
+
+
+def _bunch_induced_voltage(TotalInducedVoltageIteration, index_bunch,
+                           bunch_spacing_buckets, bucket_size_tau,
+                           bucket_tolerance=0.40):
+    '''
+    *Induced voltage in the bucket of the bunch index_bunch, in the time frame
+    of the bunch, as extraVoltageDict of the matching functions.*
+    '''
+
+    bunch_position = index_bunch * bunch_spacing_buckets * bucket_size_tau
+    left_edge = bunch_position - bucket_tolerance * bucket_size_tau
+    right_edge = bunch_position + (1 + bucket_tolerance) * bucket_size_tau
+
+    bin_centers = TotalInducedVoltageIteration.profile.bin_centers
+    indexes = (bin_centers > left_edge) * (bin_centers < right_edge)
+
+    return {'time_array': bin_centers[indexes] - bunch_position,
+            'voltage_array':
+                TotalInducedVoltageIteration.induced_voltage[indexes]}
+
+
+def _match_bunches(beam, Ring, FullRingAndRF, TotalInducedVoltage,
+                   match_function, options_list, n_macroparticles_per_bunch,
+                   intensity_per_bunch, bunch_positions, n_processes=1):
+    '''
+    *Matches the bunches independently of each other, in a pool of n_processes
+    processes, and writes their coordinates into the slices of the beam. The
+    processes are spawned, as forking them after the OpenMP threads of the C++
+    library were started deadlocks them.*
+    '''
+
+    n_bunches = len(options_list)
+    edges = np.concatenate(([0], np.cumsum(n_macroparticles_per_bunch))
+                           ).astype(int)
+    arguments = ([match_function] * n_bunches,
+                 [int(n) for n in n_macroparticles_per_bunch],
+                 list(intensity_per_bunch), options_list)
+
+    if n_processes > 1:
+        executor = ProcessPoolExecutor(
+            n_processes, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(Ring, FullRingAndRF, TotalInducedVoltage))
+        results = executor.map(_match_bunch, *arguments)
+    else:
+        executor = None
+        state = (Ring, FullRingAndRF, TotalInducedVoltage)
+        results = map(_match_bunch, *arguments, [state] * n_bunches)
+
+    try:
+        for index_bunch, (dt, dE) in enumerate(results):
+            print('Generating bunch no %d' %(index_bunch+1))
+            beam.dt[edges[index_bunch]:edges[index_bunch+1]] = \
+                dt + bunch_positions[index_bunch]
+            beam.dE[edges[index_bunch]:edges[index_bunch+1]] = dE
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def _allocate_beam(beam, n_macroparticles_per_bunch):
+    '''
+    *Coordinate arrays of the whole beam, filled bunch by bunch.*
+    '''
+
+    n_macroparticles = int(np.sum(n_macroparticles_per_bunch))
+    if len(beam.dt) != n_macroparticles:
+        beam.dt = np.zeros(n_macroparticles, dtype=bm.precision.real_t)
+        beam.dE = np.zeros(n_macroparticles, dtype=bm.precision.real_t)
+        beam.id = np.arange(1, n_macroparticles + 1, dtype=int)
+
+
+def _match_multibunch(beam, Ring, FullRingAndRF, TotalInducedVoltage,
+                      match_function, options_list, n_macroparticles_per_bunch,
+                      intensity_per_bunch, bunch_spacing_buckets,
+                      bucket_size_tau, n_processes, shared_potential_iterations,
+                      plot_option):
+    '''
+    *Matches the bunches one after the other to the induced voltage of the
+    previous ones, or, without induced voltage or with
+    shared_potential_iterations, all of them independently.*
+    '''
+
+    n_bunches = len(options_list)
+    bunch_positions = (np.arange(n_bunches) * bunch_spacing_buckets
+                       * bucket_size_tau)
+    edges = np.concatenate(([0], np.cumsum(n_macroparticles_per_bunch))
+                           ).astype(int)
+    _allocate_beam(beam, n_macroparticles_per_bunch)
+
+    if TotalInducedVoltage is None:
+        _match_bunches(beam, Ring, FullRingAndRF, None, match_function,
+                       options_list, n_macroparticles_per_bunch,
+                       intensity_per_bunch, bunch_positions, n_processes)
+        return
+
+    beamIteration = Beam(Ring, 1, 0.)
+    TotalInducedVoltageIteration = copy.deepcopy(TotalInducedVoltage)
+    TotalInducedVoltageIteration.profile.Beam = beamIteration
+
+    if shared_potential_iterations > 0:
+        # All bunches in the induced voltage of the whole beam of the
+        # previous round, starting without
+        beamIteration.dt = beam.dt
+        beamIteration.dE = beam.dE
+        beamIteration.n_macroparticles = int(edges[-1])
+        beamIteration.intensity = np.sum(intensity_per_bunch)
+        beamIteration.ratio = (beamIteration.intensity
+                               / beamIteration.n_macroparticles)
+
+        options_round = options_list
+        for iteration in range(shared_potential_iterations + 1):
+            if iteration > 0:
+                TotalInducedVoltageIteration.profile.track()
+                TotalInducedVoltageIteration.induced_voltage_sum()
+                options_round = [dict(options, extraVoltageDict=
+                    _bunch_induced_voltage(TotalInducedVoltageIteration,
+                                           index_bunch, bunch_spacing_buckets,
+                                           bucket_size_tau))
+                    for index_bunch, options in enumerate(options_list)]
+
+            _match_bunches(beam, Ring, FullRingAndRF, None, match_function,
+                           options_round, n_macroparticles_per_bunch,
+                           intensity_per_bunch, bunch_positions, n_processes)
+        return
+
+    # Bunch by bunch, in the induced voltage of the previous bunches
+    extraVoltageDict = None
+    state = (Ring, FullRingAndRF, TotalInducedVoltage)
+    for index_bunch in range(n_bunches):
+
+        print('Generating bunch no %d' %(index_bunch+1))
+
+        dt, dE = _match_bunch(match_function,
+                              int(n_macroparticles_per_bunch[index_bunch]),
+                              intensity_per_bunch[index_bunch],
+                              dict(options_list[index_bunch],
+                                   extraVoltageDict=extraVoltageDict),
+                              state)
+        beam.dt[edges[index_bunch]:edges[index_bunch+1]] = \
+            dt + bunch_positions[index_bunch]
+        beam.dE[edges[index_bunch]:edges[index_bunch+1]] = dE
+
+        beamIteration.dt = beam.dt[:edges[index_bunch+1]]
+        beamIteration.dE = beam.dE[:edges[index_bunch+1]]
+        beamIteration.n_macroparticles = int(edges[index_bunch+1])
+        beamIteration.intensity = np.sum(intensity_per_bunch[:index_bunch+1])
+        beamIteration.ratio = (beamIteration.intensity
+                               / beamIteration.n_macroparticles)
+
+        TotalInducedVoltageIteration.profile.track()
+        TotalInducedVoltageIteration.induced_voltage_sum()
+
+        extraVoltageDict = _bunch_induced_voltage(
+            TotalInducedVoltageIteration, index_bunch+1,
+            bunch_spacing_buckets, bucket_size_tau)
+
+        if plot_option:
+            plt.figure('Bunch train + induced voltage')
+            plt.clf()
+            plt.plot(TotalInducedVoltageIteration.profile.bin_centers,
+                     TotalInducedVoltageIteration.profile.n_macroparticles /
+                     (1.*np.max(TotalInducedVoltageIteration.profile.n_macroparticles)) *
+                     np.max(TotalInducedVoltageIteration.induced_voltage))
+            plt.plot(TotalInducedVoltageIteration.profile.bin_centers,
+                     TotalInducedVoltageIteration.induced_voltage)
+            plt.show()
+
+
+def _bunch_parameters(beam, Ring, FullRingAndRF, n_bunches, intensity_list,
+                      minimum_n_macroparticles, main_harmonic_option):
+    '''
+    *Intensity and number of macro-particles of each bunch, and the length of
+    the bucket of the main harmonic.*
+    '''
 
     if intensity_list is None:
         intensity_per_bunch = beam.intensity/n_bunches * np.ones(n_bunches)
@@ -48,12 +247,12 @@ def matched_from_distribution_density_multibunch(beam, Ring, FullRingAndRF, dist
             n_macroparticles_per_bunch = np.round(beam.n_macroparticles/beam.intensity * intensity_per_bunch)
         else:
             n_macroparticles_per_bunch = np.round(minimum_n_macroparticles/np.min(intensity_per_bunch) * intensity_per_bunch)
+    n_macroparticles_per_bunch = n_macroparticles_per_bunch.astype(int)
 
     if np.sum(intensity_per_bunch) != beam.intensity:
         print('WARNING !! The total intensity per bunch does not match the total intensity of the beam, the beam.intensity will be overwritten')
         beam.intensity = np.sum(intensity_per_bunch)
 
-
     if np.sum(n_macroparticles_per_bunch) != beam.n_macroparticles:
         print('WARNING !! The number of macroparticles per bunch does not match the total number of the beam, the beam.n_macroparticles will be overwritten')
         beam.n_macroparticles = int(np.sum(n_macroparticles_per_bunch))
@@ -78,21 +277,48 @@ def matched_from_distribution_density_multibunch(beam, Ring, FullRingAndRF, dist
 
     bucket_size_tau = 2 * np.pi / (main_harmonic * Ring.omega_rev[0])
 
-    beamIteration = Beam(Ring, 1, 0.)
+    return intensity_per_bunch, n_macroparticles_per_bunch, bucket_size_tau
 
-    extraVoltageDict = None
-
-    if TotalInducedVoltage is not None:
-        bucket_tolerance = 0.40
-        TotalInducedVoltageIteration = copy.deepcopy(TotalInducedVoltage)
-        TotalInducedVoltageIteration.profile.Beam = beamIteration
 
+def matched_from_distribution_density_multibunch(beam, Ring, FullRingAndRF, distribution_options_list,
+                                      n_bunches, bunch_spacing_buckets,
+                                      intensity_list = None,
+                                      minimum_n_macroparticles = None,
+                                      main_harmonic_option = 'lowest_freq',
+                                      TotalInducedVoltage = None,
+                                      n_iterations_input = 1,
+                                      plot_option = False, seed=None,
+                                      n_processes = 1,
+                                      shared_potential_iterations = 0):
+    '''
+    *Function to generate a multi-bunch beam using the matched_from_distribution_density
+    function for each bunch. The extra parameters to include are the number of
+    bunches and the spacing between two bunches (assumed constant presently).
+    Moreover, the distribution_options_list corresponds to the distribution_options
+    of the matched_from_distribution_density function. It can be inputed as
+    a dictionary just like the matched_from_distribution_density function (assuming
+    the same parameters for all bunches), or as a list of length n_bunches
+    to have different parameters for each bunch.*
 
-    for indexBunch in range(0, n_bunches):
+    *Each bunch gets its own seed, derived from 'seed'. With intensity
+    effects, the bunches are matched one after the other, each in the induced
+    voltage of the previous ones. Otherwise, or with
+    shared_potential_iterations > 0, the bunches are matched independently in
+    n_processes processes; shared_potential_iterations is then the number of
+    rounds in which all bunches are matched again in the induced voltage of
+    the whole beam of the previous round. The processes are spawned, so a
+    script using n_processes > 1 has to run under
+    "if __name__ == '__main__':".*
+    '''
 
-        print('Generating bunch no %d' %(indexBunch+1))
+    intensity_per_bunch, n_macroparticles_per_bunch, bucket_size_tau = \
+        _bunch_parameters(beam, Ring, FullRingAndRF, n_bunches,
+                          intensity_list, minimum_n_macroparticles,
+                          main_harmonic_option)
 
-        bunch = Beam(Ring, int(n_macroparticles_per_bunch[indexBunch]), intensity_per_bunch[indexBunch])
+    bunch_seeds = _bunch_seeds(seed, n_bunches)
+    options_list = []
+    for indexBunch in range(0, n_bunches):
 
         if isinstance(distribution_options_list, list):
             distribution_options = distribution_options_list[indexBunch]
@@ -146,69 +372,23 @@ def matched_from_distribution_density_multibunch(beam, Ring, FullRingAndRF, dist
         else:
             distribution_user_table = None
 
-        matched_from_distribution_function(bunch, FullRingAndRF,
+        options_list.append(dict(
                        distribution_function_input=distribution_function_input,
                        distribution_user_table=distribution_user_table,
                        main_harmonic_option=main_harmonic_option,
-                       TotalInducedVoltage=TotalInducedVoltage,
                        n_iterations=n_iterations_input,
-                       extraVoltageDict=extraVoltageDict,
                        distribution_exponent=distribution_exponent,
                        distribution_type=distribution_type,
                        emittance=emittance, bunch_length=bunch_length,
                        bunch_length_fit=bunch_length_fit,
-                       distribution_variable=distribution_variable, seed=seed)
-
-        if indexBunch==0:
-            beamIteration.dt = bunch.dt
-            beamIteration.dE = bunch.dE
-        else:
-            beamIteration.dt = np.append(beamIteration.dt, bunch.dt +
-                        (indexBunch * bunch_spacing_buckets * bucket_size_tau))
-            beamIteration.dE = np.append(beamIteration.dE, bunch.dE)
-
-        beamIteration.n_macroparticles = int(np.sum(n_macroparticles_per_bunch[:indexBunch+1]))
-        beamIteration.intensity = np.sum(intensity_per_bunch[:indexBunch+1])
-        beamIteration.ratio = beamIteration.intensity / beamIteration.n_macroparticles
-
-
-        if TotalInducedVoltage is not None:
-            TotalInducedVoltageIteration.profile.track()
-            TotalInducedVoltageIteration.induced_voltage_sum()
-
-            left_edge = ((indexBunch + 1) * bunch_spacing_buckets *
-                          bucket_size_tau - bucket_tolerance * bucket_size_tau)
-            right_edge = (((indexBunch + 1) * bunch_spacing_buckets + 1) *
-                          bucket_size_tau + bucket_tolerance * bucket_size_tau)
-
-            bin_centers = TotalInducedVoltageIteration.profile.bin_centers
-
-            tau_induced_voltage_next_bunch = bin_centers[
-                        (bin_centers > left_edge) * (bin_centers < right_edge)]
-            induced_voltage_next_bunch = \
-                        TotalInducedVoltageIteration.induced_voltage[
-                        (bin_centers > left_edge) * (bin_centers < right_edge)]
-
-            time_induced_voltage_next_bunch = (tau_induced_voltage_next_bunch -
-                      (indexBunch+1) * bunch_spacing_buckets * bucket_size_tau)
-
-            extraVoltageDict = {'time_array':time_induced_voltage_next_bunch,
-                                'voltage_array':induced_voltage_next_bunch}
-
-
-        if plot_option:
-            plt.figure('Bunch train + induced voltage')
-            plt.clf()
-            plt.plot(TotalInducedVoltageIteration.profile.bin_centers,
-                     TotalInducedVoltageIteration.profile.n_macroparticles /
-                     (1.*np.max(TotalInducedVoltageIteration.profile.n_macroparticles)) *
-                     np.max(TotalInducedVoltageIteration.induced_voltage))
-            plt.plot(TotalInducedVoltageIteration.profile.bin_centers,
-                     TotalInducedVoltageIteration.induced_voltage)
-            plt.show()
-                
-    beam.dt = beamIteration.dt.astype(dtype=bm.precision.real_t, order='C', copy=False)
-    beam.dE = beamIteration.dE.astype(dtype=bm.precision.real_t, order='C', copy=False)
+                       distribution_variable=distribution_variable,
+                       seed=bunch_seeds[indexBunch]))
+
+    _match_multibunch(beam, Ring, FullRingAndRF, TotalInducedVoltage,
+                      matched_from_distribution_function, options_list,
+                      n_macroparticles_per_bunch, intensity_per_bunch,
+                      bunch_spacing_buckets, bucket_size_tau, n_processes,
+                      shared_potential_iterations, plot_option)
     gc.collect()
 
 
@@ -218,7 +398,8 @@ def matched_from_line_density_multibunch(beam, Ring,
                         minimum_n_macroparticles=None,
                         main_harmonic_option='lowest_freq',
                         TotalInducedVoltage=None, half_option='first',
-                        plot_option=False, seed=None):
+                        plot_option=False, seed=None, n_processes=1,
+                        shared_potential_iterations=0):
     '''
     *Function to generate a multi-bunch beam using the matched_from_distribution_density
     function for each bunch. The extra parameters to include are the number of
@@ -228,63 +409,20 @@ def matched_from_line_density_multibunch(beam, Ring,
     a dictionary just like the matched_from_line_density function (assuming
     the same parameters for all bunches), or as a list of length n_bunches
     to have different parameters for each bunch.*
-    '''
-
-    if intensity_list is None:
-        intensity_per_bunch = beam.intensity/n_bunches * np.ones(n_bunches)
-        n_macroparticles_per_bunch = beam.n_macroparticles/n_bunches * np.ones(n_bunches)
-    else:
-        intensity_per_bunch = np.array(intensity_list)
-        if minimum_n_macroparticles is None:
-            n_macroparticles_per_bunch = np.round(beam.n_macroparticles/beam.intensity * intensity_per_bunch)
-        else:
-            n_macroparticles_per_bunch = np.round(minimum_n_macroparticles/np.min(intensity_per_bunch) * intensity_per_bunch)
-
-    if np.sum(intensity_per_bunch) != beam.intensity:
-        print('WARNING !! The total intensity per bunch does not match the total intensity of the beam, the beam.intensity will be overwritten')
-        beam.intensity = np.sum(intensity_per_bunch)
 
-    if np.sum(n_macroparticles_per_bunch) != beam.n_macroparticles:
-        print('WARNING !! The number of macroparticles per bunch does not match the total number of the beam, the beam.n_macroparticles will be overwritten')
-        beam.n_macroparticles = int(np.sum(n_macroparticles_per_bunch))
-
-    voltages = np.array([])
-    harmonics = np.array([])
-
-    for RingAndRFSectionElement in FullRingAndRF.RingAndRFSection_list:
-            for rf_system in range(RingAndRFSectionElement.rf_params.n_rf):
-                voltages = np.append(voltages, RingAndRFSectionElement.rf_params.voltage[rf_system, 0])
-                harmonics = np.append(harmonics, RingAndRFSectionElement.rf_params.harmonic[rf_system, 0])
-
-    if main_harmonic_option == 'lowest_freq':
-            main_harmonic = np.min(harmonics)
-    elif main_harmonic_option == 'highest_voltage':
-        main_harmonic = np.min(harmonics[voltages == np.max(voltages)])
-    elif isinstance(main_harmonic_option, int) or isinstance(main_harmonic_option, float):
-        if harmonics[harmonics == main_harmonic_option].size == 0:
-            #GenerationError
-            raise RuntimeError('The desired harmonic to compute the potential well does not match the RF parameters...')
-        main_harmonic = np.min(harmonics[harmonics == main_harmonic_option])
-
-    bucket_size_tau = 2 * np.pi / (main_harmonic * Ring.omega_rev[0])
-
-    beamIteration = Beam(Ring, 1, 0.)
-
-    extraVoltageDict = None
-
-    if TotalInducedVoltage is not None:
-        TotalInducedVoltageIteration = copy.deepcopy(TotalInducedVoltage)
-        TotalInducedVoltageIteration.profile.Beam = beamIteration
+    *The seeds, n_processes and shared_potential_iterations are as in
+    matched_from_distribution_density_multibunch.*
+    '''
 
+    intensity_per_bunch, n_macroparticles_per_bunch, bucket_size_tau = \
+        _bunch_parameters(beam, Ring, FullRingAndRF, n_bunches,
+                          intensity_list, minimum_n_macroparticles,
+                          main_harmonic_option)
 
+    bunch_seeds = _bunch_seeds(seed, n_bunches)
+    options_list = []
     for indexBunch in range(0, n_bunches):
 
-        print('Generating bunch no %d' %(indexBunch+1))
-
-        bunch = Beam(Ring,
-                     int(n_macroparticles_per_bunch[indexBunch]),
-                     intensity_per_bunch[indexBunch])
-
         if isinstance(line_density_options_list, list):
             line_density_options = line_density_options_list[indexBunch]
         elif isinstance(line_density_options_list, dict):
@@ -321,55 +459,21 @@ def matched_from_line_density_multibunch(beam, Ring,
         else:
             line_density_input = None
 
-        matched_from_line_density(bunch, FullRingAndRF,
+        options_list.append(dict(
                               line_density_input=line_density_input,
                               main_harmonic_option=main_harmonic_option,
-                              TotalInducedVoltage=TotalInducedVoltage,
-                              plot=plot_option, half_option=half_option,
-                              extraVoltageDict=extraVoltageDict,
+                              plot=plot_option and n_processes == 1,
+                              half_option=half_option,
                               bunch_length=bunch_length,
                               line_density_type=line_density_type,
                               line_density_exponent=line_density_exponent,
-                              seed=seed)
+                              seed=bunch_seeds[indexBunch]))
 
-        if indexBunch==0:
-            beamIteration.dt = bunch.dt
-            beamIteration.dE = bunch.dE
-        else:
-            beamIteration.dt = np.append(beamIteration.dt, bunch.dt +
-                        (indexBunch * bunch_spacing_buckets * bucket_size_tau))
-            beamIteration.dE = np.append(beamIteration.dE, bunch.dE)
-
-        beamIteration.n_macroparticles = int(np.sum(n_macroparticles_per_bunch[:indexBunch+1]))
-        beamIteration.intensity = np.sum(intensity_per_bunch[:indexBunch+1])
-        beamIteration.ratio = beamIteration.intensity/beamIteration.n_macroparticles
-
-        if TotalInducedVoltage is not None:
-            TotalInducedVoltageIteration.profile.track()
-            TotalInducedVoltageIteration.induced_voltage_sum()
-
-            bucket_tolerance = 0.40
-
-            left_edge = (indexBunch+1) * bunch_spacing_buckets * bucket_size_tau - bucket_tolerance * bucket_size_tau
-            right_edge = ((indexBunch+1) * bunch_spacing_buckets +1)* bucket_size_tau + bucket_tolerance * bucket_size_tau
-
-            tau_induced_voltage_next_bunch = TotalInducedVoltageIteration.profile.bin_centers[(TotalInducedVoltageIteration.profile.bin_centers > left_edge)*(TotalInducedVoltageIteration.profile.bin_centers < right_edge)]
-            induced_voltage_next_bunch = TotalInducedVoltageIteration.induced_voltage[(TotalInducedVoltageIteration.profile.bin_centers > left_edge)*(TotalInducedVoltageIteration.profile.bin_centers < right_edge)]
-
-            time_induced_voltage_next_bunch = (tau_induced_voltage_next_bunch - (indexBunch+1) * bunch_spacing_buckets * bucket_size_tau)
-
-            extraVoltageDict = {'time_array':time_induced_voltage_next_bunch, 'voltage_array':induced_voltage_next_bunch}
-
-
-    if plot_option:
-        plt.figure('Bunch train + induced voltage')
-        plt.clf()
-        plt.plot(TotalInducedVoltageIteration.profile.bin_centers, TotalInducedVoltageIteration.profile.n_macroparticles / (1.*np.max(TotalInducedVoltageIteration.profile.n_macroparticles))*np.max(TotalInducedVoltageIteration.induced_voltage))
-        plt.plot(TotalInducedVoltageIteration.profile.bin_centers, TotalInducedVoltageIteration.induced_voltage)
-        plt.show()
-                
-    beam.dt = beamIteration.dt.astype(dtype=bm.precision.real_t, order='C', copy=False)
-    beam.dE = beamIteration.dE.astype(dtype=bm.precision.real_t, order='C', copy=False)
+    _match_multibunch(beam, Ring, FullRingAndRF, TotalInducedVoltage,
+                      matched_from_line_density, options_list,
+                      n_macroparticles_per_bunch, intensity_per_bunch,
+                      bunch_spacing_buckets, bucket_size_tau, n_processes,
+                      shared_potential_iterations, plot_option)
     gc.collect()
 
 
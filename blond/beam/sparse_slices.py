@@ -44,8 +44,11 @@ class SparseSlices(object):
         # bucket*
         self.filling_pattern = filling_pattern
 
-        # Bunch index for each filled bucket (-1 if empty). Only for C++ track
-        self.bunch_indexes = np.cumsum(filling_pattern) * filling_pattern - 1
+        # Bunch index for each bucket from the first filled one (-1 if empty).
+        # Only for C++ track
+        self.bunch_indexes = (np.cumsum(filling_pattern) * filling_pattern
+                              - 1)[np.flatnonzero(filling_pattern)[0]:]
+        self.bunch_indexes = self.bunch_indexes.astype(bm.precision.real_t)
 
         #: *Number of buckets to be sliced*
         self.n_filled_buckets = int(np.sum(filling_pattern))
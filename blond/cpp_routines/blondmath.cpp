@@ -20,11 +20,149 @@ C++ Math library
 #include <cmath>
 #include <algorithm>
 #include <functional>
+#include <cstdint>
 #include "blondmath.h"
 #include "openmp.h"
 
 using namespace std;
 
+
+// Single RF sinusoidal Hamiltonian of the bucket, with the slippage factor up
+// to the second order
+struct SinusoidalHamiltonian {
+    double k[3];
+    double delta_factor, potential_factor, omega_rf, phi_rf;
+    double sin_phi_s, constant, phase_offset, phase_wrap;
+
+    SinusoidalHamiltonian(const double * __restrict__ eta, const int n_eta,
+                          const double delta_factor,
+                          const double kinetic_factor,
+                          const double potential_factor,
+                          const double omega_rf, const double phi_rf,
+                          const double phi_s, const int phase_modulo)
+        : delta_factor(delta_factor), potential_factor(potential_factor),
+          omega_rf(omega_rf), phi_rf(phi_rf)
+    {
+        for (int j = 0; j < 3; j++)
+            k[j] = (j < n_eta) ? kinetic_factor * eta[j] : 0.;
+        sin_phi_s = sin(phi_s);
+        constant = -cos(phi_s) - phi_s * sin_phi_s;
+        phase_offset = (phase_modulo < 0) ? 0.5 : 0.;
+        phase_wrap = (phase_modulo != 0) ? 2. * M_PI : 0.;
+    }
+
+    inline double operator()(const double dt, const double dE) const
+    {
+        const double delta = dE * delta_factor;
+        const double eta_delta = (k[2] * delta + k[1]) * delta + k[0];
+        double phi_b = omega_rf * dt + phi_rf;
+        phi_b -= phase_wrap * floor(phi_b / (2. * M_PI) + phase_offset);
+
+        return eta_delta * dE * dE
+               + potential_factor * (vdt::fast_cos(phi_b)
+                                     + phi_b * sin_phi_s + constant);
+    }
+};
+
+
+// Philox4x32-10 counter-based random number generator (Salmon et al., SC11):
+// replaces the counter ctr by four random 32-bit words
+static inline void philox4x32(uint32_t * __restrict__ ctr, uint32_t key0,
+                              uint32_t key1)
+{
+    for (int round = 0; round < 10; round++) {
+        if (round > 0) {
+            key0 += 0x9E3779B9;
+            key1 += 0xBB67AE85;
+        }
+        const uint64_t product0 = (uint64_t) 0xD2511F53 * ctr[0];
+        const uint64_t product1 = (uint64_t) 0xCD9E8D57 * ctr[2];
+        const uint32_t ctr0 = (uint32_t) (product1 >> 32) ^ ctr[1] ^ key0;
+        const uint32_t ctr2 = (uint32_t) (product0 >> 32) ^ ctr[3] ^ key1;
+        ctr[0] = ctr0;
+        ctr[1] = (uint32_t) product1;
+        ctr[2] = ctr2;
+        ctr[3] = (uint32_t) product0;
+    }
+}
+
+
+// Two uniform random numbers in [0, 1) with 53 random bits from the Philox
+// block (index, stream)
+static inline void philox_uniform_pair(const uint64_t index,
+                                       const uint32_t stream,
+                                       const uint32_t key0,
+                                       const uint32_t key1,
+                                       double &u1, double &u2)
+{
+    uint32_t ctr[4] = {(uint32_t) index, (uint32_t) (index >> 32), stream,
+                       0
+                      };
+    philox4x32(ctr, key0, key1);
+    u1 = ((ctr[0] >> 5) * 67108864. + (ctr[1] >> 6)) / 9007199254740992.;
+    u2 = ((ctr[2] >> 5) * 67108864. + (ctr[3] >> 6)) / 9007199254740992.;
+}
+
+
+// Normal random numbers (x, y) from the Box-Muller transform of the Philox
+// block (index, attempt)
+static inline void philox_normal(const uint64_t index, const uint32_t attempt,
+                                 const uint32_t key0, const uint32_t key1,
+                                 double &x, double &y)
+{
+    double u1, u2;
+    philox_uniform_pair(index, attempt, key0, key1, u1, u2);
+    const double radius = sqrt(-2. * log(1. - u1));
+    vdt::fast_sincos(2. * M_PI * u2, y, x);
+    x *= radius;
+    y *= radius;
+}
+
+
+// Gaussian coordinates of the particles first, ..., first + n - 1 from the
+// Philox block (index, 0); with hamiltonian, the particles outside the
+// separatrix are drawn again from the blocks (index, 1), (index, 2)...
+// Returns the number of particles still outside after max_attempts.
+template <typename T>
+static int bigaussian_coordinates(T * __restrict__ dt, T * __restrict__ dE,
+                                  const int n, const uint64_t first,
+                                  const uint64_t seed, const double mean_dt,
+                                  const double sigma_dt,
+                                  const double sigma_dE,
+                                  const SinusoidalHamiltonian *hamiltonian,
+                                  const double H_sep, const int max_attempts)
+{
+    const uint32_t key0 = (uint32_t) seed;
+    const uint32_t key1 = (uint32_t) (seed >> 32);
+
+    #pragma omp parallel for
+    for (int i = 0; i < n; i++) {
+        double x, y;
+        philox_normal(first + i, 0, key0, key1, x, y);
+        dt[i] = (T) (mean_dt + sigma_dt * x);
+        dE[i] = (T) (sigma_dE * y);
+    }
+    if (hamiltonian == nullptr)
+        return 0;
+
+    const double abs_H_sep = fabs(H_sep);
+    int n_outside = 0;
+    #pragma omp parallel for reduction(+:n_outside)
+    for (int i = 0; i < n; i++) {
+        uint32_t attempt = 1;
+        bool inside = fabs((*hamiltonian)(dt[i], dE[i])) < abs_H_sep;
+        for (; !inside && attempt < (uint32_t) max_attempts; attempt++) {
+            double x, y;
+            philox_normal(first + i, attempt, key0, key1, x, y);
+            dt[i] = (T) (mean_dt + sigma_dt * x);
+            dE[i] = (T) (sigma_dE * y);
+            inside = fabs((*hamiltonian)(dt[i], dE[i])) < abs_H_sep;
+        }
+        n_outside += !inside;
+    }
+    return n_outside;
+}
+
 extern "C" {
 
     void where_more_than(const double *__restrict__ data, const int n,
@@ -602,6 +740,183 @@ extern "C" {
         return deltaX * psum;;
     }
 
+// Abel transform of the derivative f of a line density in a potential well,
+// integrating from the first point up to each point i. The integrand
+// f[j]/sqrt(potential[j]-potential[i]) is integrated with the trapezoid rule
+// up to i-1, and the singular last interval analytically, for a potential
+// and f linear over the interval.
+    void abel_transform(const double * __restrict__ potential,
+                        const double * __restrict__ f,
+                        const double deltaX,
+                        const int n,
+                        double * __restrict__ result)
+    {
+        if (n > 0)
+            result[0] = 0.0;
+
+        #pragma omp parallel for schedule(dynamic, 64)
+        for (int i = 1; i < n; ++i) {
+            const double p = potential[i];
+            double psum = 0.0;
+            for (int j = 0; j < i; ++j)
+                psum += f[j] / sqrt(potential[j] - p);
+            psum -= (f[0] / sqrt(potential[0] - p)
+                     + f[i - 1] / sqrt(potential[i - 1] - p)) / 2.;
+
+            psum += (4. * f[i] + 2. * f[i - 1]) / 3.
+                    / sqrt(potential[i - 1] - p);
+
+            result[i] = deltaX * psum;
+        }
+    }
+
+// Single RF sinusoidal Hamiltonian of the particles. H is stored in
+// hamiltonian if not null, otherwise |H| < |H_sep| in inside if not null;
+// with neither, returns the number of particles inside the separatrix.
+    int bucket_hamiltonian(const double * __restrict__ dt,
+                           const double * __restrict__ dE,
+                           const int n,
+                           const double * __restrict__ eta,
+                           const int n_eta,
+                           const double delta_factor,
+                           const double kinetic_factor,
+                           const double potential_factor,
+                           const double omega_rf,
+                           const double phi_rf,
+                           const double phi_s,
+                           const int phase_modulo,
+                           const double H_sep,
+                           double * __restrict__ hamiltonian,
+                           bool * __restrict__ inside)
+    {
+        const SinusoidalHamiltonian H(eta, n_eta, delta_factor,
+                                      kinetic_factor, potential_factor,
+                                      omega_rf, phi_rf, phi_s, phase_modulo);
+        const double abs_H_sep = fabs(H_sep);
+
+        int n_inside = 0;
+        if (hamiltonian) {
+            #pragma omp parallel for
+            for (int i = 0; i < n; i++)
+                hamiltonian[i] = H(dt[i], dE[i]);
+        }
+        else if (inside) {
+            #pragma omp parallel for
+            for (int i = 0; i < n; i++)
+                inside[i] = fabs(H(dt[i], dE[i])) < abs_H_sep;
+        }
+        else {
+            #pragma omp parallel for reduction(+:n_inside)
+            for (int i = 0; i < n; i++)
+                n_inside += fabs(H(dt[i], dE[i])) < abs_H_sep;
+        }
+        return n_inside;
+    }
+
+// Energy of the separatrix through the unstable fixed point dt_ufp, NaN where
+// it does not exist; dt is projected onto the RF period starting at -dt_offset
+// when period > 0.
+    void bucket_separatrix(const double * __restrict__ dt,
+                           const int n,
+                           const double * __restrict__ voltage,
+                           const double * __restrict__ omega_rf,
+                           const double * __restrict__ phi_rf,
+                           const int n_rf,
+                           const double dt_ufp,
+                           const double delta_E,
+                           const double factor,
+                           const double dt_offset,
+                           const double period,
+                           double * __restrict__ result)
+    {
+        double V_ufp = delta_E * dt_ufp;
+        for (int j = 0; j < n_rf; j++)
+            V_ufp += voltage[j] * cos(omega_rf[j] * dt_ufp + phi_rf[j])
+                     / omega_rf[j];
+
+        #pragma omp parallel for
+        for (int i = 0; i < n; i++) {
+            double t = dt[i];
+            if (period > 0)
+                t -= period * floor((t + dt_offset) / period);
+
+            double V = V_ufp - delta_E * t;
+            for (int j = 0; j < n_rf; j++)
+                V -= voltage[j] * vdt::fast_cos(omega_rf[j] * t + phi_rf[j])
+                     / omega_rf[j];
+
+            const double separatrix_sq = factor * V;
+            result[i] = (separatrix_sq >= 0) ? sqrt(separatrix_sq) : NAN;
+        }
+    }
+
+// Bigaussian distribution, reproducible for a given seed whatever the number
+// of threads, see bigaussian_coordinates
+    int bigaussian(double * __restrict__ dt, double * __restrict__ dE,
+                   const int n, const uint64_t first, const uint64_t seed,
+                   const double mean_dt, const double sigma_dt,
+                   const double sigma_dE, const bool reinsertion,
+                   const double * __restrict__ eta, const int n_eta,
+                   const double delta_factor, const double kinetic_factor,
+                   const double potential_factor, const double omega_rf,
+                   const double phi_rf, const double phi_s,
+                   const int phase_modulo, const double H_sep,
+                   const int max_attempts)
+    {
+        const SinusoidalHamiltonian H(eta, n_eta, delta_factor,
+                                      kinetic_factor, potential_factor,
+                                      omega_rf, phi_rf, phi_s, phase_modulo);
+        return bigaussian_coordinates(dt, dE, n, first, seed, mean_dt,
+                                      sigma_dt, sigma_dE,
+                                      reinsertion ? &H : nullptr, H_sep,
+                                      max_attempts);
+    }
+
+    int bigaussianf(float * __restrict__ dt, float * __restrict__ dE,
+                    const int n, const uint64_t first, const uint64_t seed,
+                    const double mean_dt, const double sigma_dt,
+                    const double sigma_dE, const bool reinsertion,
+                    const double * __restrict__ eta, const int n_eta,
+                    const double delta_factor, const double kinetic_factor,
+                    const double potential_factor, const double omega_rf,
+                    const double phi_rf, const double phi_s,
+                    const int phase_modulo, const double H_sep,
+                    const int max_attempts)
+    {
+        const SinusoidalHamiltonian H(eta, n_eta, delta_factor,
+                                      kinetic_factor, potential_factor,
+                                      omega_rf, phi_rf, phi_s, phase_modulo);
+        return bigaussian_coordinates(dt, dE, n, first, seed, mean_dt,
+                                      sigma_dt, sigma_dE,
+                                      reinsertion ? &H : nullptr, H_sep,
+                                      max_attempts);
+    }
+
+// Uniform random numbers u1[i], u2[i] in the open interval (0, 1) from the
+// Philox block (first + i, stream), whatever the number of threads
+    void philox_uniform(double * __restrict__ u1, double * __restrict__ u2,
+                        const int n, const uint64_t first,
+                        const uint64_t seed, const uint32_t stream)
+    {
+        const uint32_t key0 = (uint32_t) seed;
+        const uint32_t key1 = (uint32_t) (seed >> 32);
+        const double half_step = 1. / 18014398509481984.;
+
+        #pragma omp parallel for
+        for (int i = 0; i < n; i++) {
+            philox_uniform_pair(first + i, stream, key0, key1, u1[i], u2[i]);
+            u1[i] += half_step;
+            u2[i] += half_step;
+        }
+    }
+
+// Philox4x32-10 block of the counter ctr[4] with the key key[2], in place
+    void philox4x32_10(uint32_t * __restrict__ ctr,
+                       const uint32_t * __restrict__ key)
+    {
+        philox4x32(ctr, key[0], key[1]);
+    }
+
     int min_idx(const double * __restrict__ a, int size)
     {
         return (int) (std::min_element(a, a + size) - a);
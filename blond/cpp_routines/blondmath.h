@@ -14,6 +14,7 @@ C++ Math library
 */
 
 #include <complex>
+#include <cstdint>
 
 extern "C" {
   void where_more_than(const double *__restrict__ data, const int n,
@@ -216,6 +217,76 @@ extern "C" {
                            const double deltaX,
                            const int nsub);
 
+  // Abel transform of f in the potential well, from the first point up to
+  // each point; the singular last interval is integrated analytically
+  void abel_transform(const double * __restrict__ potential,
+                      const double * __restrict__ f,
+                      const double deltaX,
+                      const int n,
+                      double * __restrict__ result);
+
+  // Single RF sinusoidal Hamiltonian, inside flags or number of particles
+  // inside the separatrix
+  int bucket_hamiltonian(const double * __restrict__ dt,
+                         const double * __restrict__ dE,
+                         const int n,
+                         const double * __restrict__ eta,
+                         const int n_eta,
+                         const double delta_factor,
+                         const double kinetic_factor,
+                         const double potential_factor,
+                         const double omega_rf,
+                         const double phi_rf,
+                         const double phi_s,
+                         const int phase_modulo,
+                         const double H_sep,
+                         double * __restrict__ hamiltonian,
+                         bool * __restrict__ inside);
+
+  // Energy of the separatrix through the unstable fixed point
+  void bucket_separatrix(const double * __restrict__ dt,
+                         const int n,
+                         const double * __restrict__ voltage,
+                         const double * __restrict__ omega_rf,
+                         const double * __restrict__ phi_rf,
+                         const int n_rf,
+                         const double dt_ufp,
+                         const double delta_E,
+                         const double factor,
+                         const double dt_offset,
+                         const double period,
+                         double * __restrict__ result);
+
+  // Bigaussian distribution from a counter-based random number generator,
+  // with the reinsertion of the particles outside the separatrix
+  int bigaussian(double * __restrict__ dt, double * __restrict__ dE,
+                 const int n, const uint64_t first, const uint64_t seed,
+                 const double mean_dt, const double sigma_dt,
+                 const double sigma_dE, const bool reinsertion,
+                 const double * __restrict__ eta, const int n_eta,
+                 const double delta_factor, const double kinetic_factor,
+                 const double potential_factor, const double omega_rf,
+                 const double phi_rf, const double phi_s,
+                 const int phase_modulo, const double H_sep,
+                 const int max_attempts);
+  int bigaussianf(float * __restrict__ dt, float * __restrict__ dE,
+                  const int n, const uint64_t first, const uint64_t seed,
+                  const double mean_dt, const double sigma_dt,
+                  const double sigma_dE, const bool reinsertion,
+                  const double * __restrict__ eta, const int n_eta,
+                  const double delta_factor, const double kinetic_factor,
+                  const double potential_factor, const double omega_rf,
+                  const double phi_rf, const double phi_s,
+                  const int phase_modulo, const double H_sep,
+                  const int max_attempts);
+
+  // Uniform random numbers from the counter-based random number generator
+  void philox_uniform(double * __restrict__ u1, double * __restrict__ u2,
+                      const int n, const uint64_t first, const uint64_t seed,
+                      const uint32_t stream);
+  void philox4x32_10(uint32_t * __restrict__ ctr,
+                     const uint32_t * __restrict__ key);
+
   int min_idx(const double * __restrict__ a, int size);
   int max_idx(const double * __restrict__ a, int size);
   void linspace(const double start, const double end, const int n,
@@ -307,3 +307,117 @@ extern "C" void linear_interp_kick_n_driftf(float * __restrict__ beam_dt,
 }
 
 
+
+
+// Optimised C++ routine that calculates the kick of the induced voltage of a
+// sparse beam, given in the filled buckets only (see SparseSlices). The
+// voltage and the bin centres are arrays of n_filled_buckets x n_slices_bucket
+// and bunch_indexes gives the filled bucket of each bucket from the first
+// filled one (-1 if empty).
+template <typename T>
+void sparse_linear_interp_kick_impl(T * __restrict__ beam_dt,
+                                    T * __restrict__ beam_dE,
+                                    const T * __restrict__ voltage_array,
+                                    const T * __restrict__ bin_centers,
+                                    const T * __restrict__ bunch_indexes,
+                                    const T charge,
+                                    const int n_slices_bucket,
+                                    const int n_filled_buckets,
+                                    const int n_buckets,
+                                    const int n_macroparticles,
+                                    const T acc_kick)
+{
+
+    const int STEP = 64;
+    const int n_kicks = n_slices_bucket - 1;
+    const T inv_bin_width = (n_slices_bucket - 1)
+                            / (bin_centers[n_slices_bucket - 1]
+                               - bin_centers[0]);
+    const T inv_bucket_length = inv_bin_width / n_slices_bucket;
+    const T bucket_left = bin_centers[0] - 0.5 / inv_bin_width;
+
+    T *voltageKick = (T *) malloc (n_filled_buckets * n_kicks * sizeof(T));
+    T *factor = (T *) malloc (n_filled_buckets * n_kicks * sizeof(T));
+
+    #pragma omp parallel
+    {
+        unsigned fbin[STEP];
+
+        #pragma omp for
+        for (int k = 0; k < n_filled_buckets * n_kicks; k++) {
+            const int i = k + k / n_kicks;
+            voltageKick[k] =  charge * (voltage_array[i + 1] - voltage_array[i]) * inv_bin_width;
+            factor[k] = (charge * voltage_array[i] - bin_centers[i] * voltageKick[k]) + acc_kick;
+        }
+
+        #pragma omp for
+        for (int i = 0; i < n_macroparticles; i += STEP) {
+
+            const int loop_count = n_macroparticles - i > STEP ?
+                                   STEP : n_macroparticles - i;
+
+            for (int j = 0; j < loop_count; j++) {
+                const unsigned fbucket = (unsigned) std::floor(
+                    (beam_dt[i + j] - bucket_left) * inv_bucket_length);
+                fbin[j] = n_filled_buckets * n_kicks;
+                if (fbucket < (unsigned) n_buckets && bunch_indexes[fbucket] >= 0) {
+                    const int i_bucket = (int) bunch_indexes[fbucket];
+                    const unsigned bin = (unsigned) std::floor(
+                        (beam_dt[i + j] - bin_centers[i_bucket * n_slices_bucket])
+                        * inv_bin_width);
+                    if (bin < (unsigned) n_kicks)
+                        fbin[j] = i_bucket * n_kicks + bin;
+                }
+            }
+
+            for (int j = 0; j < loop_count; j++) {
+                if (fbin[j] < (unsigned) (n_filled_buckets * n_kicks)) {
+                    beam_dE[i + j] += beam_dt[i + j] * voltageKick[fbin[j]] + factor[fbin[j]];
+                }
+            }
+
+        }
+    }
+    free(voltageKick);
+    free(factor);
+}
+
+
+extern "C" void sparse_linear_interp_kick(double * __restrict__ beam_dt,
+        double * __restrict__ beam_dE,
+        const double * __restrict__ voltage_array,
+        const double * __restrict__ bin_centers,
+        const double * __restrict__ bunch_indexes,
+        const double charge,
+        const int n_slices_bucket,
+        const int n_filled_buckets,
+        const int n_buckets,
+        const int n_macroparticles,
+        const double acc_kick)
+{
+    sparse_linear_interp_kick_impl<double>(beam_dt, beam_dE, voltage_array,
+                                           bin_centers, bunch_indexes, charge,
+                                           n_slices_bucket, n_filled_buckets,
+                                           n_buckets, n_macroparticles,
+                                           acc_kick);
+}
+
+
+extern "C" void sparse_linear_interp_kickf(float * __restrict__ beam_dt,
+        float * __restrict__ beam_dE,
+        const float * __restrict__ voltage_array,
+        const float * __restrict__ bin_centers,
+        const float * __restrict__ bunch_indexes,
+        const float charge,
+        const int n_slices_bucket,
+        const int n_filled_buckets,
+        const int n_buckets,
+        const int n_macroparticles,
+        const float acc_kick)
+{
+    sparse_linear_interp_kick_impl<float>(beam_dt, beam_dE, voltage_array,
+                                          bin_centers, bunch_indexes, charge,
+                                          n_slices_bucket, n_filled_buckets,
+                                          n_buckets, n_macroparticles,
+                                          acc_kick);
+}
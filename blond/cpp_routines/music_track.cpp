@@ -15,6 +15,7 @@ Project website: http://blond.web.cern.ch/
 #include "sin.h"
 #include "cos.h"
 #include "exp.h"
+#include "sincos.h"
 
 #include "openmp.h"
 
@@ -25,6 +26,7 @@ Project website: http://blond.web.cern.ch/
 #endif
 
 #include <cmath>
+#include <complex>
 #include <chrono>
 #include <iostream>
 #include <vector>
@@ -390,3 +392,255 @@ extern "C" void music_track_multiturnf(float *__restrict__ beam_dt,
 
 
 
+
+
+// Definition of struct sorted_particle, used by the incremental sort of the
+// persistent permutation
+template <typename T>
+struct sorted_particle {
+    T dt;
+    int index;
+    bool operator<(const sorted_particle &o) const
+    {
+        return dt < o.dt;
+    }
+};
+
+
+template <typename T>
+static void incremental_sort(std::vector<sorted_particle<T>> &particles)
+{
+    /*
+    Insertion sort of an almost sorted array, cost O(n + inversions). If the
+    particles moved too much since the last call, the remaining work is
+    delegated to the general purpose sort.
+    */
+    const long max_moves = 4L * particles.size();
+    long n_moves = 0;
+    for (size_t i = 1; i < particles.size(); i++) {
+        const sorted_particle<T> current = particles[i];
+        size_t j = i;
+        while (j > 0 && current < particles[j - 1]) {
+            particles[j] = particles[j - 1];
+            j--;
+        }
+        particles[j] = current;
+        n_moves += i - j;
+        if (n_moves > max_moves) {
+#ifdef PARALLEL
+            __gnu_parallel::sort(particles.begin(), particles.end());
+#else
+            std::sort(particles.begin(), particles.end());
+#endif
+            return;
+        }
+    }
+}
+
+
+template <typename T>
+static inline std::complex<T> transfer_factor(const std::complex<T> s,
+                                              const T time_difference)
+{
+    // exp(s * dt), with s = -alpha + j * omega_bar
+    double sin_term, cos_term;
+    fast_sincos(s.imag() * time_difference, sin_term, cos_term);
+    const T exp_term = fast_exp(s.real() * time_difference);
+    return std::complex<T>(exp_term * cos_term, exp_term * sin_term);
+}
+
+
+template <typename T>
+static void music_track_parallel_impl(const T *__restrict__ beam_dt,
+                                      T *__restrict__ beam_dE,
+                                      T *__restrict__ induced_voltage,
+                                      int *__restrict__ permutation,
+                                      const int n_macroparticles,
+                                      std::complex<T> *__restrict__ state,
+                                      const std::complex<T> *__restrict__ s,
+                                      const std::complex<T> *__restrict__ weight,
+                                      const T *__restrict__ cnst,
+                                      const int n_resonators,
+                                      const T time_offset,
+                                      const bool multi_turn)
+{
+    /*
+    The MuSiC recursion of the real 2x2 transfer matrices is diagonal in the
+    eigenbasis of the resonator, where each step reduces to the complex affine
+    map z_i = exp(s * (dt_i - dt_{i-1})) * (z_{i-1} + 1). The composition of
+    affine maps is associative, so the recursion is evaluated as a parallel
+    prefix scan: every thread reduces its chunk to a single map, the chunk
+    maps are combined serially and each chunk is then swept again with the
+    correct initial state.
+    */
+
+    // No particle to kick, the state is kept for the next turn
+    if (n_macroparticles == 0)
+        return;
+
+    // Incremental sort of the persistent permutation
+    std::vector<sorted_particle<T>> particles(n_macroparticles);
+    #pragma omp parallel for
+    for (int i = 0; i < n_macroparticles; i++)
+        particles[i] = {beam_dt[permutation[i]], permutation[i]};
+    incremental_sort(particles);
+    #pragma omp parallel for
+    for (int i = 0; i < n_macroparticles; i++)
+        permutation[i] = particles[i].index;
+
+    // Voltage on the first particle, from the previous turn if any
+    std::vector<std::complex<T>> z_first(n_resonators);
+    T voltage_first = 0;
+    for (int r = 0; r < n_resonators; r++) {
+        z_first[r] = multi_turn ?
+                     transfer_factor(s[r], particles[0].dt + time_offset)
+                     * state[r] : std::complex<T>(0);
+        voltage_first += cnst[r] * (T(0.5) + (weight[r] * z_first[r]).real());
+    }
+    induced_voltage[particles[0].index] = voltage_first;
+    beam_dE[particles[0].index] += voltage_first;
+
+    const int n_threads = omp_get_max_threads();
+    std::vector<std::complex<T>> chunk_factor(n_threads * n_resonators);
+    std::vector<std::complex<T>> chunk_offset(n_threads * n_resonators);
+    std::vector<std::complex<T>> chunk_start(n_threads * n_resonators);
+
+    #pragma omp parallel
+    {
+        const int tid = omp_get_thread_num();
+        const int n_chunks = omp_get_num_threads();
+        const int n_steps = n_macroparticles - 1;
+        const int lo = 1 + (long) n_steps * tid / n_chunks;
+        const int hi = 1 + (long) n_steps * (tid + 1) / n_chunks;
+        std::complex<T> *factor = &chunk_factor[tid * n_resonators];
+        std::complex<T> *offset = &chunk_offset[tid * n_resonators];
+        std::complex<T> *z = &chunk_start[tid * n_resonators];
+
+        // Reduce every chunk to the affine map z_hi = factor * z_lo + offset
+        for (int r = 0; r < n_resonators; r++) {
+            factor[r] = 1;
+            offset[r] = 0;
+        }
+        for (int i = lo; i < hi && n_chunks > 1; i++) {
+            const T time_difference = particles[i].dt - particles[i - 1].dt;
+            for (int r = 0; r < n_resonators; r++) {
+                const std::complex<T> a = transfer_factor(s[r],
+                                                          time_difference);
+                factor[r] *= a;
+                offset[r] = a * (offset[r] + T(1));
+            }
+        }
+
+        #pragma omp barrier
+        #pragma omp single
+        {
+            for (int r = 0; r < n_resonators; r++) {
+                std::complex<T> z_lo = z_first[r];
+                for (int t = 0; t < n_chunks; t++) {
+                    const std::complex<T> z_next =
+                        chunk_factor[t * n_resonators + r] * z_lo
+                        + chunk_offset[t * n_resonators + r];
+                    chunk_start[t * n_resonators + r] = z_lo;
+                    z_lo = z_next;
+                }
+            }
+        }
+
+        // Sweep every chunk again starting from its exact initial state
+        for (int i = lo; i < hi; i++) {
+            const T time_difference = particles[i].dt - particles[i - 1].dt;
+            T voltage = 0;
+            for (int r = 0; r < n_resonators; r++) {
+                z[r] = transfer_factor(s[r], time_difference) * (z[r] + T(1));
+                voltage += cnst[r] * (T(0.5) + (weight[r] * z[r]).real());
+            }
+            induced_voltage[particles[i].index] = voltage;
+            beam_dE[particles[i].index] += voltage;
+        }
+
+        // Store the state including the last particle for the next turn
+        if (tid == n_chunks - 1)
+            for (int r = 0; r < n_resonators; r++)
+                state[r] = z[r] + T(1);
+    }
+}
+
+
+extern "C" void music_track_parallel(const double *__restrict__ beam_dt,
+                                     double *__restrict__ beam_dE,
+                                     double *__restrict__ induced_voltage,
+                                     int *__restrict__ permutation,
+                                     const int n_macroparticles,
+                                     std::complex<double> *__restrict__ state,
+                                     const std::complex<double> *__restrict__ s,
+                                     const std::complex<double> *__restrict__ weight,
+                                     const double *__restrict__ cnst,
+                                     const int n_resonators,
+                                     const double time_offset,
+                                     const bool multi_turn)
+{
+    /*
+    This function calculates the induced voltage of several resonators with
+    the MuSiC algorithm and updates the energies of the particles, without
+    reordering the beam coordinates.
+
+    Parameters
+    ----------
+    beam_dt : float array
+        Longitudinal coordinates [s]
+    beam_dE : float array
+        Initial energies [V]
+    induced_voltage : float array
+        array used to store the output of the computation, in beam order
+    permutation : int array
+        Indices sorting beam_dt at the previous call, updated in place
+    n_macroparticles : int
+        number of macro-particles
+    state : complex array
+        MuSiC state of each resonator after the last particle, updated
+    s, weight, cnst : arrays
+        See documentation in music.py
+    n_resonators : int
+        number of resonators
+    time_offset : float
+        Revolution period minus the last coordinate of the previous turn [s]
+    multi_turn : bool
+        Whether to include the voltage of the previous turns
+
+    Returns
+    -------
+    induced_voltage : float array
+        Computed induced voltage.
+    beam_dE : float array
+        Array of energies updated.
+    */
+    music_track_parallel_impl<double>(beam_dt, beam_dE, induced_voltage,
+                                      permutation, n_macroparticles, state,
+                                      s, weight, cnst, n_resonators,
+                                      time_offset, multi_turn);
+}
+
+
+extern "C" void music_track_parallelf(const float *__restrict__ beam_dt,
+                                      float *__restrict__ beam_dE,
+                                      float *__restrict__ induced_voltage,
+                                      int *__restrict__ permutation,
+                                      const int n_macroparticles,
+                                      std::complex<float> *__restrict__ state,
+                                      const std::complex<float> *__restrict__ s,
+                                      const std::complex<float> *__restrict__ weight,
+                                      const float *__restrict__ cnst,
+                                      const int n_resonators,
+                                      const float time_offset,
+                                      const bool multi_turn)
+{
+    /*
+    This function calculates the induced voltage of several resonators with
+    the MuSiC algorithm and updates the energies of the particles.
+    Parameters and Returns as for music_track_parallel.
+    */
+    music_track_parallel_impl<float>(beam_dt, beam_dE, induced_voltage,
+                                     permutation, n_macroparticles, state,
+                                     s, weight, cnst, n_resonators,
+                                     time_offset, multi_turn);
+}
@@ -76,7 +76,10 @@ class TotalInducedVoltage(object):
 
     def reprocess(self):
         """
-        Reprocess the impedance contributions. To be run when profile changes
+        Reprocess the impedance contributions. To be run when profile changes.
+        The wakes and impedances of the sources are only recomputed if they
+        were not already computed on the new grid, see
+        _ImpedanceObject.clear_cache to force the recalculation.
         """
 
         for induced_voltage_object in self.induced_voltage_list:
@@ -435,6 +438,15 @@ class InducedVoltageTime(_InducedVoltage):
         use the next_regular function to ensure regular number for FFT
         calculations (default is True for efficient calculations, for
         better control of the sampling frequency False is preferred)
+    convolution_mode : str, optional
+        Convolution of the profile with the wake can be 'fft', 'direct' or
+        'auto' (default). The direct convolution only uses the part of the
+        wake above wake_truncation and is chosen by 'auto' when it is
+        cheaper than the FFTs, e.g. for short wakes in long frames
+    wake_truncation : float, optional
+        The wake is truncated after the last point where its absolute value
+        is larger than wake_truncation times its maximum for the direct
+        convolution (default is 0, i.e. only the trailing zeros are removed)
 
     Attributes
     ----------
@@ -444,11 +456,20 @@ class InducedVoltageTime(_InducedVoltage):
         Total wake array of all sources in :math:`\Omega / s`
     use_regular_fft : boolean
         User set value to use (default) or not regular numbers for FFTs
+    n_wake_kernel : int
+        Number of points of the truncated wake
+    direct_convolution : boolean
+        Whether the induced voltage is computed with the direct convolution
     """
 
+    # Relative cost of one multiply-add in the direct convolution with
+    # respect to one n*log2(n) operation of the FFTs, for the 'auto' mode
+    _direct_convolution_cost = 0.2
+
     def __init__(self, Beam, Profile, wake_source_list, wake_length=None,
                  multi_turn_wake=False, RFParams=None, mtw_mode=None,
-                 use_regular_fft=True):
+                 use_regular_fft=True, convolution_mode='auto',
+                 wake_truncation=0):
 
         # Wake sources list (e.g. list of Resonator objects)
         self.wake_source_list = wake_source_list
@@ -456,6 +477,12 @@ class InducedVoltageTime(_InducedVoltage):
         # Total wake array of all sources in :math:`\Omega / s`
         self.total_wake = 0
 
+        if convolution_mode not in ['fft', 'direct', 'auto']:
+            # WrongCalcError
+            raise RuntimeError('convolution_mode not recognized')
+        self.convolution_mode = convolution_mode
+        self.wake_truncation = wake_truncation
+
         # Call the __init__ method of the parent class [calls process()]
         _InducedVoltage.__init__(self, Beam, Profile, frequency_resolution=None,
                                  wake_length=wake_length, multi_turn_wake=multi_turn_wake,
@@ -499,13 +526,52 @@ class InducedVoltageTime(_InducedVoltage):
 
         self.total_wake = np.zeros(time_array.shape)
         for wake_object in self.wake_source_list:
-            wake_object.wake_calc(time_array)
+            wake_object.wake_calc_cached(time_array)
             self.total_wake += wake_object.wake
 
         # Pseudo-impedance used to calculate linear convolution in the
         # frequency domain (padding zeros)
         self.total_impedance = bm.rfft(self.total_wake, self.n_fft)
 
+        # Truncated wake for the direct convolution
+        above_truncation = np.flatnonzero(
+            np.abs(self.total_wake) > self.wake_truncation
+            * np.max(np.abs(self.total_wake)))
+        self.n_wake_kernel = above_truncation[-1] + 1 \
+            if len(above_truncation) > 0 else 1
+        # zero padding if the induced voltage is longer than the convolution
+        self.wake_kernel = np.zeros(
+            max(self.n_wake_kernel,
+                self.n_induced_voltage - self.profile.n_slices + 1),
+            dtype=bm.precision.real_t)
+        self.wake_kernel[:self.n_wake_kernel] = \
+            self.total_wake[:self.n_wake_kernel]
+
+        if self.convolution_mode == 'auto':
+            self.direct_convolution = (
+                self._direct_convolution_cost * self.profile.n_slices
+                * len(self.wake_kernel) < self.n_fft * np.log2(self.n_fft))
+        else:
+            self.direct_convolution = self.convolution_mode == 'direct'
+
+    def induced_voltage_1turn(self, beam_spectrum_dict={}):
+        """
+        Method to calculate the induced voltage at the current turn, with the
+        direct convolution of the profile with the truncated wake or with
+        DFTs.
+        """
+
+        if not self.direct_convolution:
+            _InducedVoltage.induced_voltage_1turn(self, beam_spectrum_dict)
+            return
+
+        convolution = bm.convolve(self.profile.n_macroparticles,
+                                  self.wake_kernel, mode='full')
+
+        self.induced_voltage = - (self.beam.Particle.charge * e
+                                  * self.beam.ratio
+                                  * convolution[:self.n_induced_voltage])
+
     def to_gpu(self, recursive=True):
         '''
         Transfer all necessary arrays to the GPU
@@ -520,6 +586,7 @@ class InducedVoltageTime(_InducedVoltage):
         self.time = cp.array(self.time)
         self.total_wake = cp.array(self.total_wake)
         self.total_impedance = cp.array(self.total_impedance)
+        self.wake_kernel = cp.array(self.wake_kernel)
         if hasattr(self, 'mtw_memory'):
             self.mtw_memory = cp.array(self.mtw_memory)
         if hasattr(self, 'time_mtw'):
@@ -550,6 +617,7 @@ class InducedVoltageTime(_InducedVoltage):
         self.time = cp.asnumpy(self.time)
         self.total_wake = cp.asnumpy(self.total_wake)
         self.total_impedance = cp.asnumpy(self.total_impedance)
+        self.wake_kernel = cp.asnumpy(self.wake_kernel)
         if hasattr(self, 'mtw_memory'):
             self.mtw_memory = cp.asnumpy(self.mtw_memory)
         if hasattr(self, 'time_mtw'):
@@ -667,7 +735,7 @@ class InducedVoltageFreq(_InducedVoltage):
             freq.shape, dtype=bm.precision.complex_t, order='C')
 
         for impedance_source in self.impedance_source_list:
-            impedance_source.imped_calc(freq)
+            impedance_source.imped_calc_cached(freq)
             self.total_impedance += impedance_source.impedance
 
         # Factor relating Fourier transform and DFT
@@ -724,6 +792,198 @@ class InducedVoltageFreq(_InducedVoltage):
         self._device = 'CPU'
 
 
+class InducedVoltageSparse(object):
+    r"""
+    Induced voltage of a sparse beam derived from the sum of several
+    impedances, computed only in the filled buckets of a SparseSlices object.
+
+    The induced voltage is the one of InducedVoltageFreq for a profile of
+    n_buckets RF buckets, i.e. the periodic (multi-turn) induced voltage for
+    the full ring by default. The profile of each filled bucket is Fourier
+    transformed separately and the spectrum of the induced voltage in a
+    bucket is the sum over the filled buckets of their spectra times the
+    spectrum of the wake between the two buckets, which is precomputed from
+    the impedance. The cost per turn scales with the number of pairs of
+    bunches instead of the length of the frame, and the pairs of buckets
+    between which the wake is below wake_truncation are skipped.
+
+    Parameters
+    ----------
+    Beam : object
+        Beam object
+    SparseSlices : object
+        SparseSlices object
+    impedance_source_list : list
+        Impedance sources list (e.g. list of Resonator objects)
+    n_buckets : int, optional
+        Length of the periodic frame in RF buckets (default is the harmonic
+        number of the RF station of SparseSlices)
+    wake_truncation : float, optional
+        The contribution of a bucket to another one is skipped if the wake
+        between them is below wake_truncation times the maximum of the wake
+        (default is 0, only the exact zeros are skipped)
+
+    Attributes
+    ----------
+    beam : object
+        Copy of the Beam object in order to access the beam info
+    profile : object
+        Copy of the SparseSlices object in order to access the profile info
+    impedance_source_list : list
+        Impedance sources list (e.g. list of Resonator objects)
+    induced_voltage : float array
+        Induced voltage in the filled buckets in V, of shape
+        (n_filled_buckets, n_slices_bucket)
+    total_impedance : complex array
+        Total impedance array of all sources in* :math:`\Omega`, divided by
+        the bin size
+    freq : float array
+        Frequency array of the impedance in Hz
+    frequency_resolution : float
+        Frequency resolution of the impedance in Hz
+    n_lags : int
+        Number of distances between filled buckets with a non-negligible wake
+    n_pairs : int
+        Number of pairs of filled buckets with a non-negligible wake
+
+    Examples
+    ----------
+    >>> sparse_slices = SparseSlices(rf_station, beam, 100, filling_pattern)
+    >>> induced_voltage = InducedVoltageSparse(beam, sparse_slices,
+    >>>                                        [resonators])
+    >>> sparse_slices.track()
+    >>> induced_voltage.track()
+    """
+
+    def __init__(self, Beam, SparseSlices, impedance_source_list,
+                 n_buckets=None, wake_truncation=0):
+
+        # Beam object in order to access the beam info
+        self.beam = Beam
+
+        # SparseSlices object in order to access the profile info
+        self.profile = SparseSlices
+
+        # Impedance sources list (e.g. list of Resonator objects)
+        self.impedance_source_list = impedance_source_list
+
+        # Length of the periodic frame in buckets
+        if n_buckets is None:
+            n_buckets = int(round(self.profile.RFParams.harmonic[0, 0]))
+        self.n_buckets = n_buckets
+
+        # Threshold of the wake between two buckets
+        self.wake_truncation = wake_truncation
+
+        self.process()
+
+    def process(self):
+        """
+        Reprocess the impedance contributions. To be run when the slicing or
+        the filling pattern change
+        """
+
+        n_slices_bucket = self.profile.n_slices_bucket
+        self.bin_size = (self.profile.cut_right_array[0]
+                         - self.profile.cut_left_array[0]) / n_slices_bucket
+
+        # Buckets of the filled buckets, from the first one
+        self.filled_buckets = np.flatnonzero(self.profile.filling_pattern)
+        self.filled_buckets -= self.filled_buckets[0]
+        if self.filled_buckets[-1] >= self.n_buckets:
+            # WrongCalcError
+            raise RuntimeError('The filled buckets do not fit in n_buckets')
+
+        # Impedance of the periodic frame and wake of one macroparticle
+        n_fft = self.n_buckets * n_slices_bucket
+        self.freq = bm.rfftfreq(n_fft, d=self.bin_size)
+        self.frequency_resolution = 1 / (n_fft * self.bin_size)
+        self.sum_impedances(self.freq)
+        wake = bm.irfft(self.total_impedance, n_fft)
+
+        # The induced voltage in a bucket is the linear convolution of the
+        # profile in another one with 2 n_slices_bucket - 1 points of the wake
+        self.n_fft = next_regular(2 * n_slices_bucket - 1)
+
+        lags = np.mod(self.filled_buckets[:, np.newaxis]
+                      - self.filled_buckets[np.newaxis, :], self.n_buckets)
+        unique_lags = np.unique(lags)
+        segments = wake[np.mod(
+            (unique_lags[:, np.newaxis] * n_slices_bucket
+             - n_slices_bucket + 1 + np.arange(2 * n_slices_bucket - 1)),
+            n_fft)]
+        significant = np.max(np.abs(segments), axis=1) \
+            > self.wake_truncation * np.max(np.abs(wake))
+
+        # Spectra of the wake between buckets and pairs of filled buckets for
+        # each of them, there is at most one pair per bucket and distance
+        self.lag_spectra = np.fft.rfft(segments[significant], self.n_fft,
+                                       axis=1).astype(bm.precision.complex_t)
+        self.lag_pairs = [np.nonzero(lags == lag)
+                          for lag in unique_lags[significant]]
+        self.n_lags = len(self.lag_pairs)
+        self.n_pairs = sum(len(targets) for targets, _ in self.lag_pairs)
+
+        self.induced_voltage = np.zeros(
+            (self.profile.n_filled_buckets, n_slices_bucket),
+            dtype=bm.precision.real_t, order='C')
+
+        # Bin centres and bunch index of the buckets, for the kick
+        self.bin_centers = np.ascontiguousarray(
+            self.profile.bin_centers_array, dtype=bm.precision.real_t)
+        self.bunch_indexes = np.ascontiguousarray(
+            self.profile.bunch_indexes[:self.filled_buckets[-1] + 1],
+            dtype=bm.precision.real_t)
+
+    def sum_impedances(self, freq):
+        """
+        Summing all the wake contributions in one total impedance.
+        """
+
+        self.total_impedance = np.zeros(
+            freq.shape, dtype=bm.precision.complex_t, order='C')
+
+        for impedance_source in self.impedance_source_list:
+            impedance_source.imped_calc_cached(freq)
+            self.total_impedance += impedance_source.impedance
+
+        # Factor relating Fourier transform and DFT
+        self.total_impedance /= self.bin_size
+
+    def induced_voltage_generation(self, beam_spectrum_dict={}):
+        """
+        Method to calculate the induced voltage in the filled buckets.
+        """
+
+        n_slices_bucket = self.profile.n_slices_bucket
+
+        beam_spectra = np.fft.rfft(self.profile.n_macroparticles_array,
+                                   self.n_fft, axis=1)
+        induced_spectra = np.zeros_like(beam_spectra)
+        for lag_spectrum, (targets, sources) in zip(self.lag_spectra,
+                                                    self.lag_pairs):
+            induced_spectra[targets] += lag_spectrum * beam_spectra[sources]
+
+        induced_voltage = np.fft.irfft(induced_spectra, self.n_fft, axis=1)
+        self.induced_voltage[:] = - (
+            self.beam.Particle.charge * e * self.beam.ratio
+            * induced_voltage[:, n_slices_bucket - 1:2 * n_slices_bucket - 1])
+
+    def track(self):
+        """
+        Track method to apply the induced voltage kick on the beam. The
+        particles in the outer half bins of the buckets are not kicked.
+        """
+
+        self.induced_voltage_generation()
+        bm.sparse_linear_interp_kick(dt=self.beam.dt, dE=self.beam.dE,
+                                     voltage=self.induced_voltage,
+                                     bin_centers=self.bin_centers,
+                                     bunch_indexes=self.bunch_indexes,
+                                     charge=self.beam.Particle.charge,
+                                     acceleration_kick=0.)
+
+
 class InductiveImpedance(_InducedVoltage):
     r"""
     Constant imaginary Z/n impedance
@@ -19,11 +19,16 @@ classes, as for example InputTable, Resonators and TravelingWaveCavity.**
 
 from __future__ import division, print_function
 from builtins import range, object
+import os
+import hashlib
+import warnings
+from collections import OrderedDict
 import numpy as np
 from scipy.constants import c, physical_constants
 from scipy.special import gamma as gamma_func
 from scipy.special import kv, airy, polygamma
 from scipy import integrate
+from scipy.interpolate import CubicSpline
 import mpmath
 from ..utils import bmath as bm
 
@@ -34,8 +39,18 @@ class _ImpedanceObject(object):
     Parent impedance object to implement required methods and attributes
     common to all the child classes. The attributes are initialised to 0 but
     they are overwritten by float arrays when the child classes are used.
+
+    The results of wake_calc and imped_calc can be memoised with
+    wake_calc_cached and imped_calc_cached, which are used by the
+    InducedVoltage objects. The results are kept by grid and by value of the
+    parameters of the impedance source, so that changing the parameters
+    computes them again; the last `cache_size` results are kept (least
+    recently used are evicted first).
     """
 
+    # Maximum number of grids kept in the cache, 0 disables the cache
+    cache_size = 4
+
     def __init__(self):
         # Time array of the wake in s
         self.time_array = 0
@@ -49,6 +64,109 @@ class _ImpedanceObject(object):
         # Impedance array in :math:`\Omega`
         self.impedance = 0
 
+        # Attributes set by the calc methods for the last cache_size grids
+        # and parameters
+        self._cache = OrderedDict()
+
+        # Names of the attributes set by the calc methods, the other ones
+        # being the parameters of the impedance source
+        self._calc_attributes = set()
+
+    @staticmethod
+    def _grid_key(array):
+        # (length, start, step, end) identify the uniform grids used for the
+        # induced voltage calculations
+        if len(array) == 0:
+            return (0,)
+        elif len(array) == 1:
+            return (1, float(array[0]))
+        return (len(array), float(array[0]), float(array[1] - array[0]),
+                float(array[-1]))
+
+    @classmethod
+    def _value_key(cls, value):
+        # Hashable representation of a parameter value; arrays are
+        # identified by their content
+        if isinstance(value, np.ndarray):
+            return (value.dtype.str, value.shape, hashlib.sha1(
+                np.ascontiguousarray(value).tobytes()).hexdigest())
+        elif isinstance(value, (list, tuple)):
+            return tuple(cls._value_key(item) for item in value)
+        elif isinstance(value, dict):
+            return tuple(sorted((str(name), cls._value_key(item))
+                                for name, item in value.items()))
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return repr(value)
+
+    def _parameters_key(self):
+        return tuple((name, self._value_key(value))
+                     for name, value in sorted(self.__dict__.items())
+                     if name not in self._calc_attributes
+                     and name not in ('_cache', '_calc_attributes',
+                                      'cache_size'))
+
+    def _cached_calc(self, grid_key, calc_method, grid):
+        key = grid_key + (self._parameters_key(),)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.__dict__.update(self._cache[key])
+            return
+
+        attributes_before = dict(self.__dict__)
+        calc_method(grid)
+
+        attributes = {name: value for name, value in self.__dict__.items()
+                      if name not in ('_cache', '_calc_attributes')
+                      and (name not in attributes_before
+                           or value is not attributes_before[name])}
+        self._calc_attributes.update(attributes)
+
+        # The parameters are identified once the attributes set by the calc
+        # methods are known
+        if self.cache_size > 0:
+            self._cache[grid_key + (self._parameters_key(),)] = attributes
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def wake_calc_cached(self, time_array):
+        r"""
+        Same as wake_calc, but the result is taken from the cache if the wake
+        was already computed on the same time grid, with the same parameters.
+
+        Parameters
+        ----------
+        time_array : float array
+            Input time array in s
+        """
+
+        self._cached_calc(('wake',) + self._grid_key(time_array),
+                          self.wake_calc, time_array)
+
+    def imped_calc_cached(self, frequency_array):
+        r"""
+        Same as imped_calc, but the result is taken from the cache if the
+        impedance was already computed on the same frequency grid, with the
+        same parameters.
+
+        Parameters
+        ----------
+        frequency_array : float array
+            Input frequency array in Hz
+        """
+
+        self._cached_calc(('impedance',) + self._grid_key(frequency_array),
+                          self.imped_calc, frequency_array)
+
+    def clear_cache(self):
+        r"""
+        Empties the cache of wakes and impedances.
+        """
+
+        self._cache.clear()
+
     def wake_calc(self, *args):
         r"""
         Method required to compute the wake function. Returns an error if
@@ -546,6 +664,32 @@ class ResistiveWall(_ImpedanceObject):
         Z(f) = \frac{Z_0 c L}{ \pi } \frac{ 1 }{ \left[1 - i \text{sign} f \right] 2  b  c
                                     \sqrt{ \frac{\sigma_c Z_0 c }{ 4 \pi |f| } + i 2 \pi b^2 f } }
 
+    The corresponding wake is the exact inverse Fourier transform of this
+    impedance, which has the form derived in [Bane1995]_
+
+    .. math::
+
+        W(t>0) = \frac{4 Z_0 c L}{\pi^2 \tilde{b}^2} \left[\frac{e^{-\tau}}{3}
+            \cos{\sqrt{3}\tau} - \frac{\sqrt{2}}{\pi} \int_0^\infty
+            \frac{x^2 e^{-x^2\tau}}{x^6 + 8} dx \right]
+
+        W(0) = \frac{Z_0 c L}{2 \pi^2 \tilde{b}^2}
+
+    .. math::
+
+        \tau = \frac{c t}{s_0}, \quad s_0 = \left(\frac{2 \tilde{b}^2}{Z_0 \sigma_c}
+            \right)^{1/3}, \quad \tilde{b} = \frac{b}{\pi}
+
+    The integral is tabulated once and continued with its asymptotic
+    expansion, which gives the usual :math:`t^{-3/2}` long-range wake. Notice
+    that the short-range part decays over :math:`s_0/c`, which is usually much
+    shorter than the bin size.
+
+    References
+    ----------
+    .. [Bane1995] K.L.F. Bane, M. Sands, "The short-range resistive wall
+        wakefields", *AIP Conference Proceedings*, vol. 367, p. 131, 1996.
+
     Parameters
     ----------
     pipe_radius : float
@@ -576,8 +720,16 @@ class ResistiveWall(_ImpedanceObject):
     >>> rw = ResistiveWall(pipe_radius, pipe_length, resistivity)
     >>> frequency = np.array(1,2,3)
     >>> rw.imped_calc(frequency)
+    >>> time = np.array(1,2,3)
+    >>> rw.wake_calc(time)
     """
 
+    # Tabulated integral of the wake, shared between the objects
+    _kernel_table = None
+
+    # Number of points of the wake averaged exactly by wake_calc
+    n_averaged = 64
+
     def __init__(self, pipe_radius, pipe_length, resistivity=None,
                  conductivity=None):
 
@@ -647,6 +799,124 @@ class ResistiveWall(_ImpedanceObject):
 
         self.impedance[np.isnan(self.impedance)] = 0.0
 
+    def wake_calc(self, time_array, averaged=True):
+        r"""
+        Wake calculation method as a function of time.
+
+        Parameters
+        ----------
+        time_array : float array
+            Input time array in s, equally spaced if averaged is True
+        averaged : bool
+            If True (default), the wake is averaged around each point with a
+            triangular weight spanning two steps of time_array, which is the
+            wake to convolve with a linearly interpolated profile. The first
+            n_averaged points are integrated exactly, since the short-range
+            wake is usually not resolved by the profile. If False, the wake is
+            sampled at time_array
+
+        Attributes
+        ----------
+        time_array : float array
+            Input time array in s
+        wake : float array
+            Output wake in :math:`\Omega / s`
+        """
+
+        self.time_array = time_array
+        self.wake = np.zeros(self.time_array.shape)
+
+        # Effective radius for which the wake of [Bane1995] reproduces the
+        # inductive term of imped_calc
+        b_eff = self.pipe_radius / np.pi
+        s_0 = (2 * b_eff**2 / (self.Z0 * self.conductivity))**(1/3)
+        amplitude = 4 * self.Z0 * c * self.pipe_length / (np.pi**2 * b_eff**2)
+
+        tau = c * self.time_array / s_0
+        indexes = tau > 0
+
+        if averaged and len(self.time_array) > 1:
+            tau_step = c * (self.time_array[1] - self.time_array[0]) / s_0
+            near = (tau > -tau_step) \
+                * (tau < (self.n_averaged + 1) * tau_step)
+            self.wake[near] = amplitude * self._averaged_wake(tau[near],
+                                                              tau_step)
+            indexes *= np.invert(near)
+
+        self.wake[indexes] = amplitude * (
+            np.exp(-tau[indexes]) * np.cos(np.sqrt(3) * tau[indexes]) / 3
+            - np.sqrt(2) / np.pi * self._kernel(tau[indexes]))
+
+        # Beam loading theorem: half of the wake at t=0+
+        if not averaged:
+            self.wake[self.time_array == 0] = amplitude / 8
+
+    @staticmethod
+    def _averaged_wake(tau, tau_step):
+        r"""
+        Normalised wake averaged over
+        :math:`[\tau - \tau_s, \tau + \tau_s]` with a triangular weight, from
+        the second differences of its double integral.
+        """
+
+        def double_integral(tau):
+            tau = np.maximum(tau, 0)
+            return tau / 12 + (1 - np.exp(-tau) * (
+                np.cos(np.sqrt(3) * tau)
+                + np.sqrt(3) * np.sin(np.sqrt(3) * tau))) / 24
+
+        def second_difference(x):
+            # of x^2 tau - 1 + exp(-x^2 tau) for tau > 0, zero otherwise
+            a = x**2
+            h = [np.maximum(a * tt, 0) + np.expm1(-a * np.maximum(tt, 0))
+                 for tt in [tau + tau_step, tau, tau - tau_step]]
+            difference = np.where(
+                tau >= tau_step,
+                np.exp(-a * np.abs(tau - tau_step))
+                * np.expm1(-a * tau_step)**2,
+                h[0] - 2 * h[1] + h[2])
+            return difference / (max(a, 1e-300) * (a**3 + 8))
+
+        averaged_wake = double_integral(tau + tau_step) \
+            - 2 * double_integral(tau) + double_integral(tau - tau_step) \
+            - np.sqrt(2) / np.pi * integrate.quad_vec(
+                second_difference, 0, np.inf, epsabs=0, epsrel=1e-10)[0]
+
+        return averaged_wake / tau_step**2
+
+    @classmethod
+    def _kernel(cls, tau, tau_min=1e-6, tau_max=1e4):
+        r"""
+        Evaluates :math:`I(\tau) = \int_0^\infty x^2 e^{-x^2\tau} / (x^6 + 8) dx`
+        from a table in :math:`\log\tau`, with the first order expansion at
+        :math:`\tau=0` below `tau_min` and the asymptotic series above `tau_max`.
+        """
+
+        if cls._kernel_table is None:
+            log_tau = np.linspace(np.log(tau_min), np.log(tau_max), 1201)
+            values = integrate.quad_vec(
+                lambda x: x**2 * np.exp(-x**2 * np.exp(log_tau)) / (x**6 + 8),
+                0, np.inf, epsabs=0, epsrel=1e-12)[0]
+            cls._kernel_table = CubicSpline(log_tau, values)
+
+        tau = np.asarray(tau, dtype=float)
+        kernel = np.empty_like(tau)
+
+        small = tau < tau_min
+        # I(0) - tau * int x^4 / (x^6 + 8) dx, next order is tau^(3/2)
+        kernel[small] = np.pi / (12 * np.sqrt(2)) \
+            - tau[small] * np.pi / (3 * np.sqrt(2))
+
+        large = tau > tau_max
+        # expansion of 1 / (x^6 + 8) in powers of x^6 / 8
+        kernel[large] = np.sqrt(np.pi) / 32 * tau[large]**-1.5 \
+            * (1 - 105 / 64 * tau[large]**-3)
+
+        tabulated = np.invert(small | large)
+        kernel[tabulated] = cls._kernel_table(np.log(tau[tabulated]))
+
+        return kernel
+
 
 class CoherentSynchrotronRadiation(_ImpedanceObject):
     r"""
@@ -735,9 +1005,27 @@ class CoherentSynchrotronRadiation(_ImpedanceObject):
     >>> Z_pp = CoherentSynchrotronRadiation(rBend, chamber_height=h, gamma=gamma)
     >>> Z_pp.imped_calc(freqs, low_frequency_transition=1e-4, high_frequency_transition=20)
 
+    The exact impedances can be tabulated once in the normalised frequency
+    :math:`f/f_{\text{crit}}` and then interpolated on any new frequency grid,
+    which avoids recomputing the integrals and sums whenever the slicing changes.
+    The tables can be stored on disk and are reused by any later object with the
+    same `r_bend`, `gamma` and `chamber_height`:
+
+    >>> Z_pp = CoherentSynchrotronRadiation(rBend, chamber_height=h, gamma=gamma,
+    >>>                                     tabulate=True, cache_dir='csr_tables')
+    >>> Z_pp.imped_calc(freqs)
+
     """
 
-    def __init__(self, r_bend, gamma=None, chamber_height=np.inf):
+    # Tables already computed in this session, shared between the objects;
+    # the last `table_cache_size` tables are kept (least recently used are
+    # evicted first)
+    _table_cache = OrderedDict()
+    table_cache_size = 4
+
+    def __init__(self, r_bend, gamma=None, chamber_height=np.inf,
+                 tabulate=False, table_range=(1e-5, 10), table_rtol=1e-4,
+                 cache_dir=None):
         r"""
 
 
@@ -758,6 +1046,18 @@ class CoherentSynchrotronRadiation(_ImpedanceObject):
         parallel_plates : TYPE, optional
             If ture, the parallel plates impedance is computed. In this case, `chamber_height`
             must be specified. If false, the free-space impedance is computed. The default is False.
+        tabulate : bool, optional
+            If true, the exact impedance is tabulated in `f/f_crit` on the first call of
+            `imped_calc` and interpolated afterwards. Requires `gamma`. The default is False.
+        table_range : tuple of float, optional
+            Range of `f/f_crit` covered by the table. Frequencies outside this range are
+            computed directly. The default is (1e-5, 10).
+        table_rtol : float, optional
+            Relative tolerance of the interpolation; the table is refined until the
+            interpolation error at the interval midpoints is below it. The default is 1e-4.
+        cache_dir : str, optional
+            Directory where the tables are stored and looked up. If None, the tables are only
+            kept in memory. The default is None.
 
         Raises
         ------
@@ -823,6 +1123,169 @@ class CoherentSynchrotronRadiation(_ImpedanceObject):
                 'method for impedance calculation in CoherentSynchrotronRadiation object '
                 + 'not recognized')
 
+        self.tabulate = tabulate
+        if self.tabulate:
+            if self.gamma is None:
+                raise ValueError('tabulation requires gamma')
+            if table_range[0] <= 0 or table_range[1] <= table_range[0]:
+                raise ValueError('table_range must be positive and increasing')
+            self.table_range = tuple(table_range)
+            self.table_rtol = table_rtol
+            self.cache_dir = cache_dir
+            self._exact_imped_calc = self.imped_calc
+            self._table = None
+            self._table_key = None
+            self.imped_calc = self._tabulated_spectrum
+
+    def _tabulated_spectrum(self, frequency_array, **kwargs):
+        r"""
+        Interpolates the tabulated impedance at the given frequencies. The table is built (or
+        loaded from `cache_dir`) on the first call and whenever different keyword arguments are
+        passed. Frequencies outside `table_range` are computed with the exact method.
+
+        Parameters
+        ----------
+        frequency_array : float array
+            Frequencies at which to compute the impedance
+        **kwargs :
+            Keyword arguments get passed to the exact method when building the table
+
+        Returns
+        -------
+        None.
+
+        """
+
+        key = self._table_cache_key(kwargs)
+        if key != self._table_key:
+            self._table = self._load_table(key, kwargs)
+            self._table_key = key
+
+        frequency_array = np.asarray(frequency_array, dtype=float)
+        l_array = frequency_array / self.f_crit
+
+        impedance = np.zeros_like(l_array, dtype=complex)
+
+        in_table = (l_array >= self.table_range[0]) & (l_array <= self.table_range[1])
+        if np.count_nonzero(in_table) > 0:
+            table_values = self._table(np.log(l_array[in_table]))
+            impedance[in_table] = self.Z0 * self.gamma * l_array[in_table]**(1/3) \
+                * (table_values[:, 0] + 1j*table_values[:, 1])
+
+        out_of_table = np.invert(in_table)
+        if np.count_nonzero(out_of_table) > 0:
+            impedance[out_of_table] = self._exact_impedance(frequency_array[out_of_table],
+                                                            **kwargs)
+
+        self.frequency_array = frequency_array
+        self.impedance = impedance
+
+    def _exact_impedance(self, frequency_array, **kwargs):
+        # the exact methods assume increasing frequencies and set self.impedance
+        order = np.argsort(frequency_array)
+        self._exact_imped_calc(frequency_array[order], **kwargs)
+        impedance = np.empty_like(self.impedance)
+        impedance[order] = self.impedance
+        return impedance
+
+    def _table_cache_key(self, kwargs):
+        return (float(self.r_bend), float(self.gamma), float(self.chamber_height),
+                self.table_range, float(self.table_rtol), tuple(sorted(kwargs.items())))
+
+    def _load_table(self, key, kwargs):
+        r"""
+        Returns the interpolant of the table for the given key, from memory, from `cache_dir`
+        or computed from scratch, in this order.
+        """
+
+        table_cache = CoherentSynchrotronRadiation._table_cache
+        if key in table_cache:
+            table_cache.move_to_end(key)
+            return table_cache[key]
+
+        file_name = None
+        if self.cache_dir is not None:
+            file_name = os.path.join(
+                self.cache_dir,
+                'csr_table_' + hashlib.sha1(repr(key).encode()).hexdigest() + '.npz')
+
+        if file_name is not None and os.path.isfile(file_name):
+            with np.load(file_name) as data:
+                log_l, table_values = data['log_l'], data['table_values']
+        else:
+            log_l, table_values = self._compute_table(kwargs)
+            if file_name is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.savez(file_name, log_l=log_l, table_values=table_values,
+                         key=repr(key))
+
+        table = CubicSpline(log_l, table_values, axis=0)
+        if self.table_cache_size > 0:
+            table_cache[key] = table
+            while len(table_cache) > self.table_cache_size:
+                table_cache.popitem(last=False)
+        return table
+
+    def _compute_table(self, kwargs, points_per_decade=8, max_refinements=12):
+        r"""
+        Tabulates :math:`Z / (Z_0 \gamma (f/f_{crit})^{1/3})`, which is of order one over the
+        whole spectrum, on a grid in :math:`\log(f/f_{crit})`. Intervals are split in two until
+        the cubic interpolation reproduces the exact impedance at their midpoints within
+        `table_rtol`, at most `max_refinements` times; a warning is issued if intervals are
+        still less accurate.
+
+        Returns
+        -------
+        log_l : float array
+            Logarithm of the normalised frequencies of the table
+        table_values : float array
+            Real and imaginary parts of the normalised impedance, shape (len(log_l), 2)
+        """
+
+        def normalised_impedance(log_l):
+            # clipped, so that the rounding of the edges does not cross the transitions to
+            # the approximate expressions
+            l_array = np.clip(np.exp(log_l), *self.table_range)
+            impedance = self._exact_impedance(l_array * self.f_crit, **kwargs) \
+                / (self.Z0 * self.gamma * l_array**(1/3))
+            return np.stack([impedance.real, impedance.imag], axis=1)
+
+        log_range = np.log(self.table_range)
+        n_points = max(int(np.ceil(points_per_decade * np.diff(log_range)[0] / np.log(10))), 4)
+        log_l = np.linspace(log_range[0], log_range[1], n_points)
+        table_values = normalised_impedance(log_l)
+
+        # indices of the intervals which have to be split
+        to_refine = np.arange(len(log_l) - 1)
+
+        for refinement in range(max_refinements):
+            if len(to_refine) == 0:
+                break
+
+            midpoints = 0.5 * (log_l[to_refine] + log_l[to_refine+1])
+            exact_values = normalised_impedance(midpoints)
+            interpolated_values = CubicSpline(log_l, table_values, axis=0)(midpoints)
+
+            error = np.max(np.abs(interpolated_values - exact_values), axis=1) \
+                / np.maximum(np.max(np.abs(exact_values), axis=1),
+                             self.table_rtol * np.max(np.abs(table_values)))
+
+            # insert the midpoints and flag both halves of inaccurate intervals
+            positions = np.searchsorted(log_l, midpoints)
+            log_l = np.insert(log_l, positions, midpoints)
+            table_values = np.insert(table_values, positions, exact_values, axis=0)
+
+            not_converged = positions[error > self.table_rtol] + np.arange(len(positions))[
+                error > self.table_rtol]
+            to_refine = np.sort(np.concatenate((not_converged - 1, not_converged)))
+
+        if len(to_refine) > 0:
+            warnings.warn("WARNING in CoherentSynchrotronRadiation: %d intervals of the"
+                          % len(to_refine) + " table are not within table_rtol after"
+                          + " %d refinements" % max_refinements)
+
+        return log_l, table_values
+
     def _pp_low_frequency(self, frequency_array, u_max=10, high_frequency_transition=np.inf):
         """
         Computes the parallel-plates impedance according to eq. 8 of [Chao2011]_. For frequencies
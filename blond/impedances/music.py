@@ -303,3 +303,142 @@ class Music(object):
             self.induced_voltage[i+1] = \
                 self.const*(0.5+self.induced_voltage[i+1])
             self.beam.dE[i+1] += self.induced_voltage[i+1]
+
+
+class MusicParallel(object):
+
+    r"""
+    Multi-threaded implementation of the MuSiC algorithm for one or several
+    resonant modes, cost = O(n) per turn.
+
+    Contrary to the Music class, the beam coordinates are never reordered, so
+    that the correspondence with the particle id is preserved. A permutation
+    sorting the beam in dt is kept from one turn to the next and updated with
+    an incremental sort, which is O(n) since the particles move little per
+    turn. The 2x2 transfer matrices of the MuSiC recursion are diagonalised,
+    which turns the recursion into a complex affine map per resonator that is
+    evaluated with a parallel prefix scan in C++.
+
+    Parameters
+    ----------
+    Beam : object
+        Beam object.
+    resonators : float list
+        List of the resonator parameters:
+        [shunt impedance [:math:`\Omega`], angular resonant frequency [rad/s],
+        quality factor [1]], or a list of such lists for several resonators.
+    n_macroparticles : int
+        Number of macro-particles [1].
+    n_particles : float
+        Beam intensity [1].
+    t_rev : float
+        Revolution period [s]
+
+    Attributes
+    ----------
+    beam : object
+        Beam object.
+    R_S : float array
+        shunt impedances [:math:`\Omega`]
+    omega_R : float array
+        angular resonant frequencies [rad/s]
+    Q : float array
+        quality factors [1]
+    n_resonators : int
+        Number of resonators [1].
+    alpha : float array
+        Definition dependent on previously defined attributes.
+    omega_bar : float array
+        Definition dependent on previously defined attributes.
+    const : float array
+        Definition dependent on previously defined attributes.
+    s : complex array
+        Eigenvalues of the transfer matrices, -alpha + j omega_bar [1/s]
+    weight : complex array
+        Projection of the diagonalised state on the induced voltage.
+    state : complex array
+        Diagonalised MuSiC state of each resonator after the last particle.
+    permutation : int array
+        Indices sorting beam.dt at the last call.
+    induced_voltage : float array
+        Output induced voltage [V], in the order of the beam coordinates
+        (multiplied by -1 for BLonD conventions)
+    t_rev : float
+        Revolution period [s]
+    last_dt: float
+        Last longitudinal coordinate of the beam [s]
+
+    Examples
+    --------
+    >>> import impedances.music as musClass
+    >>>
+    >>> music = musClass.MusicParallel(my_beam,
+    >>>                                [[R_S_1, omega_R_1, Q_1],
+    >>>                                 [R_S_2, omega_R_2, Q_2]],
+    >>>                                n_macroparticles, n_particles, t_rev)
+    >>> music.track()
+    >>> for i in range(2, n_turns):
+    >>>     music.track_multi_turn()
+
+    """
+
+    def __init__(self, Beam, resonators, n_macroparticles, n_particles,
+                 t_rev):
+
+        self.beam = Beam
+        resonators = np.atleast_2d(np.array(resonators, dtype=float))
+        self.R_S = resonators[:, 0]
+        self.omega_R = resonators[:, 1]
+        self.Q = resonators[:, 2]
+        self.n_resonators = len(self.R_S)
+        self.n_macroparticles = n_macroparticles
+        self.n_particles = n_particles
+        self.alpha = self.omega_R / (2*self.Q)
+        self.omega_bar = np.sqrt(self.omega_R ** 2 - self.alpha ** 2)
+        self.const = -e*self.R_S*self.omega_R * \
+            self.n_particles/(self.n_macroparticles*self.Q)
+        self.s = -self.alpha + 1j*self.omega_bar
+        self.weight = 1 + 1j*self.alpha/self.omega_bar
+        self.state = np.zeros(self.n_resonators,
+                              dtype=bm.precision.complex_t)
+        self.t_rev = t_rev
+        self.permutation = np.argsort(self.beam.dt,
+                                      kind='stable').astype(np.int32)
+        self.induced_voltage = np.zeros(len(self.beam.dt),
+                                        dtype=bm.precision.real_t)
+        self.last_dt = self.beam.dt[self.permutation[-1]]
+
+    def _track(self, multi_turn):
+
+        if len(self.permutation) != len(self.beam.dt):
+            # The beam changed size, e.g. after eliminating lost particles
+            self.permutation = np.argsort(self.beam.dt,
+                                          kind='stable').astype(np.int32)
+            self.induced_voltage = np.zeros(len(self.beam.dt),
+                                            dtype=bm.precision.real_t)
+
+        bm.music_track_parallel(self.beam.dt, self.beam.dE,
+                                self.induced_voltage, self.permutation,
+                                self.state, self.s, self.weight, self.const,
+                                self.t_rev - self.last_dt, multi_turn)
+        self.last_dt = self.beam.dt[self.permutation[-1]]
+
+    def track(self):
+        r"""
+        Voltage in time domain (single-turn) using MuSiC (parallel C++ code).
+        Note: this method should also be called at turn number 1 when
+        multi-turn voltage computations are needed.
+
+        """
+
+        self._track(False)
+
+    def track_multi_turn(self):
+        r"""
+        Voltage in time domain (multi-turn) using MuSiC (parallel C++ code).
+        Note: this method should be called from turn number 2 onwards when
+        multi-turn voltage computations are needed.
+
+        """
+
+        self._track(True)
@@ -78,7 +78,8 @@ class RFStation(object):
         the harmonic condition. For input options, see above.
     phi_noise : float (opt: float array/matrix)
         Optional, programmed RF cavity phase noise, :math:`\phi_{N,l,n}` [rad].
-        Added to all RF systems in the station. For input options, see above
+        Added to all RF systems in the station. For input options, see above;
+        also accepts the StreamedPhaseNoise of FlatSpectrum.stream()
     phi_modulation : class (opt: iterable of classes)
         A PhaseModulation type class (or iterable of classes)
     RFStationOptions : class
@@ -302,8 +303,18 @@ class RFStation(object):
                 Ring.RingOptions.t_start)
         self.omega_rf_d = self.omega_rf_d.astype(bm.precision.real_t, order='C', copy=False)
 
-        # Reshape phase noise
-        if phi_noise is not None:
+        # Reshape phase noise; phase noise streamed while tracking is used
+        # as it is
+        from ..llrf.rf_noise import StreamedPhaseNoise
+        if isinstance(phi_noise, StreamedPhaseNoise):
+            if phi_noise.shape != (self.n_rf, self.n_turns+1):
+                #InputDataError
+                raise RuntimeError("ERROR in RFStation: the streamed phase" +
+                                   " noise does not match the RF systems" +
+                                   " and turns of the station!")
+            self.phi_noise = phi_noise
+
+        elif phi_noise is not None:
             self.phi_noise = RFStationOptions.reshape_data(
                 phi_noise,
                 self.n_turns,
@@ -64,6 +64,9 @@ class BeamFeedback(object):
             self.time_offset = None
         else:
             self.time_offset = self.config['time_offset']
+        # Bin index of the time offset, and the bins it was calculated for
+        self._time_offset_index = 0
+        self._time_offset_key = None
 
         #: | *Phase loop gain. Implementation depends on machine.*
         try:
@@ -144,6 +147,11 @@ class BeamFeedback(object):
             self.gain2[0] = self.gain2[0] * np.ones(Ring.n_turns+1)
             self.gain2[1] = self.gain2[1] * np.ones(Ring.n_turns+1)
 
+            #: | *RF frequency offset per relative radial displacement [1/s]
+            #: for each turn, for radial loop.*
+            self.dR_over_R_coefficient = RFStation.omega_rf_d[0] * \
+                (1./(Ring.alpha_0[0]*RFStation.gamma**2) - 1.)
+
             #: | *Optional: PL & RL acting only in certain time intervals/turns.*
             self.dt = 0
             # | *Phase Loop sampling period [s]*
@@ -226,24 +234,51 @@ class BeamFeedback(object):
     def precalculate_time(self, Ring):
         '''
         *For machines like the PSB, where the PL acts only in certain time
-        intervals, pre-calculate on which turns to act.*
+        intervals, pre-calculate on which turns to act. Starting after the
+        delay, each interval ends on the first turn where the revolution
+        periods accumulated since the start of the interval reach the period
+        dt; a last, incomplete interval is marked by a zero.*
         '''
 
         if self.dt > 0:
+            n_turns = Ring.t_rev.size
+            # Cumulative revolution time before each turn
+            t_cumulative = np.concatenate(([0.], np.cumsum(Ring.t_rev)))
+            # Last turn of an interval starting at each turn; at least the
+            # starting turn itself
+            interval_end = np.searchsorted(t_cumulative,
+                                           t_cumulative[:-1] + self.dt) - 1
+            interval_end = np.maximum(interval_end, np.arange(n_turns))
+            interval_end = interval_end.tolist()
+
+            on_time = []
             n = self.delay + 1
-            while n < Ring.t_rev.size:
-                summa = 0
-                while summa < self.dt:
-                    try:
-                        summa += Ring.t_rev[n]
-                        n += 1
-                    except:
-                        self.on_time = np.append(self.on_time, 0)
-                        return
-                self.on_time = np.append(self.on_time, n-1)
+            while n < n_turns:
+                if interval_end[n] >= n_turns:
+                    on_time.append(0)
+                    break
+                on_time.append(interval_end[n])
+                n = interval_end[n] + 1
+            self.on_time = np.array(on_time, dtype=float)
         else:
             self.on_time = np.arange(Ring.t_rev.size)
 
+    def time_offset_index(self):
+        '''
+        *Index of the first bin at or after time_offset, from which the beam
+        phase is measured. The index is recalculated only if the bins of the
+        profile have changed.*
+        '''
+
+        bin_centers = self.profile.bin_centers
+        key = (float(bin_centers[0]), float(bin_centers[-1]), len(bin_centers))
+        if key != self._time_offset_key:
+            self._time_offset_index = int(bm.searchsorted(bin_centers,
+                                                          self.time_offset))
+            self._time_offset_key = key
+
+        return self._time_offset_index
+
     def beam_phase(self):
         '''
         *Beam phase measured at the main RF frequency and phase. The beam is 
@@ -265,10 +300,9 @@ class BeamFeedback(object):
                                   self.alpha, omega_rf, phi_rf,
                                   self.profile.bin_size)
         else:
-            indexes = self.profile.bin_centers >= self.time_offset
-            time_offset = self.time_offset
-            coeff = bm.beam_phase(self.profile.bin_centers[indexes],
-                              self.profile.n_macroparticles[indexes],
+            index = self.time_offset_index()
+            coeff = bm.beam_phase(self.profile.bin_centers[index:],
+                                  self.profile.n_macroparticles[index:],
                                   self.alpha, omega_rf, phi_rf,
                                   self.profile.bin_size)
             # exp = bm.exp(self.alpha*(self.profile.bin_centers[indexes] -
@@ -542,10 +576,8 @@ class BeamFeedback(object):
 
             # Radial loop
             self.dR_over_R = (self.rf_station.omega_rf[0, counter] -
-                              self.rf_station.omega_rf_d[0, counter])/(
-                self.rf_station.omega_rf_d[0, counter] *
-                         (1./(self.ring.alpha_0[0, counter] *
-                              self.rf_station.gamma[counter]**2) - 1.))
+                              self.rf_station.omega_rf_d[0, counter]) / \
+                self.dR_over_R_coefficient[counter]
 
             self.domega_RL = self.domega_RL + self.gain2[0][counter]*(self.dR_over_R
                                                                       - self.dR_over_R_prev) + self.gain2[1][counter]*self.dR_over_R
@@ -13,21 +13,21 @@
 :Authors: **Birk Emil Karlsen-Baeck**, **Helga Timko**
 '''
 
+from concurrent.futures import ThreadPoolExecutor, wait
 import logging
 import matplotlib.pyplot as plt
 import numpy as np
-import scipy.signal
 import sys
 
 
 from blond.llrf.signal_processing import comb_filter, cartesian_to_polar,\
     polar_to_cartesian, modulator, moving_average,\
-    rf_beam_current, moving_average_improved
+    rf_beam_current, moving_average_improved, FIRFilter, FFTConvolution,\
+    TurnBuffer, TurnBufferAttribute
 from blond.llrf.impulse_response import SPS3Section200MHzTWC, \
     SPS4Section200MHzTWC, SPS5Section200MHzTWC
 from blond.llrf.signal_processing import feedforward_filter_TWC3, \
     feedforward_filter_TWC4, feedforward_filter_TWC5
-from blond.utils import bmath as bm
 
 
 def get_power_gen_I2(I_gen_per_cav, Z_0):
@@ -57,7 +57,8 @@ class CavityFeedbackCommissioning(object):
         V_SET : complex array
             Array set point voltage; default is False
         cpp_conv : bool
-            Enable (True) or disable (False) convolutions using a C++ implementation; default is False
+            Kept for compatibility, without effect: the convolutions use the
+            FFT of the impulse responses; default is False
         pwr_clamp : bool
             Enable (True) or disable (False) power clamping; default is False
         rot_IQ : complex
@@ -76,6 +77,90 @@ class CavityFeedbackCommissioning(object):
         self.rot_IQ = rot_IQ
 
 
+class CavityFeedbackScheduler(object):
+    """Runs independent cavity feedbacks, e.g. several SPSOneTurnFeedback
+    objects, concurrently in a thread pool. The FFTs and most numpy
+    operations on the feedback arrays release the GIL, so that the feedbacks
+    can use several cores. With start() and wait(), the feedbacks can also
+    run in the background of other tracking that does not depend on them.
+
+    Parameters
+    ----------
+    feedbacks : list
+        Feedback objects; they must not share any state that is modified
+        during tracking
+    n_threads : int
+        Number of threads; default is None for one thread per feedback. With
+        one thread, the feedbacks are tracked one after the other in the
+        calling thread
+
+    Attributes
+    ----------
+    running : bool
+        True between start() and wait()
+    """
+
+    def __init__(self, feedbacks, n_threads=None):
+
+        self.feedbacks = list(feedbacks)
+        if n_threads is None:
+            n_threads = len(self.feedbacks)
+        self.n_threads = int(n_threads)
+        if self.n_threads < 1:
+            raise RuntimeError("ERROR in CavityFeedbackScheduler: n_threads" +
+                               " has to be a positive integer!")
+
+        if self.n_threads > 1:
+            self._executor = ThreadPoolExecutor(self.n_threads)
+        else:
+            self._executor = None
+        self._futures = []
+        self.running = False
+
+    def start(self, method='track'):
+        """Starts tracking the feedbacks in the background.
+
+        Parameters
+        ----------
+        method : str
+            Name of the method called for each feedback; default is 'track'
+        """
+
+        if self.running:
+            raise RuntimeError("ERROR in CavityFeedbackScheduler: the" +
+                               " feedbacks are still running!")
+
+        if self._executor is None:
+            for feedback in self.feedbacks:
+                getattr(feedback, method)()
+        else:
+            self._futures = [self._executor.submit(getattr(feedback, method))
+                             for feedback in self.feedbacks]
+        self.running = True
+
+    def wait(self):
+        """Waits for all feedbacks to finish tracking; exceptions raised in
+        the feedbacks are raised here."""
+
+        futures, self._futures = self._futures, []
+        self.running = False
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    def track(self, method='track'):
+        """Tracks all feedbacks and waits for them to finish.
+
+        Parameters
+        ----------
+        method : str
+            Name of the method called for each feedback; default is 'track'
+        """
+
+        self.start(method)
+        self.wait()
+
+
 class SPSCavityFeedback(object):
     """Class determining the turn-by-turn total RF voltage and phase correction
     originating from the individual cavity feedbacks. Assumes two 4-section and
@@ -117,6 +202,14 @@ class SPSCavityFeedback(object):
     df : float or list
         Frequency difference between measured frequency and desired frequency;
         same convetion as G_ff; default is 0
+    n_threads : int
+        Number of threads to track the two feedbacks concurrently; default is
+        1
+    steady_state : bool
+        Initialises the feedbacks with the steady state without beam instead
+        of pre-tracking; the pre-tracking then stops as soon as the generator
+        voltage changes by less than steady_state_rtol from turn to turn, at
+        the latest after 'turns' turns. Default is False
 
     Attributes
     ----------
@@ -124,6 +217,8 @@ class SPSCavityFeedback(object):
         An SPSOneTurnFeedback type class; 3/4-section cavity for post/pre-LS2
     OTFB_2 : class
         An SPSOneTurnFeedback type class; 4/5-section cavity for post/pre-LS2
+    scheduler : class
+        A CavityFeedbackScheduler type class tracking OTFB_1 and OTFB_2
     V_sum : complex array
         Vector sum of RF voltage from all the cavities
     V_corr : float array
@@ -135,9 +230,14 @@ class SPSCavityFeedback(object):
 
     """
 
+    #: Relative change of the generator voltage from turn to turn below which
+    #: the pre-tracking is converged, with steady_state
+    steady_state_rtol = 1e-10
+
     def __init__(self, RFStation, Beam, Profile, G_ff=1, G_llrf=10, G_tx=0.5,
                  a_comb=None, turns=1000, post_LS2=True, V_part=None, df=0,
-                 Commissioning=CavityFeedbackCommissioning()):
+                 Commissioning=CavityFeedbackCommissioning(), n_threads=1,
+                 steady_state=False):
 
 
         # Options for commissioning the feedback
@@ -225,6 +325,9 @@ class SPSCavityFeedback(object):
                                              df=float(df_2),
                                              Commissioning=self.Commissioning)
 
+        self.scheduler = CavityFeedbackScheduler([self.OTFB_1, self.OTFB_2],
+                                                 n_threads=n_threads)
+
         # Set up logging
         self.logger = logging.getLogger(__class__.__name__)
         self.logger.info("Class initialized")
@@ -235,12 +338,12 @@ class SPSCavityFeedback(object):
             #FeedbackError
             raise RuntimeError("ERROR in SPSCavityFeedback: 'turns' has to" +
                                " be a positive integer!")
+        self.steady_state = bool(steady_state)
         self.track_init(debug=Commissioning.debug)
 
     def track(self):
 
-        self.OTFB_1.track()
-        self.OTFB_2.track()
+        self.scheduler.track()
 
         self.V_sum = self.OTFB_1.V_ANT_FINE[-self.OTFB_1.profile.n_slices:] \
                      + self.OTFB_2.V_ANT_FINE[-self.OTFB_2.profile.n_slices:]
@@ -263,16 +366,35 @@ class SPSCavityFeedback(object):
             ax.grid()
             ax.set_ylabel('Voltage [V]')
 
+        feedbacks = [self.OTFB_1, self.OTFB_2]
+        if self.steady_state:
+            for OTFB in feedbacks:
+                if not OTFB.set_point_modulation:
+                    OTFB.steady_state()
+            V_previous = [np.copy(OTFB.V_IND_COARSE_GEN[-OTFB.n_coarse:])
+                          for OTFB in feedbacks]
+
         for i in range(self.turns):
             self.logger.debug("Pre-tracking w/o beam, iteration %d", i)
-            self.OTFB_1.track_no_beam()
+            self.scheduler.track('track_no_beam')
+            if self.steady_state:
+                V_present = [OTFB.V_IND_COARSE_GEN[-OTFB.n_coarse:]
+                             for OTFB in feedbacks]
+                converged = all(
+                    np.max(np.abs(V_pres - V_prev))
+                    <= self.steady_state_rtol * np.max(np.abs(V_pres))
+                    for V_pres, V_prev in zip(V_present, V_previous))
+                V_previous = [np.copy(V_pres) for V_pres in V_present]
             if debug:
                 ax.plot(self.OTFB_1.profile.bin_centers*1e6,
                          np.abs(self.OTFB_1.V_ANT_FINE[-self.OTFB_1.profile.n_slices:]), color=colors[i])
                 ax.plot(self.OTFB_1.rf_centers*1e6,
                          np.abs(self.OTFB_1.V_ANT[-self.OTFB_1.n_coarse:]), color=colors[i],
                          linestyle='', marker='.')
-            self.OTFB_2.track_no_beam()
+            if self.steady_state and converged:
+                self.logger.debug("Pre-tracking w/o beam converged after" +
+                                  " %d iterations", i + 1)
+                break
         if debug:
             plt.show()
 
@@ -347,12 +469,38 @@ class SPSOneTurnFeedback(object):
     V_ANT : complex array
         Antenna voltage [V] at present and last turn in (I,Q) coordinates
         which is used internally for LLRF tracking
+    turn_buffers : dict
+        TurnBuffer objects holding the signals of the previous and present
+        turn, e.g. V_ANT; the signals are views into these buffers
     logger : logger
         Logger of the present class
 
     Note: All currents are in units of charge because the sampling time drops out during the convolution calculation
     """
 
+    # Signals of the previous and present turn
+    V_SET = TurnBufferAttribute()
+    V_ANT_FINE = TurnBufferAttribute()
+    V_ANT = TurnBufferAttribute()
+    DV_GEN = TurnBufferAttribute()
+    DV_COMB_OUT = TurnBufferAttribute()
+    DV_DELAYED = TurnBufferAttribute()
+    DV_MOD_FR = TurnBufferAttribute()
+    DV_MOV_AVG = TurnBufferAttribute()
+    DV_MOD_FRF = TurnBufferAttribute()
+    I_GEN = TurnBufferAttribute()
+    V_IND_COARSE_GEN = TurnBufferAttribute()
+    I_FINE_BEAM = TurnBufferAttribute()
+    I_COARSE_BEAM = TurnBufferAttribute()
+    V_IND_FINE_BEAM = TurnBufferAttribute()
+    V_IND_COARSE_BEAM = TurnBufferAttribute()
+    I_BEAM_COARSE_FF = TurnBufferAttribute()
+    I_BEAM_COARSE_FF_MOD = TurnBufferAttribute()
+    I_FF_CORR_MOD = TurnBufferAttribute()
+    I_FF_CORR = TurnBufferAttribute()
+    V_FF_CORR = TurnBufferAttribute()
+    DV_FF = TurnBufferAttribute()
+
     def __init__(self, RFStation, Beam, Profile, n_sections, n_cavities=4,
                  V_part=4/9, G_ff=1, G_llrf=10, G_tx=0.5, a_comb=63/64, df=0,
                  Commissioning=CavityFeedbackCommissioning()):
@@ -381,13 +529,12 @@ class SPSOneTurnFeedback(object):
             self.logger.debug("Opening feed-forward on beam current")
         elif self.open_FF == 1:
             self.logger.debug("Closing feed-forward on beam current")
-        self.V_SET = Commissioning.V_SET
-        if self.V_SET is None:                                  # Vset as array or not
+        V_SET = Commissioning.V_SET
+        if V_SET is None:                                       # Vset as array or not
             self.set_point_modulation = False
         else:
             self.set_point_modulation = True
 
-        self.cpp_conv = Commissioning.cpp_conv
         self.rot_IQ = Commissioning.rot_IQ
 
         # Read input
@@ -417,6 +564,7 @@ class SPSOneTurnFeedback(object):
                 self.coeff_FF = getattr(sys.modules[__name__],
                                 "feedforward_filter_TWC" + str(n_sections))
                 self.n_FF = len(self.coeff_FF)          # Number of coefficients for FF
+                self.filter_FF = FIRFilter(self.coeff_FF)
                 self.n_FF_delay = int(0.5 * (self.n_FF - 1) +
                                       0.5 * self.TWC.tau/self.rf.t_rf[0,0]/5)
                 self.logger.debug("Feed-forward delay in samples %d",
@@ -434,11 +582,6 @@ class SPSOneTurnFeedback(object):
                           " partition %.2f, gain: %.2e", self.n_cavities,
                           n_sections, self.V_part, self.G_tx)
 
-        if self.cpp_conv:
-            self.conv = getattr(self, 'call_conv')
-        else:
-            self.conv = getattr(self, 'matr_conv')
-
         # TWC resonant frequency
         self.omega_r = self.TWC.omega_r
         # Length of arrays in LLRF
@@ -448,35 +591,36 @@ class SPSOneTurnFeedback(object):
         self.update_variables()
 
         # Check array length for set point modulation
+        self.V_SET = TurnBuffer(self.n_coarse)
         if self.set_point_modulation:
-            if self.V_SET.shape[0] != 2 * self.n_coarse:
+            if V_SET.shape[0] != 2 * self.n_coarse:
                 raise RuntimeError("V_SET length should be %d" %(2*self.n_coarse))
+            self.V_SET = V_SET
             self.set_point = getattr(self, "set_point_mod")
         else:
             self.set_point = getattr(self, "set_point_std")
-            self.V_SET = np.zeros(2 * self.n_coarse, dtype=complex)
 
         # Initialize bunch-by-bunch voltage array with lenght of profile
-        self.V_ANT_FINE = np.zeros(2 * self.profile.n_slices, dtype=complex)
+        self.V_ANT_FINE = TurnBuffer(self.profile.n_slices)
         # Array to hold the bucket-by-bucket voltage with length LLRF
-        self.V_ANT = np.zeros(2 * self.n_coarse, dtype=complex)
-        self.DV_GEN = np.zeros(2 * self.n_coarse, dtype=complex)
+        self.V_ANT = TurnBuffer(self.n_coarse)
+        self.DV_GEN = TurnBuffer(self.n_coarse)
         self.logger.debug("Length of arrays on coarse grid 2x %d", self.n_coarse)
 
         # LLRF MODEL ARRAYS
         # Initialize comb filter
-        self.DV_COMB_OUT = np.zeros(2 * self.n_coarse, dtype=complex)
+        self.DV_COMB_OUT = TurnBuffer(self.n_coarse)
         self.a_comb = float(a_comb)
 
         # Initialize the delayed signal
-        self.DV_DELAYED = np.zeros(2 * self.n_coarse, dtype=complex)
+        self.DV_DELAYED = TurnBuffer(self.n_coarse)
 
         # Initialize modulated signal (to fr)
-        self.DV_MOD_FR = np.zeros(2 * self.n_coarse, dtype=complex)
+        self.DV_MOD_FR = TurnBuffer(self.n_coarse)
 
         # Initialize moving average
         self.n_mov_av = int(self.TWC.tau/self.rf.t_rf[0, 0])
-        self.DV_MOV_AVG = np.zeros(2 * self.n_coarse, dtype=complex)
+        self.DV_MOV_AVG = TurnBuffer(self.n_coarse)
         self.logger.debug("Moving average over %d points", self.n_mov_av)
         if self.n_mov_av < 2:
             raise RuntimeError("ERROR in SPSOneTurnFeedback: profile has to" +
@@ -484,35 +628,38 @@ class SPSOneTurnFeedback(object):
 
         # GENERATOR MODEL ARRAYS
         # Initialize modulated signal (to frf)
-        self.DV_MOD_FRF = np.zeros(2 * self.n_coarse, dtype=complex)
+        self.DV_MOD_FRF = TurnBuffer(self.n_coarse)
 
         # Initialize generator current
-        self.I_GEN = np.zeros(2 * self.n_coarse, dtype=complex)
+        self.I_GEN = TurnBuffer(self.n_coarse)
 
         # Initialize induced voltage on coarse grid
-        self.V_IND_COARSE_GEN = np.zeros(2 * self.n_coarse, dtype=complex)
-        self.CONV_RES = np.zeros(2 * self.n_coarse, dtype=complex)
-        self.CONV_PREV = np.zeros(self.n_coarse, dtype=complex)
+        self.V_IND_COARSE_GEN = TurnBuffer(self.n_coarse)
+        # Convolution with the generator response, keeping its spectrum
+        self.conv_gen = FFTConvolution(2 * self.n_coarse, self.n_coarse)
 
         # BEAM MODEL ARRAYS
         # Initialize beam current coarse and fine
-        self.I_FINE_BEAM = np.zeros(2 * self.profile.n_slices, dtype=complex)
-        self.I_COARSE_BEAM = np.zeros(2 * self.n_coarse, dtype=complex)
+        self.I_FINE_BEAM = TurnBuffer(self.profile.n_slices)
+        self.I_COARSE_BEAM = TurnBuffer(self.n_coarse)
 
         # Initialize induced beam voltage coarse and fine
-        self.V_IND_FINE_BEAM = np.zeros(2 * self.profile.n_slices, dtype=complex)
-        self.V_IND_COARSE_BEAM = np.zeros(2 * self.n_coarse, dtype=complex)
+        self.V_IND_FINE_BEAM = TurnBuffer(self.profile.n_slices)
+        self.V_IND_COARSE_BEAM = TurnBuffer(self.n_coarse)
+        self.conv_beam_fine = FFTConvolution(self.profile.n_slices)
+        self.conv_beam_coarse = FFTConvolution(2 * self.n_coarse, self.n_coarse)
 
         # Initialise feed-forward; sampled every fifth bucket
         if self.open_FF == 1:
             self.logger.debug('Feed-forward active')
             self.n_coarse_FF = int(self.n_coarse/5)
-            self.I_BEAM_COARSE_FF = np.zeros(2 * self.n_coarse_FF, dtype=complex)
-            self.I_BEAM_COARSE_FF_MOD = np.zeros(2 * self.n_coarse_FF, dtype=complex)
-            self.I_FF_CORR_MOD = np.zeros(2 * self.n_coarse_FF, dtype=complex)
-            self.I_FF_CORR = np.zeros(2 * self.n_coarse_FF, dtype=complex)
-            self.V_FF_CORR = np.zeros(2 * self.n_coarse_FF, dtype=complex)
-            self.DV_FF = np.zeros(2 * self.n_coarse_FF, dtype=complex)
+            self.I_BEAM_COARSE_FF = TurnBuffer(self.n_coarse_FF)
+            self.I_BEAM_COARSE_FF_MOD = TurnBuffer(self.n_coarse_FF)
+            self.I_FF_CORR_MOD = TurnBuffer(self.n_coarse_FF)
+            self.I_FF_CORR = TurnBuffer(self.n_coarse_FF)
+            self.V_FF_CORR = TurnBuffer(self.n_coarse_FF)
+            self.DV_FF = TurnBuffer(self.n_coarse_FF)
+            self.conv_FF = FFTConvolution(2 * self.n_coarse_FF, self.n_coarse_FF)
 
         self.logger.info("Class initialized")
 
@@ -537,14 +684,15 @@ class SPSOneTurnFeedback(object):
         self.beam_model(lpf=False)
 
         # Sum generator- and beam-induced voltages for coarse grid
-        self.V_ANT_START = np.copy(self.V_ANT)
-        self.V_ANT[:self.n_coarse] = self.V_ANT[-self.n_coarse:]
+        # View of the last two turns, unchanged by the advance
+        self.V_ANT_START = self.V_ANT
+        self.turn_buffers['V_ANT'].advance()
         self.V_ANT[-self.n_coarse:] = self.V_IND_COARSE_GEN[-self.n_coarse:] \
                                       + self.V_IND_COARSE_BEAM[-self.n_coarse:]
 
         # Obtain generator-induced voltage on the fine grid by interpolation
-        self.V_ANT_FINE_START = np.copy(self.V_ANT_FINE)
-        self.V_ANT_FINE[:self.profile.n_slices] = self.V_ANT_FINE[-self.profile.n_slices:]
+        self.V_ANT_FINE_START = self.V_ANT_FINE
+        self.turn_buffers['V_ANT_FINE'].advance()
         self.V_ANT_FINE[-self.profile.n_slices:] = self.V_IND_FINE_BEAM[-self.profile.n_slices:] \
                                                    + np.interp(self.profile.bin_centers, self.rf_centers,
                                                                self.V_IND_COARSE_GEN[-self.n_coarse:])
@@ -575,14 +723,71 @@ class SPSOneTurnFeedback(object):
                           / self.profile.bin_size)
 
         # Without beam, the total voltage is equal to the induced generator voltage
-        self.V_ANT_START = np.copy(self.V_ANT)
-        self.V_ANT[:self.n_coarse] = self.V_ANT[-self.n_coarse:]
+        # View of the last two turns, unchanged by the advance
+        self.V_ANT_START = self.V_ANT
+        self.turn_buffers['V_ANT'].advance()
         self.V_ANT[-self.n_coarse:] = self.V_IND_COARSE_GEN[-self.n_coarse:]
 
         self.logger.debug(
             "Average generator voltage, last half of array %.3e V",
             np.mean(np.absolute(self.V_IND_COARSE_GEN[int(0.5 * self.n_coarse):])))
 
+    def steady_state(self):
+        r"""Sets the signals of the last two turns to the steady state without
+        beam, instead of pre-tracking without beam until convergence.
+
+        Without beam and with a constant set point :math:`V_{set}`, the loop
+        is linear and time-invariant (the modulation phase is continuous from
+        turn to turn), so that its steady state is constant along the turn.
+        With the gains at zero frequency of the moving average of the signal
+        modulated to the cavity frequency,
+
+        .. math::
+            g = \frac{1}{N} \sum_{m=0}^{N-1} e^{i (\omega_c - \omega_r) T_s m} \, ,
+
+        and of the cavity, :math:`K = n_{cav} T_s G_{tx}/R_g \sum h_g`, the
+        antenna voltage is
+
+        .. math::
+            V = \frac{K (G_{llrf} g + 1) V_{set}}{1 + K G_{llrf} g} \, ,
+
+        where the commissioning options switch the terms off. The comb filter
+        and the one-turn delay have a unit gain at zero frequency.
+        """
+
+        if self.set_point_modulation:
+            raise RuntimeError("ERROR in SPSOneTurnFeedback: no constant" +
+                               " steady state with set point modulation!")
+
+        self.TWC.impulse_response_gen(self.omega_c, self.rf_centers)
+
+        # Set point of the last two turns
+        self.set_point()
+        self.set_point()
+        V_set = self.V_SET[-1]
+
+        g_mov_avg = np.mean(np.exp(1j * (self.omega_c - self.omega_r) * self.T_s
+                                   * np.arange(self.n_mov_av)))
+        K = self.n_cavities * self.T_s * np.sum(self.TWC.h_gen) * self.G_tx / self.TWC.R_gen
+        G_fb = self.open_FB * self.G_llrf * g_mov_avg
+
+        V_ant = K * (G_fb + self.open_drive) * V_set / (1 + self.open_loop * K * G_fb)
+        DV_gen = self.G_llrf * (V_set - self.open_loop * V_ant)
+
+        self.V_ANT = V_ant
+        self.V_IND_COARSE_GEN = V_ant
+        self.DV_GEN = DV_gen
+        self.DV_COMB_OUT = DV_gen
+        self.DV_DELAYED = DV_gen
+        self.DV_MOD_FRF = self.open_FB * g_mov_avg * DV_gen
+        self.I_GEN = (self.DV_MOD_FRF[-1] + self.open_drive * V_set) * self.G_tx / self.TWC.R_gen
+
+        # Signals modulated to the cavity frequency, the last turn with the
+        # present modulation phase
+        self.DV_MOD_FR = modulator(DV_gen * np.ones(2 * self.n_coarse), self.omega_c, self.omega_r,
+                                   self.T_s, phi_0=(self.dphi_mod - self.phi_mod_0 + self.rf.dphi_rf[0]))
+        self.DV_MOV_AVG = g_mov_avg * self.DV_MOD_FR
+
     def llrf_model(self):
 
         self.set_point()
@@ -602,8 +807,8 @@ class SPSOneTurnFeedback(object):
     def beam_model(self, lpf=False):
 
         # Beam current from profile
-        self.I_COARSE_BEAM[:self.n_coarse] = self.I_COARSE_BEAM[-self.n_coarse:]
-        self.I_FINE_BEAM[:self.profile.n_slices] = self.I_FINE_BEAM[-self.profile.n_slices:]
+        self.turn_buffers['I_COARSE_BEAM'].advance()
+        self.turn_buffers['I_FINE_BEAM'].advance()
         self.I_FINE_BEAM[-self.profile.n_slices:], self.I_COARSE_BEAM[-self.n_coarse:] = \
                 rf_beam_current(self.profile, self.omega_c, self.rf.t_rev[self.counter],
                                 lpf=lpf, downsample={'Ts': self.T_s, 'points': self.n_coarse},
@@ -623,38 +828,37 @@ class SPSOneTurnFeedback(object):
             # TODO: do a test where central frequency is at the RF frequency
 
             # Resample RF beam current to FF sampling frequency
-            self.I_BEAM_COARSE_FF[:self.n_coarse_FF] = self.I_BEAM_COARSE_FF[-self.n_coarse_FF:]
+            self.turn_buffers['I_BEAM_COARSE_FF'].advance()
             I_COARSE_BEAM_RESHAPED = np.copy(self.I_COARSE_BEAM[-self.n_coarse:])
             I_COARSE_BEAM_RESHAPED = I_COARSE_BEAM_RESHAPED.reshape((self.n_coarse_FF, self.n_coarse//self.n_coarse_FF))
             self.I_BEAM_COARSE_FF[-self.n_coarse_FF:] = np.sum(I_COARSE_BEAM_RESHAPED, axis=1) / 5
 
             # Do a down-modulation to the resonant frequency of the TWC
-            self.I_BEAM_COARSE_FF_MOD[:self.n_coarse_FF] = self.I_BEAM_COARSE_FF_MOD[-self.n_coarse_FF:]
+            self.turn_buffers['I_BEAM_COARSE_FF_MOD'].advance()
             self.I_BEAM_COARSE_FF_MOD[-self.n_coarse_FF:] = modulator(self.I_BEAM_COARSE_FF[-self.n_coarse_FF:],
                                                                   omega_i=self.omega_c, omega_f=self.omega_r,
                                                                   T_sampling= 5 * self.T_s,
                                                                   phi_0=(self.dphi_mod + self.rf.dphi_rf[0]))
 
-            self.I_FF_CORR[:self.n_coarse_FF] = self.I_FF_CORR[-self.n_coarse_FF:]
-            for ind in range(self.n_coarse_FF, 2 * self.n_coarse_FF):
-                for k in range(self.n_FF):
-                    self.I_FF_CORR[ind] += self.coeff_FF[k] \
-                                      * self.I_BEAM_COARSE_FF_MOD[ind-k]
+            # Apply the FIR filter, carrying its state over from the last turn
+            self.turn_buffers['I_FF_CORR'].advance()
+            self.I_FF_CORR[-self.n_coarse_FF:] = self.filter_FF.filter(
+                self.I_BEAM_COARSE_FF_MOD[-self.n_coarse_FF:])
 
             # Do a down-modulation to the resonant frequency of the TWC
-            self.I_FF_CORR_MOD[:self.n_coarse_FF] = self.I_FF_CORR_MOD[-self.n_coarse_FF:]
+            self.turn_buffers['I_FF_CORR_MOD'].advance()
             self.I_FF_CORR_MOD[-self.n_coarse_FF:] = modulator(self.I_FF_CORR[-self.n_coarse_FF:],
                                                            omega_i=self.omega_r, omega_f=self.omega_c,
                                                            T_sampling=5 * self.T_s,
                                                            phi_0=-(self.dphi_mod + self.rf.dphi_rf[0]))
 
             # Find voltage from convolution with generator response
-            self.V_FF_CORR[:self.n_coarse_FF] = self.V_FF_CORR[-self.n_coarse_FF:]
+            self.turn_buffers['V_FF_CORR'].advance()
             self.V_FF_CORR[-self.n_coarse_FF:] = self.G_ff \
-                            * self.matr_conv(self.I_FF_CORR_MOD, self.TWC.h_gen[::5])[-self.n_coarse_FF:] * 5 * self.T_s
+                            * self.conv_FF.convolve(self.I_FF_CORR_MOD, self.TWC.h_gen[::5]) * 5 * self.T_s
 
             # Compensate for FIR filter delay
-            self.DV_FF[:self.n_coarse_FF] = self.DV_FF[-self.n_coarse_FF:]
+            self.turn_buffers['DV_FF'].advance()
             self.DV_FF[-self.n_coarse_FF:] = self.V_FF_CORR[self.n_coarse_FF - self.n_FF_delay: - self.n_FF_delay]
 
             # Interpolate to finer grids
@@ -674,7 +878,7 @@ class SPSOneTurnFeedback(object):
             0.5 * np.pi - self.rf.phi_rf[0, self.counter] + np.angle(self.rot_IQ))
 
         # Convert to array
-        self.V_SET[:self.n_coarse] = self.V_SET[-self.n_coarse:]
+        self.turn_buffers['V_SET'].advance()
         self.V_SET[-self.n_coarse:] = self.V_set * np.ones(self.n_coarse) # * self.rot_IQ
 
 
@@ -686,7 +890,7 @@ class SPSOneTurnFeedback(object):
 
     def error_and_gain(self):
 
-        self.DV_GEN[:self.n_coarse] = self.DV_GEN[-self.n_coarse:]
+        self.turn_buffers['DV_GEN'].advance()
         self.DV_GEN[-self.n_coarse:] = self.G_llrf * (self.V_SET[-self.n_coarse:] -
                                                       self.open_loop * self.V_ANT[-self.n_coarse:])
         self.logger.debug("In %s, average set point voltage %.6f MV",
@@ -703,7 +907,7 @@ class SPSOneTurnFeedback(object):
     def comb(self):
 
         # Shuffle present data to previous data
-        self.DV_COMB_OUT[:self.n_coarse] = self.DV_COMB_OUT[-self.n_coarse:]
+        self.turn_buffers['DV_COMB_OUT'].advance()
         # Update present data
         self.DV_COMB_OUT[-self.n_coarse:] = comb_filter(self.DV_COMB_OUT[:self.n_coarse],
                                                         self.DV_GEN[-self.n_coarse:],
@@ -712,12 +916,12 @@ class SPSOneTurnFeedback(object):
 
     def one_turn_delay(self):
 
-        self.DV_DELAYED[:self.n_coarse] = self.DV_DELAYED[-self.n_coarse:]
+        self.turn_buffers['DV_DELAYED'].advance()
         self.DV_DELAYED[-self.n_coarse:] = self.DV_COMB_OUT[self.n_coarse-self.n_delay:-self.n_delay]
 
 
     def mod_to_fr(self):
-        self.DV_MOD_FR[:self.n_coarse] = self.DV_MOD_FR[-self.n_coarse:]
+        self.turn_buffers['DV_MOD_FR'].advance()
         # Note here that dphi_rf is already accumulated somewhere else (i.e. in the tracker).
         self.DV_MOD_FR[-self.n_coarse:] = modulator(self.DV_DELAYED[-self.n_coarse:],
                                                     self.omega_c, self.omega_r,
@@ -726,14 +930,14 @@ class SPSOneTurnFeedback(object):
 
 
     def mov_avg(self):
-        self.DV_MOV_AVG[:self.n_coarse] = self.DV_MOV_AVG[-self.n_coarse:]
+        self.turn_buffers['DV_MOV_AVG'].advance()
         self.DV_MOV_AVG[-self.n_coarse:] = moving_average(self.DV_MOD_FR[-self.n_mov_av - self.n_coarse + 1:], self.n_mov_av)
 
 
     # GENERATOR MODEL
     def mod_to_frf(self):
 
-        self.DV_MOD_FRF[:self.n_coarse] = self.DV_MOD_FRF[-self.n_coarse:]
+        self.turn_buffers['DV_MOD_FRF'].advance()
         # Note here that dphi_rf is already accumulated somewhere else (i.e. in the tracker).
         self.DV_MOD_FRF[-self.n_coarse:] = self.open_FB * modulator(self.DV_MOV_AVG[-self.n_coarse:],
                                                                     self.omega_r, self.omega_c,
@@ -743,16 +947,16 @@ class SPSOneTurnFeedback(object):
 
     def sum_and_gain(self):
 
-        self.I_GEN[:self.n_coarse] = self.I_GEN[-self.n_coarse:]
+        self.turn_buffers['I_GEN'].advance()
         self.I_GEN[-self.n_coarse:] = self.DV_MOD_FRF[-self.n_coarse:] + self.open_drive * self.V_SET[-self.n_coarse:]
         self.I_GEN[-self.n_coarse:] *= self.G_tx / self.TWC.R_gen
 
 
     def gen_response(self):
 
-        self.V_IND_COARSE_GEN[:self.n_coarse] = self.V_IND_COARSE_GEN[-self.n_coarse:]
-        self.V_IND_COARSE_GEN[-self.n_coarse:] = self.n_cavities * self.matr_conv(self.I_GEN,
-                                                 self.TWC.h_gen)[-self.n_coarse:] * self.T_s
+        self.turn_buffers['V_IND_COARSE_GEN'].advance()
+        self.V_IND_COARSE_GEN[-self.n_coarse:] = self.n_cavities * self.conv_gen.convolve(self.I_GEN,
+                                                 self.TWC.h_gen) * self.T_s
 
 
     # BEAM MODEL
@@ -760,36 +964,17 @@ class SPSOneTurnFeedback(object):
         self.logger.debug('Matrix convolution for V_ind')
 
         if coarse:
-            self.V_IND_COARSE_BEAM[:self.n_coarse] = self.V_IND_COARSE_BEAM[-self.n_coarse:]
-            self.V_IND_COARSE_BEAM[-self.n_coarse:] = self.n_cavities * self.matr_conv(self.I_COARSE_BEAM,
-                                                        self.TWC.h_beam_coarse)[-self.n_coarse:] * self.T_s
+            self.turn_buffers['V_IND_COARSE_BEAM'].advance()
+            self.V_IND_COARSE_BEAM[-self.n_coarse:] = self.n_cavities * self.conv_beam_coarse.convolve(
+                                                        self.I_COARSE_BEAM, self.TWC.h_beam_coarse) * self.T_s
         else:
-            self.V_IND_FINE_BEAM[:self.profile.n_slices] = self.V_IND_FINE_BEAM[-self.profile.n_slices:]
+            self.turn_buffers['V_IND_FINE_BEAM'].advance()
             # Only convolve the slices for the current turn because the fine grid points can be less
             # than one turn in length
             self.V_IND_FINE_BEAM[-self.profile.n_slices:] = self.n_cavities \
-                                                            * self.matr_conv(self.I_FINE_BEAM[-self.profile.n_slices:],
-                                                            self.TWC.h_beam)[-self.profile.n_slices:] * self.profile.bin_size
-
-
-    def matr_conv(self, I, h):
-        """Convolution of beam current with impulse response; uses a complete
-        matrix with off-diagonal elements."""
-
-        return scipy.signal.fftconvolve(I, h, mode='full')[:I.shape[0]]
-
-
-    def call_conv(self, signal, kernel):
-        """Routine to call optimised C++ convolution"""
-
-        # Make sure that the buffers are stored contiguously
-        signal = np.ascontiguousarray(signal)
-        kernel = np.ascontiguousarray(kernel)
-
-        result = np.zeros(len(kernel) + len(signal) - 1)
-        bm.convolve(signal, kernel, result=result, mode='full')
-
-        return result
+                                                            * self.conv_beam_fine.convolve(
+                                                                self.I_FINE_BEAM[-self.profile.n_slices:],
+                                                                self.TWC.h_beam) * self.profile.bin_size
 
 
     def update_variables(self):
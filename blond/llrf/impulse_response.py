@@ -15,6 +15,8 @@
 
 from __future__ import division
 
+from collections import OrderedDict
+
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy.constants import c
@@ -207,9 +209,14 @@ class TravellingWaveCavity(object):
         Length [m] of the interaction region
     tau : float
         Cavity filling time [s]
+    cache_size : int
+        Number of impulse responses kept in the cache; each time grid the
+        generator and beam responses are evaluated on takes one entry
 
     """
 
+    cache_size = 6
+
     def __init__(self, l_cell, N_cells, rho, v_g, omega_r, df = 0):
 
         self.l_cell = float(l_cell)
@@ -234,6 +241,9 @@ class TravellingWaveCavity(object):
         self.R_beam = 0.125*self.rho*self.l_cav**2
         self.R_gen = self.l_cav*np.sqrt(0.5*self.rho*self.Z_0)
 
+        # Impulse responses per time grid, see _impulse_response()
+        self._response_cache = OrderedDict()
+
         # Set up logging
         self.logger = logging.getLogger(__class__.__name__)
         self.logger.info("Class initialized")
@@ -274,17 +284,7 @@ class TravellingWaveCavity(object):
                                " should be close to central frequency of the" +
                                " cavity!")
 
-        # Move starting point of impulse response to correct value
-        t_gen = time_coarse - time_coarse[0]
-
-        # Impulse response if on carrier frequency
-        self.h_gen = (self.R_gen / self.tau *
-                      rectangle(t_gen - 0.5*self.tau, self.tau)).astype(np.complex128)
-
-        # Impulse response if not on carrier frequency
-        if np.fabs((self.d_omega)/self.omega_r) > 1e-12:
-            self.h_gen = self.h_gen.real*(np.cos(self.d_omega*t_gen) -          # TODO: Introduced a plus here
-                                          1j*np.sin(self.d_omega*t_gen))
+        self.h_gen = self._impulse_response('gen', time_coarse)
 
     def impulse_response_beam(self, omega_c, time_fine, time_coarse=None):
         r"""Impulse response from the cavity towards the beam. For a signal
@@ -323,31 +323,73 @@ class TravellingWaveCavity(object):
                                " should be close to central frequency of the" +
                                " cavity!")
 
-        # Move starting point of impulse response to correct value
-        t_beam = time_fine - time_fine[0]
+        self.h_beam = self._impulse_response('beam', time_fine)
 
-        # Impulse response if on carrier frequency
-        self.h_beam = (-2*self.R_beam/self.tau*
-                       triangle(t_beam, self.tau)).astype(np.complex128)
+        if time_coarse is not None:
+            self.h_beam_coarse = self._impulse_response('beam', time_coarse)
 
-        # Impulse response if not on carrier frequency
-        if np.fabs((self.d_omega)/self.omega_r) > 1e-12:
-            self.h_beam = self.h_beam.real*(np.cos(self.d_omega*t_beam) -           # TODO: Introduced a plus here
-                                            1j*np.sin(self.d_omega*t_beam))
+    def _impulse_response(self, kind, time):
+        r"""Impulse response towards the generator ('gen') or the beam
+        ('beam') on a given time grid, for the current :math:`\omega_c`.
 
-        if time_coarse is not None:
-            # Move starting point of impulse response to correct value
-            t_beam = time_coarse - time_coarse[0]
+        The real envelope (rectangular resp. triangular function) depends only
+        on the grid relative to its first point and is cached per grid, keyed
+        by its length, step and extent. A change of the carrier frequency only
+        requires the rotation :math:`e^{-i (\omega_c - \omega_r) t}` of the
+        envelope, evaluated where the envelope is non-zero; an unchanged
+        carrier frequency returns the cached response. The cache holds at most
+        cache_size grids, the least recently used one is evicted first.
 
-            # Impulse response if on carrier frequency
-            self.h_beam_coarse = (-2*self.R_beam/self.tau*
-                                  triangle(t_beam, self.tau)).astype(np.complex128)
+        Parameters
+        ----------
+        kind : str
+            'gen' or 'beam'
+        time : float array
+            Time array to act on
+
+        Returns
+        -------
+        complex array
+            Impulse response; shared with the cache, not to be modified
+        """
 
+        # Move starting point of impulse response to correct value
+        t_response = time - time[0]
+
+        key = (kind, len(t_response), t_response[1], t_response[-1])
+        if key in self._response_cache:
+            self._response_cache.move_to_end(key)
+            entry = self._response_cache[key]
+        else:
+            # Impulse response if on carrier frequency
+            if kind == 'gen':
+                envelope = self.R_gen/self.tau * \
+                    rectangle(t_response - 0.5*self.tau, self.tau)
+            else:
+                envelope = -2*self.R_beam/self.tau * \
+                    triangle(t_response, self.tau)
+            n_support = np.flatnonzero(envelope)[-1] + 1
+            entry = {'envelope': envelope[:n_support],
+                     't': t_response[:n_support], 'd_omega': None,
+                     'response': envelope.astype(np.complex128)}
+            self._response_cache[key] = entry
+            if len(self._response_cache) > self.cache_size:
+                self._response_cache.popitem(last=False)
+
+        if entry['d_omega'] != self.d_omega:
+            # New array, as the previous responses may still be in use
+            response = np.zeros(len(entry['response']), dtype=np.complex128)
+            n_support = len(entry['envelope'])
             # Impulse response if not on carrier frequency
             if np.fabs((self.d_omega)/self.omega_r) > 1e-12:
-                self.h_beam_coarse = self.h_beam_coarse.real* \
-                                     (np.cos(self.d_omega*t_beam) -                 # TODO: Introduced a plus here
-                                      1j*np.sin(self.d_omega*t_beam))
+                response[:n_support] = entry['envelope'] * \
+                    np.exp(-1j*self.d_omega*entry['t'])
+            else:
+                response[:n_support] = entry['envelope']
+            entry['response'] = response
+            entry['d_omega'] = self.d_omega
+
+        return entry['response']
 
     def compute_wakes(self, time):
         r"""Computes the wake fields towards the beam and generator on the
@@ -34,7 +34,8 @@ class FlatSpectrum(object):
                  corr_time = 10000, fmin_s0 = 0.8571, fmax_s0 = 1.1, 
                  initial_amplitude = 1.e-6, seed1 = 1234, seed2 = 7564, 
                  predistortion = None, continuous_phase = False, folder_plots =
-                  'fig_noise', print_option = True, initial_final_turns = [0,-1]):
+                  'fig_noise', print_option = True, initial_final_turns = [0,-1],
+                 batch_size = None):
 
         '''
         Generate phase noise from a band-limited spectrum.
@@ -44,6 +45,11 @@ class FlatSpectrum(object):
         Select 'time_points' suitably to resolve the spectrum in frequency 
         domain. After 'corr_time' turns, the seed is changed to cut numerical
         correlated sequences of the random number generator.
+        With 'batch_size', up to that many consecutive time steps of equal
+        length are generated together, drawing the white noise from a
+        counter-based random number generator (Philox, keys 'seed1' and
+        'seed2'); the noise of each time step then does not depend on the
+        batch size, and it can be streamed turn by turn with stream().
         '''
         self.total_n_turns = Ring.n_turns
         self.initial_final_turns = initial_final_turns
@@ -68,9 +74,15 @@ class FlatSpectrum(object):
         self.dphi = np.zeros(self.n_turns+1)
         self.continuous_phase = continuous_phase
         if self.continuous_phase:
-            self.dphi2 = np.zeros(self.n_turns+1+self.corr/4)
+            self.dphi2 = np.zeros(self.n_turns+1+self.corr//4)
         self.folder_plots = folder_plots    
         self.print_option = print_option
+        if batch_size is not None and int(batch_size) < 1:
+            #NoiseError
+            raise RuntimeError('ERROR: batch_size has to be a positive integer!')
+        self.batch_size = batch_size
+        # Number of time points of the time steps, by first turn
+        self._n_time_points = {}
     
     
     def spectrum_to_phase_noise(self, freq, spectrum, transform=None):
@@ -124,69 +136,227 @@ class FlatSpectrum(object):
         self.dphi_output = dPt.real
  
     
-    def generate(self):
-       
-        for i in range(0, int(np.ceil(self.n_turns/self.corr))):
+    def _time_points(self, k):
+        '''
+        Number of time points of the phase noise of the time step starting at
+        turn k, resolving the frequency step delta_f.
+        '''
+
+        if k in self._n_time_points:
+            return self._n_time_points[k]
+
+        f_max = self.f0[k]/2
+        n_points_pos_f_incl_zero = int(np.ceil(f_max/self.delta_f) + 1)
+        nt = 2*(n_points_pos_f_incl_zero - 1)
+        nt_regular = next_regular(int(nt))
+        if nt_regular%2!=0 or nt_regular < self.corr:
+            #NoiseError
+            raise RuntimeError('Error in noise generation!')
+        self._n_time_points[k] = nt_regular
+        return nt_regular
+
+
+    def _spectrum(self, i):
+        '''
+        Frequencies and spectrum of the phase noise of the time step i.
+        '''
+
+        # Scale amplitude to keep area (phase noise amplitude) constant
+        k = i*self.corr       # current time step
+        ampl = self.A_i*self.fs[0]/self.fs[k]
         
-            # Scale amplitude to keep area (phase noise amplitude) constant
-            k = i*self.corr       # current time step
-            ampl = self.A_i*self.fs[0]/self.fs[k]
+        # Calculate the frequency step
+        f_max = self.f0[k]/2
+        n_points_pos_f_incl_zero = int(self._time_points(k)/2 + 1)
+        freq = np.linspace(0, float(f_max), n_points_pos_f_incl_zero)
+        delta_f = f_max/(n_points_pos_f_incl_zero-1) 
+
+        # Construct spectrum   
+        nmin = int(np.floor(self.fmin_s0*self.fs[k]/delta_f))  
+        nmax = int(np.ceil(self.fmax_s0*self.fs[k]/delta_f))    
+        
+        # To compensate the notch due to PL at central frequency
+        if self.predistortion == 'exponential':
             
-            # Calculate the frequency step
-            f_max = self.f0[k]/2
-            n_points_pos_f_incl_zero = int(np.ceil(f_max/self.delta_f) + 1)
-            nt = 2*(n_points_pos_f_incl_zero - 1)
-            nt_regular = next_regular(int(nt))
-            if nt_regular%2!=0 or nt_regular < self.corr:
-                #NoiseError
-                raise RuntimeError('Error in noise generation!')
-            n_points_pos_f_incl_zero = int(nt_regular/2 + 1)  
-            freq = np.linspace(0, float(f_max), n_points_pos_f_incl_zero)
-            delta_f = f_max/(n_points_pos_f_incl_zero-1) 
-
-            # Construct spectrum   
-            nmin = int(np.floor(self.fmin_s0*self.fs[k]/delta_f))  
-            nmax = int(np.ceil(self.fmax_s0*self.fs[k]/delta_f))    
+            spectrum = np.concatenate((np.zeros(nmin), ampl*np.exp(
+                np.log(100.)*np.arange(0,nmax-nmin+1)/(nmax-nmin) ), 
+                                       np.zeros(n_points_pos_f_incl_zero-nmax-1) ))
+         
+        elif self.predistortion == 'linear':
             
-            # To compensate the notch due to PL at central frequency
-            if self.predistortion == 'exponential':
-                
-                spectrum = np.concatenate((np.zeros(nmin), ampl*np.exp(
-                    np.log(100.)*np.arange(0,nmax-nmin+1)/(nmax-nmin) ), 
-                                           np.zeros(n_points_pos_f_incl_zero-nmax-1) ))
-             
-            elif self.predistortion == 'linear':
-                
-                spectrum = np.concatenate((np.zeros(nmin), 
-                    np.linspace(0, float(ampl), nmax-nmin+1), np.zeros(n_points_pos_f_incl_zero-nmax-1)))   
-                
-            elif self.predistortion == 'hyperbolic':
-
-                spectrum = np.concatenate((np.zeros(nmin), 
-                    ampl*np.ones(nmax-nmin+1)* \
-                    1/(1 + 0.99*(nmin - np.arange(nmin,nmax+1))
-                       /(nmax-nmin)), np.zeros(n_points_pos_f_incl_zero-nmax-1) ))
-
-            elif self.predistortion == 'weightfunction':
-
-                frel = freq[nmin:nmax+1]/self.fs[k] # frequency relative to fs0
-                frel[np.where(frel > 0.999)[0]] = 0.999 # truncate center freqs
-                sigma = 0.754 # rms bunch length in rad corresponding to 1.2 ns
-                gamma = 0.577216
-                weight = (4.*np.pi*frel/sigma**2)**2 * \
-                    np.exp(-16.*(1. - frel)/sigma**2) + \
-                    0.25*( 1 + 8.*frel/sigma**2 * 
-                           np.exp(-8.*(1. - frel)/sigma**2) * 
-                           ( gamma + np.log(8.*(1. - frel)/sigma**2) + 
-                             8.*(1. - frel)/sigma**2 ) )**2
-                weight /= weight[0] # normalise to have 1 at fmin
-                spectrum = np.concatenate((np.zeros(nmin), ampl*weight, 
-                                            np.zeros(n_points_pos_f_incl_zero-nmax-1)))
+            spectrum = np.concatenate((np.zeros(nmin), 
+                np.linspace(0, float(ampl), nmax-nmin+1), np.zeros(n_points_pos_f_incl_zero-nmax-1)))   
+            
+        elif self.predistortion == 'hyperbolic':
 
-            else:
-                spectrum = np.concatenate((np.zeros(nmin), 
-                    ampl*np.ones(nmax-nmin+1), np.zeros(n_points_pos_f_incl_zero-nmax-1)))               
+            spectrum = np.concatenate((np.zeros(nmin), 
+                ampl*np.ones(nmax-nmin+1)* \
+                1/(1 + 0.99*(nmin - np.arange(nmin,nmax+1))
+                   /(nmax-nmin)), np.zeros(n_points_pos_f_incl_zero-nmax-1) ))
+
+        elif self.predistortion == 'weightfunction':
+
+            frel = freq[nmin:nmax+1]/self.fs[k] # frequency relative to fs0
+            frel[np.where(frel > 0.999)[0]] = 0.999 # truncate center freqs
+            sigma = 0.754 # rms bunch length in rad corresponding to 1.2 ns
+            gamma = 0.577216
+            weight = (4.*np.pi*frel/sigma**2)**2 * \
+                np.exp(-16.*(1. - frel)/sigma**2) + \
+                0.25*( 1 + 8.*frel/sigma**2 * 
+                       np.exp(-8.*(1. - frel)/sigma**2) * 
+                       ( gamma + np.log(8.*(1. - frel)/sigma**2) + 
+                         8.*(1. - frel)/sigma**2 ) )**2
+            weight /= weight[0] # normalise to have 1 at fmin
+            spectrum = np.concatenate((np.zeros(nmin), ampl*weight, 
+                                        np.zeros(n_points_pos_f_incl_zero-nmax-1)))
+
+        else:
+            spectrum = np.concatenate((np.zeros(nmin), 
+                ampl*np.ones(nmax-nmin+1), np.zeros(n_points_pos_f_incl_zero-nmax-1)))
+
+        return freq, spectrum
+
+
+    def _step_boundaries(self):
+        '''
+        First turn of each time step, and the last turn plus one.
+        '''
+
+        n_steps = int(np.ceil(self.n_turns/self.corr))
+        boundaries = np.arange(n_steps + 1)*self.corr
+        boundaries[-1] = self.n_turns + 1
+        return boundaries
+
+
+    def _phase_noise(self, seed, steps, first=0, last=None):
+        '''
+        Phase noise of the segments 'first' to 'last' of the counter-based
+        random stream with the key 'seed', the segment n having the spectrum
+        of the time step steps[n]. Consecutive segments of equal length are
+        generated together, up to batch_size at a time; each segment draws its
+        white noise from its own position in the stream, independent of the
+        batches.
+        '''
+
+        if last is None:
+            last = len(steps)
+        boundaries = self._step_boundaries()
+        n_points = np.array([self._time_points(boundaries[step])
+                             for step in steps[:last]])
+        # Position of each segment in the stream, in blocks of four numbers
+        offset = np.concatenate(([0], np.cumsum(n_points)//2))
+
+        n = first
+        while n < last:
+            m = n + 1
+            while (m < min(last, n + self.batch_size)
+                   and n_points[m] == n_points[n]):
+                m += 1
+            nt = n_points[n]
+
+            # Generate white noise in time domain
+            bit_generator = rnd.Philox(key=seed).advance(offset[n])
+            r = rnd.Generator(bit_generator).random((m - n, 2, nt))
+            Gt = np.cos(2*np.pi*r[:, 0]) * np.sqrt(-2*np.log1p(-r[:, 1]))
+
+            # Multiply by desired noise probability density and FFT back to
+            # time domain
+            freq, spectrum = zip(*[self._spectrum(step) for step in steps[n:m]])
+            f_max = np.array([f[-1] for f in freq])
+            s = np.sqrt(2*f_max[:, np.newaxis]*np.array(spectrum)) # in [rad]
+            dPt = np.fft.irfft(s*np.fft.rfft(Gt, axis=1), n=nt, axis=1)
+
+            for j in range(n, m):
+                yield j, freq[j-n], spectrum[j-n], dPt[j-n]
+            n = m
+
+
+    def _report(self, i, freq, spectrum, n_turns_step):
+        '''
+        Plot and print the phase noise of the time step i.
+        '''
+
+        if self.folder_plots != None:
+            fig_folder(self.folder_plots)
+            plot_noise_spectrum(freq, spectrum, sampling=1, figno=i, 
+                                dirname = self.folder_plots)
+            plot_phase_noise(self.t[0:n_turns_step],
+                             self.dphi_output[0:n_turns_step], 
+                             sampling=1, figno=i, dirname = self.folder_plots)
             
+        rms_noise = np.std(self.dphi_output)
+        if self.print_option:
+            print("RF noise for time step %.4e s (iter %d) has r.m.s. phase %.4e rad (%.3e deg)" \
+                %(self.t[1], i, rms_noise, rms_noise*180/np.pi))
+
+
+    def _generate_batched(self):
+        '''
+        Phase noise of all time steps, with the counter-based random stream.
+        '''
+
+        boundaries = self._step_boundaries()
+        steps = np.arange(len(boundaries) - 1)
+
+        for i, freq, spectrum, dphi in self._phase_noise(self.seed1, steps):
+            k, kmax = boundaries[i], boundaries[i+1]
+            self.dphi[k:kmax] = dphi[0:(kmax-k)]
+
+            self.t = np.linspace(0, len(dphi)/(2*freq[-1]), len(dphi))
+            self.dphi_output = dphi
+            self._report(i, freq, spectrum, kmax-k)
+
+        if self.continuous_phase:
+            # Delayed by a quarter of a time step, with an additional first
+            # segment
+            delay = self.corr//4
+            steps = np.concatenate(([0], steps))
+            for i, freq, spectrum, dphi in self._phase_noise(self.seed2, steps):
+                if i == 0:
+                    self.dphi2[:delay] = dphi[:delay]
+                else:
+                    k, kmax = boundaries[i-1], boundaries[i]
+                    self.dphi2[(k+delay):(kmax+delay)] = dphi[0:(kmax-k)]
+
+
+    def stream(self):
+        '''
+        Phase noise generated lazily while tracking, to be passed as
+        RFStation.phi_noise instead of generating the noise of all turns.
+        Needs batch_size; not available with continuous_phase and
+        initial_final_turns.
+        '''
+
+        if self.batch_size is None or self.continuous_phase \
+                or self.total_n_turns != self.n_turns:
+            #NoiseError
+            raise RuntimeError('ERROR: streaming of the phase noise needs' +
+                               ' batch_size, without continuous_phase and' +
+                               ' initial_final_turns!')
+        return StreamedPhaseNoise(self)
+
+
+    def generate(self):
+
+        if self.batch_size is None:
+            self._generate_steps()
+        else:
+            self._generate_batched()
+
+        if self.continuous_phase:
+            psi = np.arange(0, self.n_turns+1)*2*np.pi/self.corr
+            self.dphi = self.dphi*np.sin(psi[:self.n_turns+1]) + self.dphi2[:(self.n_turns+1)]*np.cos(psi[:self.n_turns+1])
+        
+        if self.initial_final_turns[0]>0 or self.initial_final_turns[1]<self.total_n_turns+1:
+            self.dphi = np.concatenate((np.zeros(self.initial_final_turns[0]), self.dphi, np.zeros(1+self.total_n_turns-self.initial_final_turns[1])))
+
+
+    def _generate_steps(self):
+       
+        for i in range(0, int(np.ceil(self.n_turns/self.corr))):
+        
+            k = i*self.corr       # current time step
+            freq, spectrum = self._spectrum(i)
             
             # Fill phase noise array
             if i < int(self.n_turns/self.corr) - 1:
@@ -205,31 +375,51 @@ class FlatSpectrum(object):
                     self.spectrum_to_phase_noise(freq, spectrum)
                     self.seed1 +=239
                     self.seed2 +=158
-                    self.dphi2[:self.corr/4] = self.dphi_output[:self.corr/4]
+                    self.dphi2[:self.corr//4] = self.dphi_output[:self.corr//4]
                     
                 self.spectrum_to_phase_noise(freq, spectrum)
                 self.seed1 +=239
                 self.seed2 +=158
-                self.dphi2[(k+self.corr/4):(kmax+self.corr/4)] = self.dphi_output[0:(kmax-k)]
+                self.dphi2[(k+self.corr//4):(kmax+self.corr//4)] = self.dphi_output[0:(kmax-k)]
             
-            if self.folder_plots != None:
-                fig_folder(self.folder_plots)
-                plot_noise_spectrum(freq, spectrum, sampling=1, figno=i, 
-                                    dirname = self.folder_plots)
-                plot_phase_noise(self.t[0:(kmax-k)], self.dphi_output[0:(kmax-k)], 
-                                 sampling=1, figno=i, dirname = self.folder_plots)
-                
-            rms_noise = np.std(self.dphi_output)
-            if self.print_option:
-                print("RF noise for time step %.4e s (iter %d) has r.m.s. phase %.4e rad (%.3e deg)" \
-                    %(self.t[1], i, rms_noise, rms_noise*180/np.pi))
-                
-        if self.continuous_phase:
-            psi = np.arange(0, self.n_turns+1)*2*np.pi/self.corr
-            self.dphi = self.dphi*np.sin(psi[:self.n_turns+1]) + self.dphi2[:(self.n_turns+1)]*np.cos(psi[:self.n_turns+1])
-        
-        if self.initial_final_turns[0]>0 or self.initial_final_turns[1]<self.total_n_turns+1:
-            self.dphi = np.concatenate((np.zeros(self.initial_final_turns[0]), self.dphi, np.zeros(1+self.total_n_turns-self.initial_final_turns[1])))
+            self._report(i, freq, spectrum, kmax-k)
+
+
+class StreamedPhaseNoise(object):
+    '''
+    Phase noise of a FlatSpectrum, generated batch by batch of time steps
+    when a turn outside of the present batch is accessed. Indexed like the
+    phase noise array of RFStation, [n_rf, turn] with a single RF system.
+    '''
+
+    def __init__(self, FlatSpectrum):
+
+        self.noise = FlatSpectrum
+        self.shape = (1, FlatSpectrum.n_turns + 1)
+        self.boundaries = FlatSpectrum._step_boundaries()
+        self.steps = np.arange(len(self.boundaries) - 1)
+
+        # Phase noise of the present batch, from the turn turn_start on
+        self.turn_start = 0
+        self.dphi = np.zeros(0)
+
+    def __getitem__(self, key):
+
+        rows, turn = key
+        if not 0 <= turn < self.shape[1]:
+            raise IndexError('turn %d out of the phase noise range' % turn)
+
+        if not 0 <= turn - self.turn_start < len(self.dphi):
+            step = min(turn//self.noise.corr, len(self.steps) - 1)
+            last = min(step + self.noise.batch_size, len(self.steps))
+            self.dphi = np.concatenate([
+                dphi[:(self.boundaries[i+1] - self.boundaries[i])]
+                for i, freq, spectrum, dphi in self.noise._phase_noise(
+                    self.noise.seed1, self.steps, step, last)])
+            self.turn_start = self.boundaries[step]
+
+        return np.array([self.dphi[turn - self.turn_start]])[rows]
+
 
 class LHCNoiseFB(object): 
     '''
@@ -17,7 +17,11 @@ from __future__ import division
 import numpy as np
 from scipy.constants import e
 from scipy import signal as sgn
+from scipy import fft as sp_fft
 import matplotlib.pyplot as plt
+from collections import OrderedDict
+from functools import lru_cache
+import threading
 
 # Set up logging
 import logging
@@ -25,6 +29,28 @@ logger = logging.getLogger(__name__)
 
 from blond.llrf.impulse_response import TravellingWaveCavity
 
+# Demodulation tables and downsampling boundaries of the recently used
+# profile grids, see rf_beam_current()
+_rf_current_cache = OrderedDict()
+_rf_current_cache_size = 4
+# Feedbacks can run concurrently, see cavity_feedback.CavityFeedbackScheduler
+_rf_current_lock = threading.Lock()
+
+
+def _cached(key, compute):
+    """Returns the cached result for the key, computing it if needed. The
+    least recently used result is evicted first."""
+
+    with _rf_current_lock:
+        if key in _rf_current_cache:
+            _rf_current_cache.move_to_end(key)
+        else:
+            _rf_current_cache[key] = compute()
+            if len(_rf_current_cache) > _rf_current_cache_size:
+                _rf_current_cache.popitem(last=False)
+
+        return _rf_current_cache[key]
+
 
 def polar_to_cartesian(amplitude, phase):
     """Convert data from polar to cartesian (I,Q) coordinates.
@@ -143,8 +169,10 @@ def rf_beam_current(Profile, omega_c, T_rev, lpf=True, downsample=None, external
         Revolution frequency [1/s] at which the current should be calculated
     T_rev : float
         Revolution period [s] of the machine
-    lpf : bool
-        Apply low-pass filter; default is True
+    lpf : bool or LowPassFilter
+        Apply zero-phase low-pass filter; default is True. For a
+        LowPassFilter object, the filter is causal and its state is carried
+        over from the previous call
     downsample : dict
         Dictionary containing float value for 'Ts' sampling time and int value
         for 'points'. Will downsample the RF beam charge onto a coarse time
@@ -164,24 +192,33 @@ def rf_beam_current(Profile, omega_c, T_rev, lpf=True, downsample=None, external
     # Convert from dimensionless to Coulomb/Ampères
     # Take into account macro-particle charge with real-to-macro-particle ratio
     charges = Profile.Beam.ratio*Profile.Beam.Particle.charge*e\
-        * np.copy(Profile.n_macroparticles)
+        * Profile.n_macroparticles
     logger.debug("Sum of particles: %d, total charge: %.4e C",
                  np.sum(Profile.n_macroparticles), np.sum(charges))
     logger.debug("DC current is %.4e A", np.sum(charges)/T_rev)
 
+    # The profile grid is identified by its first and last bin and its
+    # number of bins
+    grid = (Profile.bin_centers[0], Profile.bin_centers[-1],
+            len(Profile.bin_centers))
+
     # Mix with frequency of interest; remember factor 2 demodulation
-    I_f = 2.*charges*np.cos(omega_c*Profile.bin_centers)
-    Q_f = -2.*charges*np.sin(omega_c*Profile.bin_centers)
+    mix_I, mix_Q = _cached(('mixer', omega_c) + grid,
+                           lambda: (2.*np.cos(omega_c*Profile.bin_centers),
+                                    -2.*np.sin(omega_c*Profile.bin_centers)))
+    I_f = charges*mix_I
+    Q_f = charges*mix_Q
+    charges_fine = I_f + 1j*Q_f
 
     # Pass through a low-pass filter
-    if lpf is True:
+    if isinstance(lpf, LowPassFilter):
+        charges_fine = lpf.filter(charges_fine)
+    elif lpf is True:
         # Nyquist frequency 0.5*f_slices; cutoff at 20 MHz
         cutoff = 20.e6*2.*Profile.bin_size
-        I_f = low_pass_filter(I_f, cutoff_frequency=cutoff)
-        Q_f = low_pass_filter(Q_f, cutoff_frequency=cutoff)
-    logger.debug("RF total current is %.4e A", np.fabs(np.sum(I_f))/T_rev)
-
-    charges_fine = I_f + 1j*Q_f
+        charges_fine = low_pass_filter(charges_fine, cutoff_frequency=cutoff)
+    logger.debug("RF total current is %.4e A",
+                 np.fabs(np.sum(charges_fine.real))/T_rev)
     if external_reference:
         # Phase correction
         bucket = 2 * np.pi/(omega_c)
@@ -199,17 +236,17 @@ def rf_beam_current(Profile, omega_c, T_rev, lpf=True, downsample=None, external
         except:
             raise RuntimeError('Downsampling input erroneous in rf_beam_current')
 
-        # Find which index in fine grid matches index in coarse grid
-        ind_fine = np.floor((Profile.bin_centers - 0.5*Profile.bin_size)/T_s)
-        ind_fine = np.array(ind_fine, dtype=int)
-        indices = np.where((ind_fine[1:] - ind_fine[:-1]) == 1)[0]
+        coarse_indices, boundaries = _cached(
+            ('downsample', T_s, Profile.bin_size) + grid,
+            lambda: _downsampling_boundaries(Profile, T_s))
 
         # Pick total current within one coarse grid
-        charges_coarse = np.zeros(n_points, dtype=complex) #+ 1j*np.zeros(n_points)
-        charges_coarse[ind_fine[0]] = np.sum(charges_fine[np.arange(indices[0])])
-        for i in range(1, len(indices)):
-            charges_coarse[i + ind_fine[0]] = np.sum(charges_fine[np.arange(indices[i-1],
-                                                              indices[i])])
+        charges_coarse = np.zeros(n_points, dtype=complex)
+        # The bins after the last boundary are not summed up
+        sums = np.add.reduceat(charges_fine, boundaries)[:-1]
+        # reduceat returns the element itself for empty ranges
+        sums[boundaries[:-1] == boundaries[1:]] = 0
+        charges_coarse[coarse_indices] = sums
 
         return charges_fine, charges_coarse
 
@@ -217,6 +254,19 @@ def rf_beam_current(Profile, omega_c, T_rev, lpf=True, downsample=None, external
         return charges_fine
 
 
+def _downsampling_boundaries(Profile, T_s):
+    """Indices of the coarse samples and boundaries of the ranges of profile
+    bins summed up per coarse sample in rf_beam_current()."""
+
+    # Find which index in fine grid matches index in coarse grid
+    ind_fine = np.floor((Profile.bin_centers - 0.5*Profile.bin_size)/T_s)
+    ind_fine = np.array(ind_fine, dtype=int)
+    indices = np.where((ind_fine[1:] - ind_fine[:-1]) == 1)[0]
+
+    return ind_fine[0] + np.arange(len(indices)), \
+        np.concatenate(([0], indices))
+
+
 def comb_filter(y, x, a):
     """Feedback comb filter.
     """
@@ -224,29 +274,103 @@ def comb_filter(y, x, a):
     return a*y + (1 - a)*x
 
 
+@lru_cache(maxsize=16)
+def butterworth_sos(cutoff_frequency, order=5):
+    """Digital Butterworth low-pass filter in second-order sections; the
+    design is cached per cutoff frequency and order.
+
+    Parameters
+    ----------
+    cutoff_frequency : float
+        Cutoff frequency [1] corresponding to a 3 dB gain drop, relative to the
+        Nyquist frequency of 1
+    order : int
+        Order of the filter; default is 5
+
+    Returns
+    -------
+    float array
+        Second-order sections, of shape (n_sections, 6); shared by all
+        callers and not to be modified
+    """
+
+    return sgn.butter(order, cutoff_frequency, 'low', analog=False,
+                      output='sos')
+
+
 def low_pass_filter(signal, cutoff_frequency=0.5):
-    """Low-pass filter based on Butterworth 5th order digital filter from
-    scipy,
+    """Zero-phase low-pass filter based on Butterworth 5th order digital
+    filter from scipy, applied forwards and backwards,
     http://docs.scipy.org
 
     Parameters
     ----------
-    signal : float array
-        Signal to be filtered
+    signal : float or complex array
+        Signal to be filtered; (I,Q) signals are filtered in one pass
     cutoff_frequency : float
         Cutoff frequency [1] corresponding to a 3 dB gain drop, relative to the
         Nyquist frequency of 1; default is 0.5
 
     Returns
     -------
-    float array
+    float or complex array
         Low-pass filtered signal
 
     """
 
-    b, a = sgn.butter(5, cutoff_frequency, 'low', analog=False)
+    return sgn.sosfiltfilt(butterworth_sos(float(cutoff_frequency)), signal)
+
+
+class LowPassFilter(object):
+    """Causal Butterworth low-pass filter applied to consecutive blocks of a
+    signal, e.g. one turn at a time. The state of the filter is carried over
+    from one block to the next, so that filtering a signal block by block
+    gives the same result as filtering it at once.
+
+    Parameters
+    ----------
+    cutoff_frequency : float
+        Cutoff frequency [1] corresponding to a 3 dB gain drop, relative to the
+        Nyquist frequency of 1; default is 0.5
+    order : int
+        Order of the filter; default is 5
+
+    Attributes
+    ----------
+    sos : float array
+        Second-order sections of the filter
+    state : complex array
+        State of the filter after the last block, of shape (n_sections, 2)
+    """
+
+    def __init__(self, cutoff_frequency=0.5, order=5):
+
+        self.sos = butterworth_sos(float(cutoff_frequency), int(order))
+        self.reset()
+
+    def reset(self):
+        """Sets the filter state to zero, i.e. zero signal before the next
+        block."""
+
+        self.state = np.zeros((self.sos.shape[0], 2), dtype=complex)
 
-    return sgn.filtfilt(b, a, signal)
+    def filter(self, signal):
+        """Filters the next block of the signal.
+
+        Parameters
+        ----------
+        signal : complex array
+            Next block of the signal
+
+        Returns
+        -------
+        complex array
+            Filtered block
+        """
+
+        filtered, self.state = sgn.sosfilt(self.sos, signal, zi=self.state)
+
+        return filtered
 
 
 def moving_average(x, N, x_prev=None):
@@ -318,6 +442,252 @@ def H_cav(x, n_sections, x_prev=None):
     return resp[:x.shape[0] - h.shape[0] + 1]
 
 
+class FIRFilter(object):
+    """Finite impulse response filter applied to consecutive blocks of a
+    signal, e.g. one turn at a time. The state of the filter is carried over
+    from one block to the next, so that filtering a signal block by block
+    gives the same result as filtering it at once.
+
+    Parameters
+    ----------
+    coefficients : float array
+        Filter coefficients; for several channels with different filters, an
+        array of shape (n_channels, n_taps)
+    n_channels : int
+        Number of channels filtered with the same coefficients, for signals
+        of shape (n_channels, n_samples); default is None for 1D signals
+
+    Attributes
+    ----------
+    n_taps : int
+        Number of coefficients of the filter
+    state : complex array
+        State of the filter after the last block, of shape
+        (n_channels, n_taps - 1) or (n_taps - 1,) for 1D signals
+    """
+
+    def __init__(self, coefficients, n_channels=None):
+
+        self.coefficients = np.array(coefficients, ndmin=1)
+        self.n_taps = self.coefficients.shape[-1]
+
+        if self.coefficients.ndim > 1:
+            n_channels = self.coefficients.shape[0]
+        self.n_channels = n_channels
+
+        self.reset()
+
+    def reset(self):
+        """Sets the filter state to zero, i.e. zero signal before the next
+        block."""
+
+        shape = (self.n_taps - 1,)
+        if self.n_channels is not None:
+            shape = (self.n_channels,) + shape
+        self.state = np.zeros(shape, dtype=complex)
+
+    def filter(self, signal):
+        """Filters the next block of the signal.
+
+        Parameters
+        ----------
+        signal : complex array
+            Next block of the signal, of shape (n_samples,) or
+            (n_channels, n_samples)
+
+        Returns
+        -------
+        complex array
+            Filtered block, of the same shape as the input
+        """
+
+        if self.coefficients.ndim == 1:
+            filtered, self.state = sgn.lfilter(self.coefficients, 1, signal,
+                                               axis=-1, zi=self.state)
+        else:
+            filtered = np.empty(signal.shape, dtype=complex)
+            for i in range(self.n_channels):
+                filtered[i], self.state[i] = sgn.lfilter(
+                    self.coefficients[i], 1, signal[i], zi=self.state[i])
+
+        return filtered
+
+
+class TurnBuffer(object):
+    """Signal of the previous and the present turn, stored as a view of two
+    turns into a buffer of several turns. Moving on by one turn shifts the
+    view instead of copying the present turn onto the previous one; only
+    when the view reaches the end of the buffer, the present turn is copied
+    to its beginning, i.e. once every n_spare + 1 turns.
+
+    Parameters
+    ----------
+    n_samples : int
+        Number of samples per turn
+    n_spare : int
+        Number of spare turns in the buffer; a view of the signal remains
+        unchanged for at least n_spare - 1 turns. Default is 4
+    dtype : data-type
+        Data type of the signal; default is complex
+
+    Attributes
+    ----------
+    signal : array
+        Contiguous view of the previous and the present turn, of length
+        2*n_samples
+    previous : array
+        View of the previous turn
+    present : array
+        View of the present turn
+    """
+
+    def __init__(self, n_samples, n_spare=4, dtype=complex):
+
+        self.n_samples = int(n_samples)
+        self.n_spare = int(n_spare)
+        if self.n_spare < 2:
+            raise RuntimeError("ERROR in TurnBuffer: n_spare should be at" +
+                               " least 2!")
+
+        self.data = np.zeros((self.n_spare + 2) * self.n_samples, dtype=dtype)
+        self.start = 0
+        self.signal = self.data[:2 * self.n_samples]
+
+    @property
+    def previous(self):
+        return self.signal[:self.n_samples]
+
+    @property
+    def present(self):
+        return self.signal[self.n_samples:]
+
+    def advance(self):
+        """Moves on by one turn: the present turn becomes the previous turn.
+        The samples of the new present turn are not initialised and are to be
+        overwritten."""
+
+        self.start += self.n_samples
+        if self.start + 2 * self.n_samples > len(self.data):
+            self.data[:self.n_samples] = \
+                self.data[self.start:self.start + self.n_samples]
+            self.start = 0
+        self.signal = self.data[self.start:self.start + 2 * self.n_samples]
+
+
+class TurnBufferAttribute(object):
+    """Class attribute exposing the two-turn signal of a TurnBuffer as an
+    array. Assigning a TurnBuffer stores it in the turn_buffers dictionary of
+    the instance; assigning an array overwrites the two-turn signal."""
+
+    def __set_name__(self, owner, name):
+
+        self.name = name
+
+    def __get__(self, instance, owner):
+
+        if instance is None:
+            return self
+        return instance.turn_buffers[self.name].signal
+
+    def __set__(self, instance, value):
+
+        if isinstance(value, TurnBuffer):
+            instance.__dict__.setdefault('turn_buffers', {})[self.name] = value
+        else:
+            instance.turn_buffers[self.name].signal[:] = value
+
+
+class FFTConvolution(object):
+    """Convolution of signals of fixed length with an impulse response that
+    rarely changes, e.g. the two-turn buffers of the one-turn feedback with
+    the cavity impulse response. Equivalent to
+
+    ``scipy.signal.fftconvolve(signal, kernel)[n_signal-n_output:n_signal]``
+
+    but the spectrum of the kernel is kept and only recomputed when the
+    kernel changes. Only the last n_output samples of the signal length are
+    computed, which allows a circular convolution (overlap-save) shorter than
+    the full linear convolution; for a two-turn buffer and a one-turn kernel,
+    the FFT length is the buffer length.
+
+    Parameters
+    ----------
+    n_signal : int
+        Length of the signal
+    n_output : int
+        Number of output samples, at the end of the signal; default is
+        n_signal
+
+    Attributes
+    ----------
+    n_fft : int
+        FFT length for the present kernel
+    kernel : complex array
+        Kernel the spectrum was computed for; None before the first
+        convolution
+    kernel_spectrum : complex array
+        FFT of the kernel
+    """
+
+    def __init__(self, n_signal, n_output=None):
+
+        self.n_signal = int(n_signal)
+        if n_output is None:
+            n_output = self.n_signal
+        self.n_output = int(n_output)
+        if not 0 < self.n_output <= self.n_signal:
+            raise RuntimeError("ERROR in FFTConvolution: n_output should" +
+                               " be in range (0, n_signal]!")
+
+        self.kernel = None
+        self.kernel_spectrum = None
+        self.n_fft = None
+
+    def set_kernel(self, kernel):
+        """Computes the spectrum of the kernel. Samples beyond the signal
+        length do not contribute and are dropped.
+
+        Parameters
+        ----------
+        kernel : complex array
+            Impulse response
+        """
+
+        self.kernel = np.array(kernel[:self.n_signal], dtype=complex)
+        # The wrap-around of the circular convolution must not reach the
+        # output samples
+        self.n_fft = sp_fft.next_fast_len(
+            max(self.n_signal, len(self.kernel) - 1 + self.n_output))
+        self.kernel_spectrum = sp_fft.fft(self.kernel, self.n_fft)
+
+    def convolve(self, signal, kernel):
+        """Convolves the signal with the kernel; the kernel spectrum is
+        recomputed only if the kernel differs from the previous one.
+
+        Parameters
+        ----------
+        signal : complex array
+            Signal of length n_signal
+        kernel : complex array
+            Impulse response
+
+        Returns
+        -------
+        complex array
+            Last n_output samples of the convolution, of the signal length
+        """
+
+        if self.kernel is None or \
+                not np.array_equal(self.kernel, kernel[:self.n_signal]):
+            self.set_kernel(kernel)
+
+        spectrum = sp_fft.fft(signal, self.n_fft)
+        spectrum *= self.kernel_spectrum
+
+        return sp_fft.ifft(spectrum, overwrite_x=True)[
+            self.n_signal - self.n_output:self.n_signal]
+
+
 def feedforward_filter(TWC: TravellingWaveCavity, T_s, debug=False, taps=None,
                        opt_output=False):
     """Function to design n-tap FIR filter for SPS TravellingWaveCavity.
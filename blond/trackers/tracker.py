@@ -48,9 +48,13 @@ class FullRingAndRF(object):
         #: *Ring radius in [m]*
         self.ring_radius = self.ring_circumference / (2*np.pi)
 
+        # Potential wells already computed, see potential_well_generation
+        self._potential_wells = {}
+
     def potential_well_generation(self, turn=0, n_points=int(1e5),
                                   main_harmonic_option='lowest_freq',
-                                  dt_margin_percent=0., time_array=None):
+                                  dt_margin_percent=0., time_array=None,
+                                  cache=False):
         """Method to generate the potential well out of the RF systems. The
         assumption made is that all the RF voltages are averaged over one turn.
         The potential well is then approximated over one turn, which is not the
@@ -64,26 +68,22 @@ class FullRingAndRF(object):
         the edges of the frame (by adding a % to the length of the frame, this
         is set to 0 by default. It assumes also that the slippage factor is the
         same in the whole ring.
+
+        The potential well is the analytic integral of the RF voltage, so that
+        it is exact on any time_array, also not equally spaced. With cache,
+        the potential wells on the default time arrays are kept for the
+        turns and RF parameters already computed.
         """
 
-        voltages = np.array([])
-        omega_rf = np.array([])
-        phi_offsets = np.array([])
+        voltages, omega_rf, phi_offsets = self._rf_arrays(turn)
 
-        for RingAndRFSectionElement in self.RingAndRFSection_list:
-            RF_params = RingAndRFSectionElement.rf_params
-            charge = RF_params.Particle.charge
-            for rf_system in range(RF_params.n_rf):
-                voltages = np.append(voltages,
-                                     RF_params.voltage[rf_system, turn])
-                omega_rf = np.append(omega_rf,
-                                     RF_params.omega_rf[rf_system, turn])
-                phi_offsets = np.append(phi_offsets,
-                                        RF_params.phi_rf[rf_system, turn])
-
-        voltages = np.array(voltages, ndmin=2)
-        omega_rf = np.array(omega_rf, ndmin=2)
-        phi_offsets = np.array(phi_offsets, ndmin=2)
+        # The charge, revolution period and acceleration are the ones of the
+        # last RF station
+        rf_params = self.RingAndRFSection_list[-1].rf_params
+        charge = rf_params.Particle.charge
+        t_rev = rf_params.t_rev[turn]
+        acceleration_kick = \
+            self.RingAndRFSection_list[-1].acceleration_kick[turn]
 
         if main_harmonic_option == 'lowest_freq':
             main_omega_rf = np.min(omega_rf)
@@ -100,7 +100,20 @@ class FullRingAndRF(object):
 
         slippage_factor = self.RingAndRFSection_list[0].rf_params.eta_0[turn]
 
+        key = None
         if time_array is None:
+            if cache:
+                key = (turn, int(n_points), main_harmonic_option,
+                       float(dt_margin_percent), voltages.tobytes(),
+                       omega_rf.tobytes(), phi_offsets.tobytes(),
+                       float(charge), float(t_rev), float(acceleration_kick),
+                       float(np.sign(slippage_factor)))
+                if key in self._potential_wells:
+                    self.potential_well_coordinates, self.potential_well, \
+                        self.total_voltage = [np.copy(array) for array in
+                                              self._potential_wells[key]]
+                    return
+
             time_array_margin = dt_margin_percent*2*np.pi/main_omega_rf
 
             first_dt = - time_array_margin/2
@@ -108,20 +121,50 @@ class FullRingAndRF(object):
 
             time_array = np.linspace(float(first_dt), float(last_dt), int(n_points))
 
-        self.total_voltage = np.sum(voltages.T *
-                                    np.sin(omega_rf.T*time_array + phi_offsets.T), axis=0)
-
-        eom_factor_potential = np.sign(slippage_factor)*charge / \
-            (RingAndRFSectionElement.rf_params.t_rev[turn])
-
-        potential_well = - cumtrapz(eom_factor_potential*(self.total_voltage -
-                                                          (- RingAndRFSectionElement.acceleration_kick[turn])/abs(charge)),
-                                    dx=time_array[1] - time_array[0], initial=0)
+        # Voltage, and its integral (sum of cosines) accumulated system by
+        # system
+        self.total_voltage = np.zeros(len(time_array))
+        voltage_integral = np.zeros(len(time_array))
+        phase = np.empty(len(time_array))
+        for rf_system in range(len(voltages)):
+            np.multiply(omega_rf[rf_system], time_array, out=phase)
+            phase += phi_offsets[rf_system]
+            self.total_voltage += voltages[rf_system] * np.sin(phase)
+            voltage_integral -= (voltages[rf_system] / omega_rf[rf_system] *
+                                 np.cos(phase))
+
+        eom_factor_potential = np.sign(slippage_factor)*charge / t_rev
+
+        potential_well = - eom_factor_potential * (
+            voltage_integral + acceleration_kick/abs(charge) * time_array)
         potential_well = potential_well - np.min(potential_well)
 
         self.potential_well_coordinates = time_array
         self.potential_well = potential_well
 
+        if key is not None:
+            self._potential_wells[key] = [np.copy(array) for array in
+                                          [time_array, potential_well,
+                                           self.total_voltage]]
+
+    def _rf_arrays(self, turn):
+        """Voltages, angular frequencies and phases of all the RF systems of
+        all the stations at the given turn.
+        """
+
+        voltages = []
+        omega_rf = []
+        phi_offsets = []
+        for RingAndRFSectionElement in self.RingAndRFSection_list:
+            RF_params = RingAndRFSectionElement.rf_params
+            voltages.append(RF_params.voltage[:RF_params.n_rf, turn])
+            omega_rf.append(RF_params.omega_rf[:RF_params.n_rf, turn])
+            phi_offsets.append(RF_params.phi_rf[:RF_params.n_rf, turn])
+
+        return (np.concatenate(voltages).astype(float),
+                np.concatenate(omega_rf).astype(float),
+                np.concatenate(phi_offsets).astype(float))
+
     def track(self):
         """Function to loop over all the RingAndRFSection.track methods
         """
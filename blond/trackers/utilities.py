@@ -20,13 +20,15 @@ from builtins import range, object
 import warnings
 import numpy as np
 import copy
+from concurrent.futures import ThreadPoolExecutor
 from scipy.constants import c
 from scipy.integrate import cumtrapz
 from ..utils import bmath as bm
 
 
 def synchrotron_frequency_distribution(Beam, FullRingAndRF, main_harmonic_option = 'lowest_freq', 
-                                 turn = 0, TotalInducedVoltage = None, smoothOption = None):
+                                 turn = 0, TotalInducedVoltage = None, smoothOption = None,
+                                 n_points_high_res = int(1e6)):
     '''
     *Function to compute the frequency distribution of a distribution for a certain
     RF system and optional intensity effects. The potential well (and induced
@@ -49,13 +51,17 @@ def synchrotron_frequency_distribution(Beam, FullRingAndRF, main_harmonic_option
     
     *The particle distribution in synchrotron frequencies of the beam is also
     outputed.*
+    
+    *The action of all the orbits is computed from a single potential well of
+    n_points_high_res points across the separatrix, at the given turn (see
+    action_from_potential_well).*
     '''
     
     # Initialize variables depending on the accelerator parameters
-    slippage_factor = FullRingAndRF.RingAndRFSection_list[0].rf_params.eta_0[0]
+    slippage_factor = FullRingAndRF.RingAndRFSection_list[0].rf_params.eta_0[turn]
                         
     eom_factor_dE = abs(slippage_factor) / (2*Beam.beta**2. * Beam.energy)
-    eom_factor_potential = np.sign(slippage_factor) * Beam.Particle.charge / (FullRingAndRF.RingAndRFSection_list[0].rf_params.t_rev[0])
+    eom_factor_potential = np.sign(slippage_factor) * Beam.Particle.charge / (FullRingAndRF.RingAndRFSection_list[0].rf_params.t_rev[turn])
 
     # Generate potential well
     n_points_potential = int(1e4)
@@ -90,39 +96,22 @@ def synchrotron_frequency_distribution(Beam, FullRingAndRF, main_harmonic_option
     potential_well_sep = potential_well_sep - np.min(potential_well_sep)
     synchronous_phase_index = np.where(potential_well_sep == np.min(potential_well_sep))[0]
     
-    # Computing the action J by integrating the dE trajectories
-    J_array_dE0 = np.zeros(len(potential_well_sep))
-     
-    warnings.filterwarnings("ignore")
-
-    for i in range(0, len(potential_well_sep)):
-        # Find left and right time coordinates for a given hamiltonian 
-        # value
-        time_indexes = np.where(potential_well_sep <= 
-                                potential_well_sep[i])[0]
-        left_time = time_coord_sep[np.max((0,time_indexes[0]))]
-        right_time = time_coord_sep[np.min((time_indexes[-1],
-                                                   len(time_coord_sep)-1))]
-        # Potential well calculation with high resolution in that frame
-        time_potential_high_res = np.linspace(float(left_time), float(right_time),
-                                              n_points_potential)
-        FullRingAndRF.potential_well_generation(
-                                 n_points=n_points_potential,
-                                 time_array=time_potential_high_res,
-                                 main_harmonic_option=main_harmonic_option)
-        pot_well_high_res = FullRingAndRF.potential_well   
-        if TotalInducedVoltage is not None:
-            pot_well_high_res += np.interp(time_potential_high_res,
+    # Computing the action J from the potential well at high resolution
+    time_potential_high_res = np.linspace(float(time_coord_sep[0]),
+                                          float(time_coord_sep[-1]),
+                                          n_points_high_res)
+    FullRingAndRF.potential_well_generation(
+                             turn=turn, n_points=n_points_high_res,
+                             time_array=time_potential_high_res,
+                             main_harmonic_option=main_harmonic_option)
+    pot_well_high_res = FullRingAndRF.potential_well
+    if TotalInducedVoltage is not None:
+        pot_well_high_res += np.interp(time_potential_high_res,
                                        time_induced_voltage, induced_potential)
-            pot_well_high_res -= pot_well_high_res.min()
-        # Integration to calculate action
-        dE_trajectory = np.sqrt((potential_well_sep[i] -
-                                 pot_well_high_res) / eom_factor_dE)
-        dE_trajectory[np.isnan(dE_trajectory)] = 0
-        J_array_dE0[i] = 1 / np.pi * np.trapz(dE_trajectory,
-                dx=time_potential_high_res[1] - time_potential_high_res[0])
-    
-    warnings.filterwarnings("default")
+    pot_well_high_res -= pot_well_high_res.min()
+    J_array_dE0 = action_from_potential_well(time_potential_high_res,
+                                             pot_well_high_res,
+                                             potential_well_sep, eom_factor_dE)
     
     # Computing the sync_freq_distribution (if to handle cases where maximum is in 2 consecutive points)
     if len(synchronous_phase_index) > 1:
@@ -196,10 +185,17 @@ class synchrotron_frequency_tracker(object):
     linear spacing between these values. One can also input the theta_coordinate_range
     as the coordinates of all particles, but the length of the array should 
     match the n_macroparticles value.*
+
+    *The coordinates are saved turn by turn in memory, or, with save_file,
+    in two .npy files on disk (save_file + '_theta.npy' and
+    save_file + '_dE.npy') that are mapped in memory, so that the number of
+    particles and turns is not limited by the RAM. The saved coordinates can
+    be stored in single precision with save_dtype.*
     '''
 
     def __init__(self, Ring, n_macroparticles, theta_coordinate_range, FullRingAndRF, 
-                 TotalInducedVoltage = None):
+                 TotalInducedVoltage = None, save_file = None,
+                 save_dtype = np.float64):
         
         #: *Number of macroparticles used in the synchrotron_frequency_tracker method*
         self.n_macroparticles = int(n_macroparticles)
@@ -213,27 +209,30 @@ class synchrotron_frequency_tracker(object):
         self.TotalInducedVoltage = None
         if TotalInducedVoltage is not None:
             self.TotalInducedVoltage = TotalInducedVoltage
-            intensity = TotalInducedVoltage.profiles.Beam.intensity
+            intensity = TotalInducedVoltage.profile.Beam.intensity
         else:
             intensity = 0.
             
-        from beam.beam import Beam
+        from ..beam.beam import Beam
         #: *Beam object containing the same physical information as the real beam,
         #: but containing only the coordinates of the particles for which the 
         #: synchrotron frequency are computed.*
         self.Beam = Beam(Ring, n_macroparticles, intensity)
+
+        #: *Ring radius in [m]*
+        self.ring_radius = Ring.ring_radius
         
         # Generating the distribution from the user input
         if len(theta_coordinate_range) == 2:
             self.Beam.dt = np.linspace(float(theta_coordinate_range[0]),
                                        float(theta_coordinate_range[1]), n_macroparticles)\
-                                       * (self.Beam.ring_radius/(self.Beam.beta*c))
+                                       * (self.ring_radius/(self.Beam.beta*c))
         else:
             if len(theta_coordinate_range) != n_macroparticles:
                 #SynchrotronMotionError
                 raise RuntimeError('The input n_macroparticles does not match with the length of the theta_coordinates')
             else:
-                self.Beam.dt = np.array(theta_coordinate_range) * (self.Beam.ring_radius/(self.Beam.beta*c))
+                self.Beam.dt = np.array(theta_coordinate_range) * (self.ring_radius/(self.Beam.beta*c))
                         
         self.Beam.dE = np.zeros(int(n_macroparticles))
  
@@ -246,17 +245,26 @@ class synchrotron_frequency_tracker(object):
         #: *Number of turns of the simulation (+1 to include the input parameters)*
         self.nTurns = Ring.n_turns+1
         
-        #: *Saving the theta coordinates of the particles while tracking*
-        self.theta_save = np.zeros((self.nTurns, int(n_macroparticles)))
-        
-        #: *Saving the dE coordinates of the particles while tracking*
-        self.dE_save = np.zeros((self.nTurns, int(n_macroparticles)))
+        shape = (self.nTurns, int(n_macroparticles))
+        if save_file is None:
+            #: *Saving the theta coordinates of the particles while tracking*
+            self.theta_save = np.zeros(shape, dtype=save_dtype)
+            
+            #: *Saving the dE coordinates of the particles while tracking*
+            self.dE_save = np.zeros(shape, dtype=save_dtype)
+        else:
+            self.theta_save = np.lib.format.open_memmap(
+                save_file + '_theta.npy', mode='w+', dtype=save_dtype,
+                shape=shape)
+            self.dE_save = np.lib.format.open_memmap(
+                save_file + '_dE.npy', mode='w+', dtype=save_dtype,
+                shape=shape)
         
         #: *Tracking counter*
         self.counter = 0
           
         # The first save coordinates are the input coordinates      
-        self.theta_save[self.counter] = self.Beam.dt / (self.Beam.ring_radius/(self.Beam.beta*c))
+        self.theta_save[self.counter] = self.Beam.dt / (self.ring_radius/(self.Beam.beta*c))
         self.dE_save[self.counter] = self.Beam.dE
     
             
@@ -272,17 +280,27 @@ class synchrotron_frequency_tracker(object):
             
         self.counter = self.counter + 1
         
-        self.theta_save[self.counter] = self.Beam.dt / (self.Beam.ring_radius/(self.Beam.beta*c))
+        self.theta_save[self.counter] = self.Beam.dt / (self.ring_radius/(self.Beam.beta*c))
         self.dE_save[self.counter] = self.Beam.dE
         
             
-    def frequency_calculation(self, n_sampling=100000, start_turn = None, end_turn = None):
+    def frequency_calculation(self, n_sampling=100000, start_turn = None, end_turn = None,
+                              interpolate_peak = False, n_particles_block = 64,
+                              n_threads = 1):
         '''
         *Method to compute the fft of the particle oscillations in theta and dE
         to obtain their synchrotron frequencies. The particles for which
         the amplitude of oscillations is extending the minimum and maximum
         theta from user input are considered to be lost and their synchrotron
         frequencies are not calculated.*
+
+        *The ffts are computed for blocks of n_particles_block particles at
+        once, in n_threads threads. By default, the frequencies are taken over
+        all the turns tracked so far, so that the method can also be called
+        during the tracking, e.g. over a sliding window of the last turns with
+        start_turn = counter + 1 - window. With interpolate_peak, the maximum
+        of the spectrum is refined by parabolic interpolation between the
+        frequency bins.*
         '''
         
         n_sampling = int(n_sampling)
@@ -293,14 +311,6 @@ class synchrotron_frequency_tracker(object):
         #: *Saving the synchrotron frequency from the dE oscillations for each particle*
         self.frequency_dE_save = np.zeros(int(self.n_macroparticles))
         
-        #: *Saving the maximum of oscillations in theta for each particle 
-        #: (theta amplitude on the right side of the bunch)*
-        self.max_theta_save = np.zeros(int(self.n_macroparticles))
-        
-        #: *Saving the minimum of oscillations in theta for each particle 
-        #: (theta amplitude on the left side of the bunch)*
-        self.min_theta_save = np.zeros(int(self.n_macroparticles))
-        
         # Maximum theta for which the particles are considered to be lost        
         max_theta_range = np.max(self.theta_save[0,:])
         
@@ -314,21 +324,57 @@ class synchrotron_frequency_tracker(object):
             start_turn = 0
         
         if end_turn is None:
-            end_turn = self.nTurns + 1
+            end_turn = self.counter + 1
+        
+        #: *Saving the maximum of oscillations in theta for each particle 
+        #: (theta amplitude on the right side of the bunch)*
+        self.max_theta_save = np.max(self.theta_save[start_turn:end_turn], axis=0).astype(float)
+        
+        #: *Saving the minimum of oscillations in theta for each particle 
+        #: (theta amplitude on the left side of the bunch)*
+        self.min_theta_save = np.min(self.theta_save[start_turn:end_turn], axis=0).astype(float)
         
         # Computing the synchrotron frequency of each particle from the maximum
         # peak of the FFT.
-        for indexParticle in range(0, self.n_macroparticles):
-            self.max_theta_save[indexParticle] = np.max(self.theta_save[start_turn:end_turn,indexParticle])
-            self.min_theta_save[indexParticle] = np.min(self.theta_save[start_turn:end_turn,indexParticle])
-            
-            if (self.max_theta_save[indexParticle]<max_theta_range) and (self.min_theta_save[indexParticle]>min_theta_range):
-            
-                theta_save_fft = abs(np.fft.rfft(self.theta_save[start_turn:end_turn,indexParticle] - np.mean(self.theta_save[start_turn:end_turn,indexParticle]), n_sampling))
-                dE_save_fft = abs(np.fft.rfft(self.dE_save[start_turn:end_turn,indexParticle] - np.mean(self.dE_save[start_turn:end_turn,indexParticle]), n_sampling))
+        indexes_kept = np.flatnonzero((self.max_theta_save < max_theta_range) *
+                                      (self.min_theta_save > min_theta_range))
+        
+        def peak_frequency(save, particles):
+            oscillations = np.array(save[start_turn:end_turn, particles],
+                                    dtype=float)
+            oscillations -= np.mean(oscillations, axis=0)
+            spectrum = np.abs(np.fft.rfft(oscillations, n_sampling, axis=0))
+            peak = np.argmax(spectrum, axis=0)
+            frequency = self.frequency_array[peak]
+            if interpolate_peak:
+                inner = np.flatnonzero((peak > 0) *
+                                       (peak < len(self.frequency_array) - 1))
+                columns = np.arange(len(particles))[inner]
+                left = spectrum[peak[inner] - 1, columns]
+                center = spectrum[peak[inner], columns]
+                right = spectrum[peak[inner] + 1, columns]
+                curvature = left - 2*center + right
+                offset = np.zeros(len(inner))
+                offset[curvature < 0] = (0.5 * (left - right)[curvature < 0] /
+                                         curvature[curvature < 0])
+                frequency[inner] += offset * (self.frequency_array[1] -
+                                              self.frequency_array[0])
+            return frequency
         
-                self.frequency_theta_save[indexParticle] = self.frequency_array[theta_save_fft==np.max(theta_save_fft)]
-                self.frequency_dE_save[indexParticle] = self.frequency_array[dE_save_fft==np.max(dE_save_fft)]
+        def compute_block(first):
+            particles = indexes_kept[first:first + n_particles_block]
+            self.frequency_theta_save[particles] = peak_frequency(
+                self.theta_save, particles)
+            self.frequency_dE_save[particles] = peak_frequency(
+                self.dE_save, particles)
+        
+        blocks = range(0, len(indexes_kept), int(n_particles_block))
+        if n_threads > 1:
+            with ThreadPoolExecutor(n_threads) as executor:
+                list(executor.map(compute_block, blocks))
+        else:
+            for first in blocks:
+                compute_block(first)
 
 
 
@@ -434,93 +480,8 @@ def separatrix(Ring, RFStation, dt):
     if Ring.n_sections > 1:
         warnings.warn("WARNING in separatrix(): the usage of several RF" +
                       " sections is not yet implemented!")
-       
-    # Import RF and ring parameters at this moment 
-    counter = RFStation.counter[0]
-    voltage = Ring.Particle.charge*RFStation.voltage[:,counter]
-    omega_rf = RFStation.omega_rf[:,counter]
-    phi_rf = RFStation.phi_rf[:,counter]
-
-    eta_0 = RFStation.eta_0[counter]
-    beta_sq = RFStation.beta[counter]**2     
-    energy = RFStation.energy[counter]
-    try:
-        delta_E = RFStation.delta_E[counter]
-    except:
-        delta_E = RFStation.delta_E[-1]
-    T_0 = Ring.t_rev[counter]
-    index = np.min( np.where(voltage > 0)[0] )
-    T_rf_0 = 2*np.pi/omega_rf[index]
-
-
-    # Projects time array into the range [t_RF, t_RF+T_RF] below and above
-    # transition, where T_RF = 2*pi/omega_RF, t_RF = - phi_RF/omega_RF.
-    # Note that the RF wave is shifted by Pi for eta < 0
-    if eta_0 < 0:
-        dt = time_modulo(dt, (phi_rf[0] - np.pi)/omega_rf[0], 
-                         2.*np.pi/omega_rf[0])
-    elif eta_0 > 0:
-        dt = time_modulo(dt, phi_rf[0]/omega_rf[0], 2.*np.pi/omega_rf[0])
-    
-    # Unstable fixed point in single-harmonic RF system
-    if RFStation.n_rf == 1:
-     
-        dt_s = RFStation.phi_s[counter]/omega_rf[0]
-        if eta_0 < 0:
-            dt_RF = -(phi_rf[0] - np.pi)/omega_rf[0]
-        else:
-            dt_RF = -phi_rf[0]/omega_rf[0]
-            
-        dt_ufp = dt_RF + 0.5*T_rf_0 - dt_s
-        if eta_0*delta_E < 0:
-            dt_ufp += T_rf_0
 
-    # Unstable fixed point in multi-harmonic RF system
-    else:
-        
-        dt_ufp = np.linspace(-float(phi_rf[index]/omega_rf[index] - T_rf_0/1000), 
-            float(T_rf_0 - phi_rf[index]/omega_rf[index] + T_rf_0/1000), 1002)
-
-        if eta_0 < 0:
-            dt_ufp += 0.5*T_rf_0 # Shift in RF phase below transition
-        Vtot = np.zeros(len(dt_ufp))
-        
-        # Construct waveform
-        for i in range(RFStation.n_rf):
-            Vtot += voltage[i]*np.sin(omega_rf[i]*dt_ufp + phi_rf[i])
-        Vtot -= delta_E
-        
-        # Find zero crossings
-        zero_crossings = np.where(np.diff(np.sign(Vtot)))[0]
-        
-        # Interpolate UFP
-        if eta_0 < 0:
-            i = -1
-            ind  = zero_crossings[i]
-            while (Vtot[ind+1] -  Vtot[ind]) > 0:
-                i -= 1
-                ind = zero_crossings[i]
-        else:
-            i = 0
-            ind = zero_crossings[i]
-            while (Vtot[ind+1] -  Vtot[ind]) < 0:
-                i += 1
-                ind = zero_crossings[i]
-        dt_ufp = dt_ufp[ind] + Vtot[ind]/(Vtot[ind] - Vtot[ind+1])* \
-                 (dt_ufp[ind+1] - dt_ufp[ind])
-        
-    # Construct separatrix
-    Vtot = np.zeros(len(dt))
-    for i in range(RFStation.n_rf):
-        Vtot += voltage[i]*(np.cos(omega_rf[i]*dt_ufp + phi_rf[i]) - 
-                            np.cos(omega_rf[i]*dt + phi_rf[i]))/omega_rf[i]
-                            
-    separatrix_sq = 2*beta_sq*energy/(eta_0*T_0)*(Vtot + delta_E*(dt_ufp - dt))
-    pos_ind = np.where(separatrix_sq >= 0)[0]
-    separatrix_array = np.empty((len(separatrix_sq)))*np.nan
-    separatrix_array[pos_ind] = np.sqrt(separatrix_sq[pos_ind])
-         
-    return separatrix_array
+    return BucketState(Ring, RFStation).separatrix(dt)
  
  
  
@@ -561,6 +522,9 @@ def is_in_separatrix(Ring, RFStation, Beam, dt, dE,
                       " the first harmonic only!")
     
          
+    if bm.device == 'CPU':
+        return BucketState(Ring, RFStation, Beam).is_in_separatrix(dt, dE)
+
     counter = RFStation.counter[0]
     dt_sep = (np.pi - RFStation.phi_s[counter] 
               - RFStation.phi_rf_d[0,counter])/ \
@@ -575,6 +539,290 @@ def is_in_separatrix(Ring, RFStation, Beam, dt, dE,
         
 
 
+class BucketState(object):
+    r"""Bucket of the RF station at the current turn, with the constants of
+    the single RF sinusoidal Hamiltonian and the unstable fixed point of the
+    separatrix computed once, to evaluate the Hamiltonian, the separatrix and
+    the particles inside it in one compiled pass over the particles.
+
+    The results are the ones of hamiltonian(), separatrix() and
+    is_in_separatrix(); the state has to be rebuilt when the RF parameters
+    change, e.g. every turn during acceleration.
+    
+    Parameters
+    ---------- 
+    Ring : class
+        A Ring type class
+    RFStation : class
+        An RFStation type class
+    Beam : class (optional)
+        A Beam type class, needed for the Hamiltonian only
+    total_voltage : float array (optional)
+        Total voltage to be used in the Hamiltonian instead of the voltage of
+        the first harmonic
+    
+    Attributes
+    ----------
+    counter : int
+        Turn of the RF station the bucket is computed at
+    dt_ufp : float
+        Time coordinate of the unstable fixed point [s]
+    H_sep : float
+        Hamiltonian of the separatrix, if Beam is given
+    
+    """
+
+    def __init__(self, Ring, RFStation, Beam = None, total_voltage = None):
+
+        counter = RFStation.counter[0]
+        self.counter = counter
+        charge = RFStation.Particle.charge
+
+        # Separatrix of all the RF systems
+        self.voltage = charge*RFStation.voltage[:,counter]
+        self.omega_rf = RFStation.omega_rf[:,counter]
+        self.phi_rf = RFStation.phi_rf[:,counter]
+        self.eta_0 = RFStation.eta_0[counter]
+        try:
+            self.delta_E = RFStation.delta_E[counter]
+        except:
+            self.delta_E = RFStation.delta_E[-1]
+        self.separatrix_factor = 2*RFStation.beta[counter]**2* \
+            RFStation.energy[counter]/(self.eta_0*Ring.t_rev[counter])
+
+        # Projection of the time onto [t_RF, t_RF+T_RF], where
+        # t_RF = - phi_RF/omega_RF; the RF wave is shifted by Pi for eta < 0
+        self.period = 2.*np.pi/self.omega_rf[0]
+        if self.eta_0 < 0:
+            self.dt_offset = (self.phi_rf[0] - np.pi)/self.omega_rf[0]
+        elif self.eta_0 > 0:
+            self.dt_offset = self.phi_rf[0]/self.omega_rf[0]
+        else:
+            self.dt_offset = 0.
+            self.period = 0.
+
+        # Unstable fixed point, computed when the separatrix is needed
+        self._n_rf = RFStation.n_rf
+        self._dt_s = RFStation.phi_s[counter]/self.omega_rf[0]
+        self._dt_ufp = None
+
+        self.eta = None
+        self.H_sep = None
+        if Beam is None:
+            return
+
+        # Single RF sinusoidal Hamiltonian of the first harmonic
+        warnings.filterwarnings("once")
+        if Ring.n_sections > 1:
+            warnings.warn("WARNING: The Hamiltonian is not yet properly computed for several sections!")
+        if RFStation.n_rf > 1:
+            warnings.warn("WARNING: The Hamiltonian will be calculated for the first harmonic only!")
+
+        if total_voltage is None:
+            V0 = float(RFStation.voltage[0,counter])
+        else:
+            V0 = float(total_voltage[counter])
+        V0 *= charge
+
+        if RFStation.alpha_order == 0:
+            self.eta = np.array([self.eta_0])
+        else:
+            self.eta = np.array([getattr(RFStation, 'eta_' + str(i))[counter]
+                                 for i in range(RFStation.alpha_order+1)])
+        self.delta_factor = 1/(Beam.beta**2*Beam.energy)
+        self.kinetic_factor = c*np.pi/(Ring.ring_circumference*Beam.beta*
+                                       Beam.energy)
+        self.potential_factor = c*Beam.beta*V0/ \
+            (RFStation.harmonic[0,counter]*Ring.ring_circumference)
+        self.phi_s = RFStation.phi_s[counter]
+        self.omega_rf_0 = RFStation.omega_rf[0,counter]
+        self.phi_rf_d_0 = RFStation.phi_rf_d[0,counter]
+        self.phase_modulo = int(np.sign(self.eta_0))
+
+        dt_sep = (np.pi - self.phi_s - self.phi_rf_d_0)/self.omega_rf_0
+        self.H_sep = self.hamiltonian(dt_sep, 0)
+
+
+    @property
+    def dt_ufp(self):
+        """Time coordinate of the unstable fixed point [s]."""
+
+        if self._dt_ufp is None:
+            self._dt_ufp = self._unstable_fixed_point()
+        return self._dt_ufp
+
+
+    def _unstable_fixed_point(self):
+
+        voltage = self.voltage
+        omega_rf = self.omega_rf
+        phi_rf = self.phi_rf
+        eta_0 = self.eta_0
+        # The voltage includes the sign of the charge
+        index = np.min( np.where(np.abs(voltage) > 0)[0] )
+        T_rf_0 = 2*np.pi/omega_rf[index]
+
+        # Unstable fixed point in single-harmonic RF system
+        if self._n_rf == 1:
+         
+            dt_s = self._dt_s
+            if eta_0 < 0:
+                dt_RF = -(phi_rf[0] - np.pi)/omega_rf[0]
+            else:
+                dt_RF = -phi_rf[0]/omega_rf[0]
+                
+            dt_ufp = dt_RF + 0.5*T_rf_0 - dt_s
+            if eta_0*self.delta_E < 0:
+                dt_ufp += T_rf_0
+
+            return dt_ufp
+
+        # Unstable fixed point in multi-harmonic RF system
+        dt_ufp = np.linspace(-float(phi_rf[index]/omega_rf[index] - T_rf_0/1000), 
+            float(T_rf_0 - phi_rf[index]/omega_rf[index] + T_rf_0/1000), 1002)
+
+        if eta_0 < 0:
+            dt_ufp += 0.5*T_rf_0 # Shift in RF phase below transition
+        Vtot = np.zeros(len(dt_ufp))
+        
+        # Construct waveform
+        for i in range(self._n_rf):
+            Vtot += voltage[i]*np.sin(omega_rf[i]*dt_ufp + phi_rf[i])
+        Vtot -= self.delta_E
+        
+        # Find zero crossings
+        zero_crossings = np.where(np.diff(np.sign(Vtot)))[0]
+        
+        # Interpolate UFP
+        if eta_0 < 0:
+            i = -1
+            ind  = zero_crossings[i]
+            while (Vtot[ind+1] -  Vtot[ind]) > 0:
+                i -= 1
+                ind = zero_crossings[i]
+        else:
+            i = 0
+            ind = zero_crossings[i]
+            while (Vtot[ind+1] -  Vtot[ind]) < 0:
+                i += 1
+                ind = zero_crossings[i]
+        return float(dt_ufp[ind] + Vtot[ind]/(Vtot[ind] - Vtot[ind+1])* \
+                     (dt_ufp[ind+1] - dt_ufp[ind]))
+
+
+    def _particles(self, dt, dE):
+
+        if self.eta is None:
+            raise RuntimeError("ERROR in BucketState: the Hamiltonian needs"+
+                               " the Beam!")
+        dt, dE = np.broadcast_arrays(np.asarray(dt, dtype=np.float64),
+                                     np.asarray(dE, dtype=np.float64))
+        return dt.shape, dt.ravel(), dE.ravel()
+
+
+    @property
+    def hamiltonian_parameters(self):
+        """Parameters of the Hamiltonian and of the separatrix for the
+        compiled kernels, e.g. bm.bigaussian."""
+
+        return (self.eta, self.delta_factor, self.kinetic_factor,
+                self.potential_factor, self.omega_rf_0, self.phi_rf_d_0,
+                self.phi_s, self.phase_modulo,
+                np.inf if self.H_sep is None else self.H_sep)
+
+
+    def _hamiltonian_pass(self, dt, dE, hamiltonian = None, inside = None):
+
+        return bm.bucket_hamiltonian(dt, dE, *self.hamiltonian_parameters,
+                                     hamiltonian = hamiltonian,
+                                     inside = inside)
+
+
+    def hamiltonian(self, dt, dE):
+        r"""Single RF sinusoidal Hamiltonian of the coordinates (dt, dE).
+        
+        Parameters
+        ---------- 
+        dt : float array
+            Time coordinates [s]
+        dE : float array
+            Energy coordinates [eV]
+            
+        Returns
+        -------
+        float array
+            Hamiltonian of the coordinates, with the shape of dt and dE
+            
+        """
+
+        shape, dt, dE = self._particles(dt, dE)
+        hamiltonian = np.empty(dt.size)
+        self._hamiltonian_pass(dt, dE, hamiltonian = hamiltonian)
+
+        return hamiltonian.reshape(shape)
+
+
+    def is_in_separatrix(self, dt, dE):
+        r"""Coordinates (dt, dE) inside the separatrix of the single RF
+        sinusoidal Hamiltonian.
+            
+        Returns
+        -------
+        bool array
+            True/False array for the given coordinates
+            
+        """
+
+        shape, dt, dE = self._particles(dt, dE)
+        inside = np.empty(dt.size, dtype=bool)
+        self._hamiltonian_pass(dt, dE, inside = inside)
+
+        return inside.reshape(shape)
+
+
+    def n_in_separatrix(self, dt, dE):
+        r"""Number of coordinates (dt, dE) inside the separatrix of the single
+        RF sinusoidal Hamiltonian, without any array of the size of the
+        coordinates; the fraction inside the bucket is n_in_separatrix(dt, dE)
+        / len(dt).
+            
+        Returns
+        -------
+        int
+            Number of coordinates inside the separatrix
+            
+        """
+
+        _, dt, dE = self._particles(dt, dE)
+
+        return self._hamiltonian_pass(dt, dE)
+
+
+    def separatrix(self, dt):
+        r"""Energy coordinates of the separatrix of all the RF systems at the
+        time coordinates dt, NaN where the separatrix does not exist.
+        
+        Parameters
+        ---------- 
+        dt : float array
+            Time coordinates the separatrix is to be calculated for
+            
+        Returns
+        -------
+        float array
+            Energy coordinates of the separatrix corresponding to dt
+            
+        """
+
+        dt = np.asarray(dt, dtype=np.float64)
+
+        return bm.bucket_separatrix(
+            dt.ravel(), self.voltage, self.omega_rf, self.phi_rf, self.dt_ufp,
+            self.delta_E, self.separatrix_factor, dt_offset = self.dt_offset,
+            period = self.period).reshape(dt.shape)
+
+
+
 def minmax_location(x,f):
     '''
     *Function to locate the minima and maxima of the f(x) numerical function.*
@@ -687,6 +935,73 @@ def potential_well_cut(time_potential, potential_array):
         
     return time_potential_sep, potential_well_sep
 
+def action_from_potential_well(time_potential, potential_well, H_levels,
+                               eom_factor_dE, n_points_quadrature=256):
+    '''
+    *Function to compute the action J of the orbits of Hamiltonian H_levels
+    in the potential well, sampled at high resolution on time_potential.*
+
+    *The turning points of each orbit are the outermost crossings of the
+    potential well with H, found for all levels at once from the running
+    minima of the well and interpolated linearly. The action integral
+    J = 1/pi int sqrt((H - U)/eom_factor_dE) dt between the turning points
+    is computed with the Gauss-Chebyshev quadrature of the second kind, which
+    integrates the square root singularities at the turning points
+    analytically. Orbits leaving the frame are cut at its edges, where the
+    quadrature is less accurate.*
+    '''
+
+    H_levels = np.asarray(H_levels, dtype=float)
+    J_levels = np.zeros(H_levels.shape)
+
+    # Turning points, first point under H from both sides
+    running_min_left = np.minimum.accumulate(potential_well)
+    running_min_right = np.minimum.accumulate(potential_well[::-1])[::-1]
+    index_left = np.searchsorted(-running_min_left, -H_levels, side='left')
+    index_right = len(potential_well) - 1 - np.searchsorted(
+        -running_min_right[::-1], -H_levels, side='left')
+    inside = index_left <= index_right
+    index_left = np.clip(index_left, 0, len(potential_well) - 1)
+    index_right = np.clip(index_right, 0, len(potential_well) - 1)
+
+    def crossing(index, neighbour):
+        # Linear interpolation of the crossing with the neighbouring point
+        # above H, or the edge of the frame
+        neighbour = np.clip(neighbour, 0, len(potential_well) - 1)
+        above = potential_well[neighbour] > H_levels
+        fraction = np.zeros(H_levels.shape)
+        fraction[above] = ((H_levels - potential_well[index])[above] /
+                           (potential_well[neighbour] -
+                            potential_well[index])[above])
+        return (time_potential[index] + fraction *
+                (time_potential[neighbour] - time_potential[index]))
+
+    time_left = crossing(index_left, index_left - 1)
+    time_right = crossing(index_right, index_right + 1)
+
+    # Chebyshev nodes of the second kind, t = center + half_width*cos(theta)
+    theta = np.arange(1, n_points_quadrature + 1) * np.pi / \
+        (n_points_quadrature + 1)
+    center = 0.5 * (time_right + time_left)
+    half_width = 0.5 * (time_right - time_left)
+
+    n_levels_chunk = max(1, 2**22 // n_points_quadrature)
+    for first in range(0, len(H_levels), n_levels_chunk):
+        levels = slice(first, first + n_levels_chunk)
+        time_nodes = (center[levels, np.newaxis] +
+                      half_width[levels, np.newaxis] * np.cos(theta))
+        dE_nodes = np.sqrt(np.maximum(H_levels[levels, np.newaxis] -
+                                      np.interp(time_nodes, time_potential,
+                                                potential_well), 0)
+                           / eom_factor_dE)
+        J_levels[levels] = (half_width[levels] / (n_points_quadrature + 1) *
+                            np.sum(np.sin(theta) * dE_nodes, axis=1))
+
+    J_levels[~inside] = 0
+
+    return J_levels
+
+
 def phase_modulo_above_transition(phi):
     '''
     *Projects a phase array into the range -Pi/2 to +3*Pi/2.*
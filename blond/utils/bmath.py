@@ -35,6 +35,12 @@ _CPU_func_dict = {
     'interp_const_space': np.interp,
     'cumtrapz': butils_wrap.cumtrapz,
     'trapz_cpp': butils_wrap.trapz_cpp,
+    'abel_transform': butils_wrap.abel_transform,
+    'bucket_hamiltonian': butils_wrap.bucket_hamiltonian,
+    'bucket_separatrix': butils_wrap.bucket_separatrix,
+    'bigaussian': butils_wrap.bigaussian,
+    'philox_uniform': butils_wrap.philox_uniform,
+    'philox4x32_10': butils_wrap.philox4x32_10,
     'linspace_cpp': butils_wrap.linspace_cpp,
     'argmin_cpp': butils_wrap.argmin_cpp,
     'argmax_cpp': butils_wrap.argmax_cpp,
@@ -51,6 +57,7 @@ _CPU_func_dict = {
     'rf_volt_comp': butils_wrap.rf_volt_comp,
     'drift': butils_wrap.drift,
     'linear_interp_kick': butils_wrap.linear_interp_kick,
+    'sparse_linear_interp_kick': butils_wrap.sparse_linear_interp_kick,
     'LIKick_n_drift': butils_wrap.linear_interp_kick_n_drift,
     'synchrotron_radiation': butils_wrap.synchrotron_radiation,
     'synchrotron_radiation_full': butils_wrap.synchrotron_radiation_full,
@@ -61,6 +68,7 @@ _CPU_func_dict = {
     'slice_smooth': butils_wrap.slice_smooth,
     'music_track': butils_wrap.music_track,
     'music_track_multiturn': butils_wrap.music_track_multiturn,
+    'music_track_parallel': butils_wrap.music_track_parallel,
     'device': 'CPU'
 }
 
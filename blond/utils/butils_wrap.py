@@ -281,10 +281,15 @@ def convolve(signal, kernel, mode='full', result=None):
         # ConvolutionError
         raise RuntimeError('[convolve] Only full mode is supported')
     if result is None:
-        result = np.empty(len(signal) + len(kernel) - 1, dtype=float)
-    __lib.convolution(__getPointer(signal), __getLen(signal),
-                      __getPointer(kernel), __getLen(kernel),
-                      __getPointer(result))
+        result = np.empty(len(signal) + len(kernel) - 1, dtype=signal.dtype)
+    if signal.dtype == np.float32:
+        __lib.convolutionf(__getPointer(signal), __getLen(signal),
+                           __getPointer(kernel), __getLen(kernel),
+                           __getPointer(result))
+    else:
+        __lib.convolution(__getPointer(signal), __getLen(signal),
+                          __getPointer(kernel), __getLen(kernel),
+                          __getPointer(result))
     return result
 
 
@@ -550,6 +555,100 @@ def trapz_cpp(y, x=None, dx=1.0):
                                      __getLen(y))
 
 
+def abel_transform(potential, f, dx=1.0, result=None):
+    potential = np.ascontiguousarray(potential, dtype=np.float64)
+    f = np.ascontiguousarray(f, dtype=np.float64)
+    if result is None:
+        result = np.empty(len(f), dtype=np.float64)
+    __lib.abel_transform(__getPointer(potential), __getPointer(f),
+                         ct.c_double(dx), __getLen(f), __getPointer(result))
+    return result
+
+
+def bucket_hamiltonian(dt, dE, eta, delta_factor, kinetic_factor,
+                       potential_factor, omega_rf, phi_rf, phi_s,
+                       phase_modulo, H_sep=np.inf, hamiltonian=None,
+                       inside=None):
+    dt = np.ascontiguousarray(dt, dtype=np.float64)
+    dE = np.ascontiguousarray(dE, dtype=np.float64)
+    eta = np.ascontiguousarray(eta, dtype=np.float64)
+    __lib.bucket_hamiltonian.restype = ct.c_int
+    return __lib.bucket_hamiltonian(
+        __getPointer(dt), __getPointer(dE), __getLen(dt), __getPointer(eta),
+        __getLen(eta), ct.c_double(delta_factor), ct.c_double(kinetic_factor),
+        ct.c_double(potential_factor), ct.c_double(omega_rf),
+        ct.c_double(phi_rf), ct.c_double(phi_s), ct.c_int(phase_modulo),
+        ct.c_double(H_sep),
+        None if hamiltonian is None else __getPointer(hamiltonian),
+        None if inside is None else __getPointer(inside))
+
+
+def bucket_separatrix(dt, voltage, omega_rf, phi_rf, dt_ufp, delta_E, factor,
+                      dt_offset=0., period=0., result=None):
+    dt = np.ascontiguousarray(dt, dtype=np.float64)
+    voltage = np.ascontiguousarray(voltage, dtype=np.float64)
+    omega_rf = np.ascontiguousarray(omega_rf, dtype=np.float64)
+    phi_rf = np.ascontiguousarray(phi_rf, dtype=np.float64)
+    if result is None:
+        result = np.empty(len(dt), dtype=np.float64)
+    __lib.bucket_separatrix(__getPointer(dt), __getLen(dt),
+                            __getPointer(voltage), __getPointer(omega_rf),
+                            __getPointer(phi_rf), __getLen(voltage),
+                            ct.c_double(dt_ufp), ct.c_double(delta_E),
+                            ct.c_double(factor), ct.c_double(dt_offset),
+                            ct.c_double(period), __getPointer(result))
+    return result
+
+
+def bigaussian(dt, dE, seed, mean_dt, sigma_dt, sigma_dE, first=0,
+               hamiltonian_parameters=None, max_attempts=1000):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(dE[0], precision.real_t)
+
+    reinsertion = hamiltonian_parameters is not None
+    if reinsertion:
+        eta, delta_factor, kinetic_factor, potential_factor, omega_rf, \
+            phi_rf, phi_s, phase_modulo, H_sep = hamiltonian_parameters
+    else:
+        eta, delta_factor, kinetic_factor, potential_factor, omega_rf, \
+            phi_rf, phi_s, phase_modulo, H_sep = [0.], 0, 0, 0, 0, 0, 0, 0, 0
+    eta = np.ascontiguousarray(eta, dtype=np.float64)
+
+    if precision.num == 1:
+        function = __lib.bigaussianf
+    else:
+        function = __lib.bigaussian
+    function.restype = ct.c_int
+    return function(__getPointer(dt), __getPointer(dE), __getLen(dt),
+                    ct.c_uint64(first), ct.c_uint64(seed),
+                    ct.c_double(mean_dt), ct.c_double(sigma_dt),
+                    ct.c_double(sigma_dE), ct.c_bool(reinsertion),
+                    __getPointer(eta), __getLen(eta),
+                    ct.c_double(delta_factor), ct.c_double(kinetic_factor),
+                    ct.c_double(potential_factor), ct.c_double(omega_rf),
+                    ct.c_double(phi_rf), ct.c_double(phi_s),
+                    ct.c_int(phase_modulo), ct.c_double(H_sep),
+                    ct.c_int(max_attempts))
+
+
+def philox_uniform(n, seed, first=0, stream=0, u1=None, u2=None):
+    if u1 is None:
+        u1 = np.empty(n, dtype=np.float64)
+    if u2 is None:
+        u2 = np.empty(n, dtype=np.float64)
+    __lib.philox_uniform(__getPointer(u1), __getPointer(u2), ct.c_int(n),
+                         ct.c_uint64(first), ct.c_uint64(seed),
+                         ct.c_uint32(stream))
+    return u1, u2
+
+
+def philox4x32_10(ctr, key):
+    ctr = np.array(ctr, dtype=np.uint32)
+    key = np.array(key, dtype=np.uint32)
+    __lib.philox4x32_10(__getPointer(ctr), __getPointer(key))
+    return ctr
+
+
 def beam_phase(bin_centers, profile, alpha, omegarf, phirf, bin_size):
     bin_centers = bin_centers.astype(dtype=precision.real_t, order='C',
                                      copy=False)
@@ -729,6 +828,40 @@ def linear_interp_kick(dt, dE, voltage,
                                  __c_real(acceleration_kick))
 
 
+def sparse_linear_interp_kick(dt, dE, voltage, bin_centers, bunch_indexes,
+                              charge, acceleration_kick):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(dE[0], precision.real_t)
+    assert isinstance(voltage[0][0], precision.real_t)
+    assert isinstance(bin_centers[0][0], precision.real_t)
+    assert isinstance(bunch_indexes[0], precision.real_t)
+
+    if precision.num == 1:
+        __lib.sparse_linear_interp_kickf(__getPointer(dt),
+                                         __getPointer(dE),
+                                         __getPointer(voltage),
+                                         __getPointer(bin_centers),
+                                         __getPointer(bunch_indexes),
+                                         __c_real(charge),
+                                         ct.c_int(bin_centers.shape[1]),
+                                         ct.c_int(bin_centers.shape[0]),
+                                         __getLen(bunch_indexes),
+                                         __getLen(dt),
+                                         __c_real(acceleration_kick))
+    else:
+        __lib.sparse_linear_interp_kick(__getPointer(dt),
+                                        __getPointer(dE),
+                                        __getPointer(voltage),
+                                        __getPointer(bin_centers),
+                                        __getPointer(bunch_indexes),
+                                        __c_real(charge),
+                                        ct.c_int(bin_centers.shape[1]),
+                                        ct.c_int(bin_centers.shape[0]),
+                                        __getLen(bunch_indexes),
+                                        __getLen(dt),
+                                        __c_real(acceleration_kick))
+
+
 def linear_interp_kick_n_drift(dt, dE, total_voltage, bin_centers, charge, acc_kick,
                                solver, t_rev, length_ratio, alpha_order, eta_0, eta_1,
                                eta_2, beta, energy):
@@ -941,6 +1074,46 @@ def music_track_multiturn(dt, dE, induced_voltage, array_parameters,
                                     __c_real(coeff4))
 
 
+def music_track_parallel(dt, dE, induced_voltage, permutation, state,
+                         s, weight, const, time_offset, multi_turn):
+    assert isinstance(dt[0], precision.real_t)
+    assert isinstance(dE[0], precision.real_t)
+    assert isinstance(induced_voltage[0], precision.real_t)
+    assert permutation.dtype == np.int32
+    assert state.dtype == precision.complex_t
+
+    s = s.astype(dtype=precision.complex_t, order='C', copy=False)
+    weight = weight.astype(dtype=precision.complex_t, order='C', copy=False)
+    const = const.astype(dtype=precision.real_t, order='C', copy=False)
+
+    if precision.num == 1:
+        __lib.music_track_parallelf(__getPointer(dt),
+                                    __getPointer(dE),
+                                    __getPointer(induced_voltage),
+                                    __getPointer(permutation),
+                                    __getLen(dt),
+                                    __getPointer(state),
+                                    __getPointer(s),
+                                    __getPointer(weight),
+                                    __getPointer(const),
+                                    __getLen(const),
+                                    __c_real(time_offset),
+                                    ct.c_bool(multi_turn))
+    else:
+        __lib.music_track_parallel(__getPointer(dt),
+                                   __getPointer(dE),
+                                   __getPointer(induced_voltage),
+                                   __getPointer(permutation),
+                                   __getLen(dt),
+                                   __getPointer(state),
+                                   __getPointer(s),
+                                   __getPointer(weight),
+                                   __getPointer(const),
+                                   __getLen(const),
+                                   __c_real(time_offset),
+                                   ct.c_bool(multi_turn))
+
+
 def synchrotron_radiation(dE, U0, n_kicks, tau_z):
     assert isinstance(dE[0], precision.real_t)
     # dE = dE.astype(dtype=precision.real_t, order='C', copy=False)
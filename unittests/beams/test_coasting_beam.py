@@ -137,6 +137,80 @@ class testCoastingBeamModule(unittest.TestCase):
                                         msg = 'Beam center too far from offset')
         
     
+    def test_seed(self):
+
+        dt = self.beam.dt
+        cBeam.generate_coasting_beam(self.beam, 0, self.ring.t_rev[0],
+                                     spread_type = 'dE', spread = 1E6,
+                                     seed = 1)
+        self.assertIs(self.beam.dt, dt, msg = 'Beam.dt should be filled in '
+                      + 'place')
+        self.assertAlmostEqual(np.mean(self.beam.dE), 0, delta = 5E3,
+                               msg = 'Mean dE wrong')
+        self.assertAlmostEqual(np.std(self.beam.dE), 1E6, delta = 5E3,
+                               msg = 'Std dE wrong')
+
+        dt, dE = np.copy(self.beam.dt), np.copy(self.beam.dE)
+        beam = bBeam.Beam(self.ring, 1E6, 0)
+        cBeam.generate_coasting_beam(beam, 0, self.ring.t_rev[0],
+                                     spread_type = 'dE', spread = 1E6,
+                                     seed = 1, chunk_size = 1000,
+                                     n_threads = 3)
+        np.testing.assert_array_equal(beam.dt, dt)
+        np.testing.assert_array_equal(beam.dE, dE)
+
+        with self.assertRaises(blExcept.GenerationError):
+            cBeam.generate_coasting_beam(beam, 0, self.ring.t_rev[0],
+                                         seed = 1, chunk_size = 0)
+
+
+    def test_quiet_start(self):
+
+        for sequence in ['bit_reversed', 'sobol']:
+            for distribution in ['gaussian', 'parabolic']:
+                cBeam.generate_coasting_beam(self.beam, 0,
+                                             self.ring.t_rev[0],
+                                             distribution = distribution,
+                                             spread_type = 'dE',
+                                             spread = 1E6,
+                                             energy_offset = 1E6,
+                                             sequence = sequence, seed = 1)
+
+                # Much flatter than the Poisson noise of the random loading
+                vals, edges = np.histogram(self.beam.dt, bins=150)
+                self.assertLess(np.std(vals), 2,
+                                msg = 'Quiet start not flat enough')
+
+                # Random loading: 1E3 r.m.s. error of the mean
+                self.assertAlmostEqual(np.mean(self.beam.dE), 1E6,
+                                       delta = 50, msg = 'Mean dE wrong')
+                std = 1E6 if distribution == 'gaussian' else 1E6/np.sqrt(5)
+                self.assertAlmostEqual(np.std(self.beam.dE) / std, 1,
+                                       delta = 1E-4, msg = 'Std dE wrong')
+
+        with self.assertRaises(blExcept.DistributionError):
+            cBeam.generate_coasting_beam(self.beam, 0, self.ring.t_rev[0],
+                                         sequence = 'bad sequence')
+
+
+    def test_user_inverse_cdf(self):
+
+        # Triangular distribution in uniformly filled bins
+        distribution = np.linspace(-1E6, 1E6, 101)
+        probability = 1 - np.abs(distribution) / 1.01E6
+        probability /= np.sum(probability)
+        cBeam.generate_coasting_beam(self.beam, 0, self.ring.t_rev[0],
+                                     distribution = 'user',
+                                     user_distribution = distribution,
+                                     user_probability = probability,
+                                     sequence = 'bit_reversed')
+
+        vals, edges = np.histogram(self.beam.dE, bins=np.append(
+            distribution - 1E4, 1.01E6))
+        np.testing.assert_allclose(vals / self.beam.n_macroparticles,
+                                   probability, rtol = 0, atol = 1E-5)
+
+    
     def _gauss(self, x,a,x0,sigma):
         return a*np.exp(-(x-x0)**2/(2*sigma**2))
         
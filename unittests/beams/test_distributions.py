@@ -0,0 +1,326 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unittest for beam.distributions
+
+"""
+
+import unittest
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+import blond
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Beam, Proton
+from blond.beam.profile import Profile, CutOptions
+from blond.impedances.impedance_sources import Resonators
+from blond.impedances.impedance import InducedVoltageFreq, \
+    TotalInducedVoltage
+from blond.trackers.tracker import RingAndRFTracker, FullRingAndRF
+from blond.trackers.utilities import is_in_separatrix
+from blond.utils import bmath as bm
+from blond.beam import distributions
+from blond.beam.distributions import matched_from_line_density, \
+    matched_from_distribution_function, matched_bucket, MatchedBucket, \
+    clear_matched_buckets, populate_bunch, bigaussian
+from blond.beam.distributions_multibunch import \
+    matched_from_line_density_multibunch
+
+
+class TestMatchedFromLineDensity(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = Ring(6911.56, 1/17.95142852**2, 25.92e9, Proton(), 1)
+        self.rf = RFStation(self.ring, 4620, 4.5e6, 0)
+
+    def generate(self, half_option):
+        beam = Beam(self.ring, 100000, 1e11)
+        full_ring = FullRingAndRF([RingAndRFTracker(self.rf, beam)])
+        [hamiltonian, distribution], _ = matched_from_line_density(
+            beam, full_ring, line_density_type='parabolic_amplitude',
+            bunch_length=2e-9, half_option=half_option, seed=1)
+        return beam, hamiltonian, distribution
+
+    def test_half_options(self):
+
+        beam, hamiltonian, distribution = self.generate('first')
+        # r.m.s. of the parabolic amplitude line density
+        self.assertAlmostEqual(np.std(beam.dt), 1e-9/np.sqrt(6), delta=1e-11)
+
+        # The well and the line density are symmetric
+        for half_option in ['second', 'both']:
+            beam_half, hamiltonian_half, distribution_half = \
+                self.generate(half_option)
+            np.testing.assert_allclose(hamiltonian_half, hamiltonian,
+                                       rtol=0, atol=1e-12*hamiltonian.max())
+            np.testing.assert_allclose(distribution_half, distribution,
+                                       rtol=0, atol=1e-12*distribution.max())
+
+
+class TestMatchedBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = Ring(6911.56, 1/17.95142852**2, 25.92e9, Proton(), 1)
+        self.rf = RFStation(self.ring, 4620, 4.5e6, 0)
+        self.beam = Beam(self.ring, 10000, 1e11)
+        self.full_ring = FullRingAndRF([RingAndRFTracker(self.rf, self.beam)])
+        clear_matched_buckets()
+
+    def tearDown(self):
+        clear_matched_buckets()
+
+    def test_cache(self):
+
+        bucket = matched_bucket(self.full_ring)
+        self.assertIs(matched_bucket(self.full_ring), bucket)
+        self.assertIsNot(matched_bucket(self.full_ring, n_points_grid=500),
+                         bucket)
+
+        # Same bucket as without cache
+        self.full_ring.potential_well_generation(n_points=int(1e4),
+                                                 dt_margin_percent=0.40)
+        rf = self.rf
+        bucket_new = MatchedBucket(
+            self.full_ring, self.full_ring.potential_well_coordinates,
+            self.full_ring.potential_well,
+            abs(rf.eta_0[0]) / (2*rf.beta[0]**2*rf.energy[0]))
+        np.testing.assert_array_equal(bucket_new.J_grid, bucket.J_grid)
+
+        # Emittance of the separatrix is the area of the stationary bucket
+        bucket_area = (8*np.sqrt(2*rf.beta[0]**2*rf.energy[0]*rf.voltage[0, 0]
+                                 / (np.pi*rf.harmonic[0, 0]*abs(rf.eta_0[0])))
+                       / rf.omega_rf[0, 0])
+        self.assertAlmostEqual(2*np.pi*bucket.sorted_J_dE0[-1] / bucket_area,
+                               1, delta=1e-2)
+
+        self.rf.voltage[0, 0] *= 2
+        self.assertIsNot(matched_bucket(self.full_ring), bucket)
+
+        clear_matched_buckets()
+        self.rf.voltage[0, 0] /= 2
+        self.assertIsNot(matched_bucket(self.full_ring), bucket)
+
+    def test_cache_eviction(self):
+
+        # The least recently used bucket is removed
+        bucket = matched_bucket(self.full_ring)
+        bucket_500 = matched_bucket(self.full_ring, n_points_grid=500)
+        self.assertIs(matched_bucket(self.full_ring), bucket)
+        matched_bucket(self.full_ring, n_points_grid=400)
+        self.assertEqual(len(distributions._matched_buckets),
+                         distributions.max_matched_buckets)
+        self.assertIs(matched_bucket(self.full_ring), bucket)
+        self.assertIsNot(matched_bucket(self.full_ring, n_points_grid=500),
+                         bucket_500)
+
+        max_matched_buckets = distributions.max_matched_buckets
+        try:
+            distributions.max_matched_buckets = 0
+            self.assertIsNot(matched_bucket(self.full_ring), bucket)
+            self.assertEqual(len(distributions._matched_buckets), 0)
+        finally:
+            distributions.max_matched_buckets = max_matched_buckets
+
+    def test_reuse(self):
+
+        matched_from_distribution_function(
+            self.beam, self.full_ring, distribution_type='gaussian',
+            emittance=0.3, seed=1)
+        dt = np.copy(self.beam.dt)
+        matched_from_distribution_function(
+            self.beam, self.full_ring, distribution_type='gaussian',
+            emittance=0.6, seed=1)
+        self.assertGreater(np.std(self.beam.dt), np.std(dt))
+        matched_from_distribution_function(
+            self.beam, self.full_ring, distribution_type='gaussian',
+            emittance=0.3, seed=1)
+        np.testing.assert_array_equal(self.beam.dt, dt)
+
+
+class TestPopulateBunch(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = Ring(6911.56, 1/17.95142852**2, 25.92e9, Proton(), 1)
+        self.time_grid, self.deltaE_grid = np.meshgrid(np.linspace(0, 1, 200),
+                                                       np.linspace(-1, 1, 100))
+        # Uniform in a disc of radius 0.5 in the normalised phase space
+        self.density_grid = ((self.time_grid - 0.5)**2 +
+                             (self.deltaE_grid/2)**2 < 0.25).astype(float)
+        self.density_grid /= np.sum(self.density_grid)
+
+    def populate(self, **kwargs):
+        beam = Beam(self.ring, 100000, 1e11)
+        dt = beam.dt
+        populate_bunch(beam, self.time_grid, self.deltaE_grid,
+                       self.density_grid, 1/199, 2/99, 1, **kwargs)
+        self.assertIs(beam.dt, dt)
+        return beam
+
+    def test_distribution(self):
+
+        beam = self.populate()
+        radius = np.sqrt((beam.dt - 0.5)**2 + (beam.dE/2)**2)
+        self.assertLess(np.max(radius), 0.5 + 1/99)
+        # Uniform disc: the fraction inside half of the radius is 1/4
+        self.assertAlmostEqual(np.mean(radius < 0.25), 0.25, delta=0.01)
+        self.assertAlmostEqual(np.mean(beam.dt), 0.5, delta=0.005)
+        self.assertAlmostEqual(np.mean(beam.dE), 0, delta=0.01)
+
+    def test_chunks(self):
+
+        beam = self.populate()
+        for chunk_size, n_threads in [(1000, 1), (777, 3)]:
+            beam_chunks = self.populate(chunk_size=chunk_size,
+                                        n_threads=n_threads)
+            np.testing.assert_array_equal(beam_chunks.dt, beam.dt)
+            np.testing.assert_array_equal(beam_chunks.dE, beam.dE)
+
+        with self.assertRaises(RuntimeError):
+            self.populate(chunk_size=0)
+
+
+class TestBigaussian(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = Ring(6911.56, 1/17.95142852**2, 25.92e9, Proton(), 1)
+        self.rf = RFStation(self.ring, 4620, 4.5e6, 0)
+        self.beam = Beam(self.ring, 100000, 1e11)
+        self.dt_s = self.rf.phi_s[0] / self.rf.omega_rf[0, 0]
+
+    def test_distribution(self):
+
+        dt = self.beam.dt
+        bigaussian(self.ring, self.rf, self.beam, 0.5e-9, sigma_dE=1e8,
+                   seed=1)
+        self.assertIs(self.beam.dt, dt)
+        self.assertAlmostEqual(np.mean(self.beam.dt), self.dt_s, delta=1e-11)
+        self.assertAlmostEqual(np.std(self.beam.dt) / 0.5e-9, 1, delta=0.01)
+        self.assertAlmostEqual(np.mean(self.beam.dE), 0, delta=2e6)
+        self.assertAlmostEqual(np.std(self.beam.dE) / 1e8, 1, delta=0.01)
+
+        # The particle i only depends on the seed and on i
+        dt = np.copy(self.beam.dt)
+        dt_split = np.empty_like(dt)
+        dE_split = np.empty_like(dt)
+        for first in [0, 30000, 60001]:
+            last = min(first + 39999, len(dt))
+            bm.bigaussian(dt_split[first:last], dE_split[first:last], 1,
+                          self.dt_s, 0.5e-9, 1e8, first=first)
+        np.testing.assert_array_equal(dt_split, dt)
+        np.testing.assert_array_equal(dE_split, self.beam.dE)
+
+    def test_reinsertion(self):
+
+        bigaussian(self.ring, self.rf, self.beam, 1e-9, seed=1)
+        dt, dE = np.copy(self.beam.dt), np.copy(self.beam.dE)
+        inside = is_in_separatrix(self.ring, self.rf, self.beam, dt, dE)
+        self.assertGreater(np.sum(~inside), 100)
+
+        # Only the particles outside of the separatrix are drawn again
+        bigaussian(self.ring, self.rf, self.beam, 1e-9, seed=1,
+                   reinsertion=True)
+        self.assertTrue(np.all(is_in_separatrix(self.ring, self.rf, self.beam,
+                                                self.beam.dt, self.beam.dE)))
+        np.testing.assert_array_equal(self.beam.dt[inside], dt[inside])
+        np.testing.assert_array_equal(self.beam.dE[inside], dE[inside])
+        self.assertFalse(np.any(self.beam.dt[~inside] == dt[~inside]))
+
+
+class TestMultibunch(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = Ring(6911.56, 1/17.95142852**2, 25.92e9, Proton(), 1)
+        self.rf = RFStation(self.ring, 4620, 4.5e6, 0)
+
+    def generate(self, n_processes, induced_voltage=False, **kwargs):
+        beam = Beam(self.ring, 20000, 4e11)
+        full_ring = FullRingAndRF([RingAndRFTracker(self.rf, beam)])
+        total_induced_voltage = None
+        if induced_voltage:
+            bucket = 2*np.pi / (4620*self.ring.omega_rev[0])
+            profile = Profile(beam, CutOptions(-bucket, 17*bucket, 1800))
+            total_induced_voltage = TotalInducedVoltage(beam, profile, [
+                InducedVoltageFreq(beam, profile,
+                                   [Resonators(2e6, 1e9, 5)], 1e6)])
+        matched_from_line_density_multibunch(
+            beam, self.ring, full_ring,
+            {'type': 'parabolic_amplitude', 'bunch_length': 2e-9}, 4, 5,
+            TotalInducedVoltage=total_induced_voltage, seed=1,
+            n_processes=n_processes, **kwargs)
+        return beam
+
+    def assert_bunch_positions(self, beam):
+        bunches = beam.dt.reshape(4, -1)
+        bucket = 2*np.pi / (4620*self.ring.omega_rev[0])
+        np.testing.assert_allclose(np.mean(bunches, axis=1) - bunches[0].mean(),
+                                   5*bucket*np.arange(4), rtol=0, atol=5e-11)
+
+    def test_n_processes(self):
+
+        beam = self.generate(1)
+        self.assert_bunch_positions(beam)
+        bunches = beam.dt.reshape(4, -1)
+        bucket = 2*np.pi / (4620*self.ring.omega_rev[0])
+        # Each bunch has its own seed
+        self.assertFalse(np.array_equal(bunches[1] - bunches[0].mean()
+                                        - 5*bucket, bunches[0]))
+
+        beam_parallel = self.generate(2)
+        np.testing.assert_array_equal(beam_parallel.dt, beam.dt)
+        np.testing.assert_array_equal(beam_parallel.dE, beam.dE)
+
+    def test_openmp_threads(self):
+
+        # Worker processes of a process with several OpenMP threads
+        script = (
+            "import sys, unittest\n"
+            "from unittests.beams.test_distributions import TestMultibunch\n"
+            "if __name__ == '__main__':\n"
+            "    test = TestMultibunch('test_n_processes')\n"
+            "    result = unittest.TextTestRunner().run(test)\n"
+            "    sys.exit(not result.wasSuccessful())\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(blond.__file__)))
+        env = dict(os.environ, OMP_NUM_THREADS='2', PYTHONPATH=root)
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'multibunch.py')
+            with open(file_name, 'w') as script_file:
+                script_file.write(script)
+            ret = subprocess.run([sys.executable, file_name], cwd=root,
+                                 env=env, timeout=120,
+                                 stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL)
+        self.assertEqual(ret.returncode, 0)
+
+    def test_induced_voltage(self):
+
+        # Bunch after bunch, in the induced voltage of the previous ones
+        beam = self.generate(1, induced_voltage=True)
+        self.assert_bunch_positions(beam)
+        self.assertFalse(np.array_equal(beam.dt, self.generate(1).dt))
+
+    def test_shared_potential_iterations(self):
+
+        beam = self.generate(1, induced_voltage=True,
+                             shared_potential_iterations=2)
+        self.assert_bunch_positions(beam)
+
+        beam_parallel = self.generate(2, induced_voltage=True,
+                                      shared_potential_iterations=2)
+        np.testing.assert_array_equal(beam_parallel.dt, beam.dt)
+        np.testing.assert_array_equal(beam_parallel.dE, beam.dE)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
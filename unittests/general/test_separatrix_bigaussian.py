@@ -135,7 +135,7 @@ class TestSeparatrixBigaussian(unittest.TestCase):
 
         self.assertAlmostEqual(self.phi_s, 3.4741, places = 3, 
             msg = 'Failed test_1 in TestSeparatrixBigaussian on phi_s')
-        self.assertAlmostEqual(self.phi_b, 3.4742, places  = 3,
+        self.assertAlmostEqual(self.phi_b, 3.4734, places  = 3,
             msg = 'Failed test_1 in TestSeparatrixBigaussian on phi_b')
         self.assertAlmostEqual(self.phi_rf, 4.1416, places = 3,
             msg = 'Failed test_1 in TestSeparatrixBigaussian on phi_rf')
@@ -156,7 +156,7 @@ class TestSeparatrixBigaussian(unittest.TestCase):
         
         self.assertAlmostEqual(self.phi_s, 3.4152, places = 3, 
             msg = 'Failed test_2 in TestSeparatrixBigaussian on phi_s')
-        self.assertAlmostEqual(self.phi_b, 3.4153, places  = 3,
+        self.assertAlmostEqual(self.phi_b, 3.4145, places  = 3,
             msg = 'Failed test_2 in TestSeparatrixBigaussian on phi_b')
         self.assertAlmostEqual(self.phi_rf, 4.1416, places = 3,
             msg = 'Failed test_2 in TestSeparatrixBigaussian on phi_rf')
@@ -178,7 +178,7 @@ class TestSeparatrixBigaussian(unittest.TestCase):
         
         self.assertAlmostEqual(self.phi_s, 2.7927, places = 3, 
             msg = 'Failed test_3 in TestSeparatrixBigaussian on phi_s')
-        self.assertAlmostEqual(self.phi_b, 2.7928, places  = 3,
+        self.assertAlmostEqual(self.phi_b, 2.7920, places  = 3,
             msg = 'Failed test_3 in TestSeparatrixBigaussian on phi_b')
         self.assertAlmostEqual(self.phi_rf, 4.1416, places = 3,
             msg = 'Failed test_3 in TestSeparatrixBigaussian on phi_rf')
@@ -200,7 +200,7 @@ class TestSeparatrixBigaussian(unittest.TestCase):
         
         self.assertAlmostEqual(self.phi_s, 2.8051, places = 3, 
             msg = 'Failed test_4 in TestSeparatrixBigaussian on phi_s')
-        self.assertAlmostEqual(self.phi_b, 2.8052, places  = 3,
+        self.assertAlmostEqual(self.phi_b, 2.8044, places  = 3,
             msg = 'Failed test_4 in TestSeparatrixBigaussian on phi_b')
         self.assertAlmostEqual(self.phi_rf, 4.1416, places = 3,
             msg = 'Failed test_4 in TestSeparatrixBigaussian on phi_rf')
@@ -222,7 +222,7 @@ class TestSeparatrixBigaussian(unittest.TestCase):
         
         self.assertAlmostEqual(self.phi_s, 3.3977, places = 3, 
             msg = 'Failed test_5 in TestSeparatrixBigaussian on phi_s')
-        self.assertAlmostEqual(self.phi_b, 3.3978, places  = 3,
+        self.assertAlmostEqual(self.phi_b, 3.3970, places  = 3,
             msg = 'Failed test_5 in TestSeparatrixBigaussian on phi_b')
         self.assertAlmostEqual(self.phi_rf, 1.0000, places = 3,
             msg = 'Failed test_5 in TestSeparatrixBigaussian on phi_rf')
@@ -246,7 +246,7 @@ class TestSeparatrixBigaussian(unittest.TestCase):
         
         self.assertAlmostEqual(self.phi_s, 3.4529, places = 3, 
             msg = 'Failed test_6 in TestSeparatrixBigaussian on phi_s')
-        self.assertAlmostEqual(self.phi_b, 3.4531, places  = 3,
+        self.assertAlmostEqual(self.phi_b, 3.4522, places  = 3,
             msg = 'Failed test_6 in TestSeparatrixBigaussian on phi_b')
         self.assertAlmostEqual(self.phi_rf, 1.0000, places = 3,
             msg = 'Failed test_6 in TestSeparatrixBigaussian on phi_rf')
@@ -270,7 +270,7 @@ class TestSeparatrixBigaussian(unittest.TestCase):
         
         self.assertAlmostEqual(self.phi_s, 2.8855, places = 3, 
             msg = 'Failed test_7 in TestSeparatrixBigaussian on phi_s')
-        self.assertAlmostEqual(self.phi_b, 2.8857, places  = 3,
+        self.assertAlmostEqual(self.phi_b, 2.8848, places  = 3,
             msg = 'Failed test_7 in TestSeparatrixBigaussian on phi_b')
         self.assertAlmostEqual(self.phi_rf, 1.0000, places = 3,
             msg = 'Failed test_7 in TestSeparatrixBigaussian on phi_rf')
@@ -294,7 +294,7 @@ class TestSeparatrixBigaussian(unittest.TestCase):
         
         self.assertAlmostEqual(self.phi_s, 2.8869, places = 3, 
             msg = 'Failed test_8 in TestSeparatrixBigaussian on phi_s')
-        self.assertAlmostEqual(self.phi_b, 2.8870, places  = 3,
+        self.assertAlmostEqual(self.phi_b, 2.8862, places  = 3,
             msg = 'Failed test_8 in TestSeparatrixBigaussian on phi_b')
         self.assertAlmostEqual(self.phi_rf, 1.0000, places = 3,
             msg = 'Failed test_8 in TestSeparatrixBigaussian on phi_rf')
@@ -16,9 +16,16 @@ Unittest for impedances.impedance
 import unittest
 import numpy as np
 
+from blond.utils import bmath as bm
+
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Beam, Proton
 from blond.beam.profile import Profile, CutOptions
-from blond.impedances.impedance import InducedVoltageFreq, InducedVoltageTime
-from blond.impedances.impedance_sources import Resonators
+from blond.beam.sparse_slices import SparseSlices
+from blond.impedances.impedance import InducedVoltageFreq, InducedVoltageTime,\
+    InducedVoltageSparse
+from blond.impedances.impedance_sources import Resonators, TravelingWaveCavity
 
 class TestInducedVoltageFreq(unittest.TestCase):
 
@@ -119,6 +126,142 @@ class TestInducedVoltageTime(unittest.TestCase):
         
         np.testing.assert_allclose(test_object.wake_length_input, 11e-9)
 
+    def test_reprocess_cached_wake(self):
+        test_object= InducedVoltageTime(
+                None, self.profile, [self.impedance_source])
+        total_wake = test_object.total_wake.copy()
+
+        # Changing the slicing and then going back to the original one
+        self.profile.cut_options.n_slices = 32
+        self.profile.cut_options.set_cuts()
+        self.profile.set_slices_parameters()
+        test_object.process()
+        self.assertEqual(len(self.impedance_source._cache), 2)
+
+        self.profile.cut_options.n_slices = 16
+        self.profile.cut_options.set_cuts()
+        self.profile.set_slices_parameters()
+        test_object.process()
+        self.assertEqual(len(self.impedance_source._cache), 2)
+
+        np.testing.assert_array_equal(test_object.total_wake, total_wake)
+
+    def test_wrong_convolution_mode(self):
+        with self.assertRaises(RuntimeError):
+            InducedVoltageTime(None, self.profile, [self.impedance_source],
+                               convolution_mode='something')
+
+    def test_direct_convolution(self):
+        ring = Ring(6911.56, 1/18**2, 25.92e9, Proton(), 10)
+        beam = Beam(ring, 10000, 1e11)
+        np.random.seed(1)
+        beam.dt[:] = np.random.normal(5e-9, 1e-9, beam.n_macroparticles)
+        profile = Profile(beam, CutOptions=CutOptions(
+            cut_left=0, cut_right=10e-9, n_slices=1000))
+        profile.track()
+
+        # The wake of the travelling wave cavity vanishes after 0.5 ns
+        twc = TravelingWaveCavity([2e5], [200.222e6], [np.pi*1e-9])
+
+        induced_voltage_fft = InducedVoltageTime(beam, profile, [twc],
+                                                 convolution_mode='fft')
+        induced_voltage_auto = InducedVoltageTime(beam, profile, [twc])
+        self.assertFalse(induced_voltage_fft.direct_convolution)
+        self.assertTrue(induced_voltage_auto.direct_convolution)
+        self.assertLessEqual(induced_voltage_auto.n_wake_kernel, 51)
+
+        induced_voltage_fft.induced_voltage_1turn()
+        induced_voltage_auto.induced_voltage_1turn()
+        np.testing.assert_allclose(
+            induced_voltage_auto.induced_voltage,
+            induced_voltage_fft.induced_voltage, rtol=0,
+            atol=1e-9*np.max(np.abs(induced_voltage_fft.induced_voltage)))
+
+        # Induced voltage longer than the profile
+        induced_voltage_fft = InducedVoltageTime(
+            beam, profile, [twc], wake_length=20e-9, convolution_mode='fft')
+        induced_voltage_direct = InducedVoltageTime(
+            beam, profile, [twc], wake_length=20e-9,
+            convolution_mode='direct')
+        induced_voltage_fft.induced_voltage_1turn()
+        induced_voltage_direct.induced_voltage_1turn()
+        np.testing.assert_allclose(
+            induced_voltage_direct.induced_voltage,
+            induced_voltage_fft.induced_voltage, rtol=0,
+            atol=1e-9*np.max(np.abs(induced_voltage_fft.induced_voltage)))
+
+
+class TestInducedVoltageSparse(unittest.TestCase):
+
+    def setUp(self):
+        ring = Ring(6911.56, 1/18**2, 25.92e9, Proton(), 10)
+        self.rf_station = RFStation(ring, 40, 3.5e6, 0)
+        t_rf = self.rf_station.t_rf[0, 0]
+        self.n_slices_bucket = 20
+
+        # The first bucket is empty
+        self.filling_pattern = np.zeros(30)
+        self.filling_pattern[[3, 5, 6, 20, 29]] = 1
+        filled_buckets = np.flatnonzero(self.filling_pattern)
+
+        n_macroparticles_bunch = 2000
+        self.beam = Beam(ring, n_macroparticles_bunch*len(filled_buckets),
+                         1e11*len(filled_buckets))
+        np.random.seed(1)
+        for i, bucket in enumerate(filled_buckets):
+            self.beam.dt[i*n_macroparticles_bunch:
+                         (i+1)*n_macroparticles_bunch] = np.random.normal(
+                (bucket + 0.5)*t_rf, t_rf/10, n_macroparticles_bunch)
+            self.beam.dE[i*n_macroparticles_bunch:
+                         (i+1)*n_macroparticles_bunch] = np.random.normal(
+                0, 1e6, n_macroparticles_bunch)
+
+        self.sparse_slices = SparseSlices(
+            self.rf_station, self.beam, self.n_slices_bucket,
+            self.filling_pattern, direct_slicing=True)
+        self.profile = Profile(self.beam, CutOptions=CutOptions(
+            cut_left=0, cut_right=40*t_rf, n_slices=40*self.n_slices_bucket))
+        self.profile.track()
+
+        self.impedance_source = Resonators([1e6, 2e5], [200e6, 1e9], [30, 2])
+        self.induced_voltage_freq = InducedVoltageFreq(
+            self.beam, self.profile, [self.impedance_source],
+            frequency_resolution=1/(40*t_rf)*(1+1e-9), use_regular_fft=False)
+        self.induced_voltage_freq.induced_voltage_1turn()
+
+    def test_induced_voltage(self):
+        induced_voltage = InducedVoltageSparse(
+            self.beam, self.sparse_slices, [self.impedance_source])
+        induced_voltage.induced_voltage_generation()
+
+        induced_voltage_freq = self.induced_voltage_freq.induced_voltage\
+            .reshape(40, self.n_slices_bucket)[
+                np.flatnonzero(self.filling_pattern)]
+        np.testing.assert_allclose(
+            induced_voltage.induced_voltage, induced_voltage_freq, rtol=0,
+            atol=1e-9*np.max(np.abs(induced_voltage_freq)))
+
+    def test_wake_truncation(self):
+        induced_voltage = InducedVoltageSparse(
+            self.beam, self.sparse_slices, [self.impedance_source],
+            wake_truncation=0.1)
+        self.assertLess(induced_voltage.n_pairs, 25)
+
+    def test_kick(self):
+        induced_voltage = InducedVoltageSparse(
+            self.beam, self.sparse_slices, [self.impedance_source])
+        dE = self.beam.dE.copy()
+        induced_voltage.track()
+        kick = self.beam.dE - dE
+
+        kick_freq = np.zeros(self.beam.n_macroparticles)
+        bm.linear_interp_kick(self.beam.dt, kick_freq,
+                              self.induced_voltage_freq.induced_voltage,
+                              self.profile.bin_centers,
+                              self.beam.Particle.charge, 0.)
+        np.testing.assert_allclose(kick, kick_freq, rtol=0,
+                                   atol=1e-9*np.max(np.abs(kick)))
+
 
 if __name__ == '__main__':
 
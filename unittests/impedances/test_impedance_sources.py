@@ -13,6 +13,8 @@ Unittest for impedances.impedance_sources
 :Authors: **Markus Schwarz**
 """
 
+import os
+import tempfile
 import unittest
 import numpy as np
 
@@ -33,6 +35,82 @@ class Test_ImpedanceObject(unittest.TestCase):
         self.assertRaises(NotImplementedError, self.test_object.wake_calc)
 
 
+class TestImpedanceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.resonator = Resonators([4.5e6], [200.222e6], [200])
+        self.n_calls = 0
+        imped_calc = self.resonator.imped_calc
+
+        def counting_imped_calc(frequency_array):
+            self.n_calls += 1
+            imped_calc(frequency_array)
+        self.resonator.imped_calc = counting_imped_calc
+
+    def test_cacheHit(self):
+        freq = np.linspace(0, 1e9, 101)
+        self.resonator.imped_calc_cached(freq)
+        impedance = self.resonator.impedance.copy()
+
+        self.resonator.imped_calc_cached(np.linspace(0, 2e9, 101))
+        self.resonator.imped_calc_cached(freq.copy())
+
+        self.assertEqual(self.n_calls, 2)
+        np.testing.assert_array_equal(self.resonator.impedance, impedance)
+        np.testing.assert_array_equal(self.resonator.frequency_array, freq)
+
+    def test_leastRecentlyUsedEviction(self):
+        self.resonator.cache_size = 2
+        grids = [np.linspace(0, (i+1)*1e9, 11) for i in range(3)]
+
+        for freq in grids + grids[-1:]:
+            self.resonator.imped_calc_cached(freq)
+        self.assertEqual(self.n_calls, 3)
+
+        # the first grid was evicted, the last one is still cached
+        self.resonator.imped_calc_cached(grids[0])
+        self.resonator.imped_calc_cached(grids[2])
+        self.assertEqual(self.n_calls, 4)
+
+    def test_clearCache(self):
+        freq = np.linspace(0, 1e9, 101)
+        self.resonator.imped_calc_cached(freq)
+        self.resonator.R_S = 2 * self.resonator.R_S
+        self.resonator.clear_cache()
+        self.resonator.imped_calc_cached(freq)
+
+        reference = Resonators([9e6], [200.222e6], [200])
+        reference.imped_calc(freq)
+
+        self.assertEqual(self.n_calls, 2)
+        np.testing.assert_allclose(self.resonator.impedance,
+                                   reference.impedance)
+
+    def test_parameterChange(self):
+        freq = np.linspace(0, 1e9, 101)
+        self.resonator.imped_calc_cached(freq)
+        impedance = self.resonator.impedance.copy()
+
+        # New parameters, assigned or changed in place, are computed again
+        self.resonator.R_S = 2 * self.resonator.R_S
+        self.resonator.imped_calc_cached(freq)
+        self.resonator.Q[0] = 100
+        self.resonator.imped_calc_cached(freq)
+        self.assertEqual(self.n_calls, 3)
+
+        reference = Resonators([9e6], [200.222e6], [100])
+        reference.imped_calc(freq)
+        np.testing.assert_allclose(self.resonator.impedance,
+                                   reference.impedance)
+
+        # Going back to the first parameters hits the cache
+        self.resonator.R_S = self.resonator.R_S / 2
+        self.resonator.Q[0] = 200
+        self.resonator.imped_calc_cached(freq)
+        self.assertEqual(self.n_calls, 3)
+        np.testing.assert_array_equal(self.resonator.impedance, impedance)
+
+
 class TestResonators(unittest.TestCase):
 
     def test_smallQError(self):
@@ -50,6 +128,40 @@ class TestResistiveWall(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             ResistiveWall(1, 2)
 
+    def test_wakeMatchesImpedance(self):
+        # voltage induced by a Gaussian bunch, from the wake and from the
+        # impedance
+        rw = ResistiveWall(0.05, 100, conductivity=1e6)
+        sigma, time_step = 0.2e-9, 1e-12
+
+        rw.wake_calc(np.arange(0, 3.5e-9, time_step))
+        bunch_time = np.arange(-1.5e-9, 1.5e-9, time_step)
+        line_density = np.exp(-bunch_time**2 / (2 * sigma**2)) \
+            / (np.sqrt(2 * np.pi) * sigma)
+        voltage = np.convolve(line_density, rw.wake)[:len(bunch_time)] \
+            * time_step
+
+        frequency = np.linspace(0, 10 / sigma, 100001)[1:]
+        rw.imped_calc(frequency)
+        spectrum = rw.impedance * np.exp(-(2 * np.pi * frequency * sigma)**2 / 2)
+        for index in [1100, 1500, 1800]:
+            voltage_freq = 2 * np.trapz(
+                (spectrum * np.exp(2j * np.pi * frequency
+                                   * bunch_time[index])).real, frequency)
+            self.assertAlmostEqual(voltage[index] / voltage_freq, 1, places=3)
+
+    def test_averagedWake(self):
+        rw = ResistiveWall(0.05, 100, conductivity=1e6)
+        time_array = np.linspace(0, 1e-10, 101)
+
+        rw.wake_calc(time_array, averaged=False)
+        wake = rw.wake.copy()
+        rw.wake_calc(time_array)
+
+        # far from the short-range wake the average is the sampled wake
+        np.testing.assert_allclose(rw.wake[20:], wake[20:], rtol=1e-3)
+        self.assertLess(rw.wake[0], wake[0])
+
 
 class TestCoherentSynchrotronRadiation(unittest.TestCase):
 
@@ -131,6 +243,66 @@ class TestCoherentSynchrotronRadiation(unittest.TestCase):
 
         self.assertAlmostEqual(energy_loss, energy_loss_textbook, places=3)
 
+    def test_tabulationNeedsGamma(self):
+        with self.assertRaises(ValueError):
+            CoherentSynchrotronRadiation(1, chamber_height=42, tabulate=True)
+
+    def test_tabulatedFreeSpace(self):
+        r_bend, gamma = 1.273, 40e6 / Electron().mass
+
+        Z_fs = CoherentSynchrotronRadiation(r_bend, gamma=gamma)
+        Z_tab = CoherentSynchrotronRadiation(r_bend, gamma=gamma, tabulate=True)
+
+        # includes frequencies below and above the table range
+        frequencies = 10**np.linspace(8, 15, num=50)
+        Z_tab.imped_calc(frequencies)
+
+        for frequency, impedance in zip(frequencies, Z_tab.impedance):
+            Z_fs.imped_calc(np.array([frequency]))
+            np.testing.assert_allclose(impedance, Z_fs.impedance[0], rtol=1e-4)
+
+    def test_tabulatedDiskCache(self):
+        r_bend, gamma = 1.273, 40e6 / Electron().mass
+        frequencies = 10**np.linspace(10, 14, num=20)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            Z_tab = CoherentSynchrotronRadiation(r_bend, gamma=gamma, tabulate=True,
+                                                 table_rtol=1e-3, cache_dir=cache_dir)
+            Z_tab.imped_calc(frequencies)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # the table is read back from disk
+            CoherentSynchrotronRadiation._table_cache.clear()
+            Z_tab_loaded = CoherentSynchrotronRadiation(r_bend, gamma=gamma, tabulate=True,
+                                                        table_rtol=1e-3, cache_dir=cache_dir)
+            Z_tab_loaded.imped_calc(frequencies)
+
+            np.testing.assert_allclose(Z_tab_loaded.impedance, Z_tab.impedance)
+
+    def test_tabulatedCacheEviction(self):
+        r_bend = 1.273
+        CoherentSynchrotronRadiation._table_cache.clear()
+
+        for energy in [40e6, 50e6, 60e6, 70e6, 80e6, 40e6]:
+            Z_tab = CoherentSynchrotronRadiation(r_bend, gamma=energy / Electron().mass,
+                                                 tabulate=True, table_rtol=1e-2)
+            Z_tab.imped_calc(np.array([1e12]))
+        self.assertEqual(len(CoherentSynchrotronRadiation._table_cache),
+                         CoherentSynchrotronRadiation.table_cache_size)
+
+        # the most recently used table is kept
+        self.assertIs(next(reversed(CoherentSynchrotronRadiation._table_cache.values())),
+                      Z_tab._table)
+        CoherentSynchrotronRadiation._table_cache.clear()
+
+    def test_tabulationNotConverged(self):
+        r_bend, gamma = 1.273, 40e6 / Electron().mass
+        Z_tab = CoherentSynchrotronRadiation(r_bend, gamma=gamma, tabulate=True,
+                                             table_rtol=1e-8)
+
+        with self.assertWarns(UserWarning):
+            Z_tab._compute_table({}, max_refinements=1)
+
 
 if __name__ == '__main__':
 
@@ -0,0 +1,123 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unittest for impedances.music
+
+"""
+
+import unittest
+import numpy as np
+
+from blond.input_parameters.ring import Ring
+from blond.beam.beam import Beam, Proton
+from blond.impedances.music import Music, MusicParallel
+
+
+class TestMusicParallel(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = Ring(6911.56, 1/18**2, 25.92e9, Proton(), 10)
+        self.n_macroparticles = 2000
+        self.intensity = 1e11
+        self.t_rev = 2.3e-5
+        self.resonator = [1e5, 2*np.pi*1e9, 10]
+
+        np.random.seed(1)
+        self.dt = np.random.normal(5e-9, 1e-9, self.n_macroparticles)
+        self.dE = np.random.normal(0, 1e6, self.n_macroparticles)
+
+    def _beam(self):
+        beam = Beam(self.ring, self.n_macroparticles, self.intensity)
+        beam.dt[:] = self.dt
+        beam.dE[:] = self.dE
+        return beam
+
+    def test_single_turn(self):
+        beam_ref = self._beam()
+        music_ref = Music(beam_ref, self.resonator, self.n_macroparticles,
+                          self.intensity, self.t_rev)
+        music_ref.track_py()
+
+        beam = self._beam()
+        music = MusicParallel(beam, self.resonator, self.n_macroparticles,
+                              self.intensity, self.t_rev)
+        music.track()
+
+        # The beam order is preserved
+        np.testing.assert_array_equal(beam.dt, self.dt)
+        np.testing.assert_array_equal(beam.dt[music.permutation],
+                                      beam_ref.dt)
+        np.testing.assert_allclose(
+            music.induced_voltage[music.permutation],
+            music_ref.induced_voltage, rtol=1e-9,
+            atol=1e-9*np.max(np.abs(music_ref.induced_voltage)))
+        np.testing.assert_allclose(beam.dE[music.permutation], beam_ref.dE,
+                                   rtol=1e-9)
+
+    def test_multi_turn(self):
+        beam_ref = self._beam()
+        music_ref = Music(beam_ref, self.resonator, self.n_macroparticles,
+                          self.intensity, self.t_rev)
+        music_ref.track_py()
+
+        beam = self._beam()
+        music = MusicParallel(beam, self.resonator, self.n_macroparticles,
+                              self.intensity, self.t_rev)
+        music.track()
+
+        for i in range(3):
+            # Small motion, reordering some of the particles
+            beam.dt += np.random.normal(0, 1e-11, self.n_macroparticles)
+            beam_ref.dt[:] = beam.dt[music.permutation]
+            music_ref.track_py_multi_turn()
+            music.track_multi_turn()
+
+            np.testing.assert_array_equal(beam.dt[music.permutation],
+                                          beam_ref.dt)
+            np.testing.assert_allclose(
+                music.induced_voltage[music.permutation],
+                music_ref.induced_voltage, rtol=1e-9,
+                atol=1e-9*np.max(np.abs(music_ref.induced_voltage)))
+            np.testing.assert_allclose(beam.dE[music.permutation],
+                                       beam_ref.dE, rtol=1e-9)
+
+    def test_several_resonators(self):
+        resonator_2 = [2e5, 2*np.pi*0.4e9, 3]
+
+        beam = self._beam()
+        music = MusicParallel(beam, [self.resonator, resonator_2],
+                              self.n_macroparticles, self.intensity,
+                              self.t_rev)
+        music.track()
+        music.track_multi_turn()
+
+        beam_single = self._beam()
+        music_1 = MusicParallel(beam_single, self.resonator,
+                                self.n_macroparticles, self.intensity,
+                                self.t_rev)
+        music_2 = MusicParallel(beam_single, resonator_2,
+                                self.n_macroparticles, self.intensity,
+                                self.t_rev)
+        music_1.track()
+        music_2.track()
+        music_1.track_multi_turn()
+        music_2.track_multi_turn()
+
+        self.assertEqual(music.n_resonators, 2)
+        np.testing.assert_allclose(
+            music.induced_voltage,
+            music_1.induced_voltage + music_2.induced_voltage,
+            rtol=1e-9, atol=1e-9*np.max(np.abs(music.induced_voltage)))
+        np.testing.assert_allclose(beam.dE, beam_single.dE, rtol=1e-9)
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -15,6 +15,7 @@ from blond.beam.beam import Beam, Proton
 from blond.beam.distributions import bigaussian
 from blond.beam.profile import Profile, CutOptions
 from blond.llrf.beam_feedback import BeamFeedback
+from blond.utils import bmath as bm
 from blond.trackers.tracker import RingAndRFTracker, FullRingAndRF
 
 
@@ -173,6 +174,61 @@ class TestBeamFeedback(unittest.TestCase):
                                    err_msg='In TestBeamFeedback test_SPS_RL: difference between simulated and analytic result different than expected')
 
 
+class TestBeamFeedbackPSB(unittest.TestCase):
+
+    def setUp(self):
+        n_turns = 2000
+        # PSB-like ramp, revolution period decreasing along the cycle
+        self.ring = Ring(157.08, 1/4.4**2, np.linspace(0.57e9, 0.6e9, n_turns+1),
+                         Proton(), n_turns=n_turns)
+        self.rf_station = RFStation(self.ring, 1, 8e3, np.pi)
+
+        self.beam = Beam(self.ring, 10000, 1e11)
+        np.random.seed(1234)
+        self.beam.dt = np.random.normal(0.5e-6, 0.05e-6, 10000)
+        self.profile = Profile(self.beam, CutOptions=CutOptions(
+            cut_left=0, cut_right=self.ring.t_rev[0], n_slices=100))
+        self.profile.track()
+
+    def test_on_time(self):
+
+        delay = 3
+        phase_loop = BeamFeedback(self.ring, self.rf_station, self.profile,
+                                  {'machine': 'PSB', 'PL_gain': 1,
+                                   'period': 10e-6}, delay=delay)
+
+        # Each interval ends on the turn that completes the period
+        start = delay + 1
+        for end in phase_loop.on_time[:-1].astype(int):
+            self.assertGreaterEqual(np.sum(self.ring.t_rev[start:end+1]), 10e-6)
+            self.assertLess(np.sum(self.ring.t_rev[start:end]), 10e-6)
+            start = end + 1
+        # The last, incomplete interval
+        self.assertEqual(phase_loop.on_time[-1], 0)
+        self.assertLess(np.sum(self.ring.t_rev[start:]), 10e-6)
+
+    def test_time_offset(self):
+
+        time_offset = 0.4e-6
+        phase_loop = BeamFeedback(self.ring, self.rf_station, self.profile,
+                                  {'machine': 'PSB', 'PL_gain': 1,
+                                   'time_offset': time_offset,
+                                   'window_coefficient': 1e6})
+        phase_loop.beam_phase()
+
+        # Only the bins from the time offset on contribute
+        indexes = self.profile.bin_centers >= time_offset
+        coeff = bm.beam_phase(self.profile.bin_centers[indexes],
+                              self.profile.n_macroparticles[indexes], 1e6,
+                              self.rf_station.omega_rf[0, 0],
+                              self.rf_station.phi_rf[0, 0],
+                              self.profile.bin_size)
+        self.assertEqual(phase_loop.time_offset_index(),
+                         np.argmax(indexes))
+        self.assertAlmostEqual(phase_loop.phi_beam, np.arctan(coeff) + np.pi,
+                               places=12)
+
+
 if __name__ == '__main__':
 
     unittest.main()
@@ -18,7 +18,8 @@ import numpy as np
 import os
 from scipy.constants import c
 
-from blond.llrf.cavity_feedback import SPSOneTurnFeedback, SPSCavityFeedback, CavityFeedbackCommissioning
+from blond.llrf.cavity_feedback import SPSOneTurnFeedback, SPSCavityFeedback, CavityFeedbackCommissioning, \
+    CavityFeedbackScheduler
 from blond.beam.beam import Beam, Proton
 from blond.beam.profile import Profile, CutOptions
 from blond.beam.distributions import bigaussian
@@ -361,6 +362,81 @@ class TestSPSCavityFeedback(unittest.TestCase):
                                    err_msg='In TestCavityFeedback test_Vsum_IQ: total voltage ' +
                                    'is different from expected values!')
 
+    def test_threads(self):
+
+        V_sum = []
+        for n_threads in [1, 2]:
+            OTFB = SPSCavityFeedback(
+                self.rf, self.beam, self.profile, G_llrf=20, G_tx=[1.0355739238973907, 1.078403005653143],
+                a_comb=63/64, turns=10, post_LS2=True, df=[0.18433333e6, 0.2275e6],
+                Commissioning=CavityFeedbackCommissioning(open_FF=True), n_threads=n_threads)
+            OTFB.track()
+            V_sum.append(OTFB.V_sum)
+
+        np.testing.assert_array_equal(V_sum[0], V_sum[1])
+
+    def test_steady_state(self):
+
+        OTFB = SPSCavityFeedback(
+            self.rf, self.beam, self.profile, G_llrf=20, G_tx=[1.0355739238973907, 1.078403005653143],
+            a_comb=63/64, turns=1000, post_LS2=True, df=[0.18433333e6, 0.2275e6],
+            Commissioning=CavityFeedbackCommissioning(open_FF=True), steady_state=True)
+
+        # Same voltage as the pre-tracking, unchanged by a further turn
+        for OTFB_ss, OTFB_ref in zip([OTFB.OTFB_1, OTFB.OTFB_2],
+                                     [self.OTFB.OTFB_1, self.OTFB.OTFB_2]):
+            V_ANT = np.copy(OTFB_ss.V_ANT[-OTFB_ss.n_coarse:])
+            OTFB_ss.track_no_beam()
+            np.testing.assert_allclose(OTFB_ss.V_ANT[-OTFB_ss.n_coarse:], V_ANT,
+                                       rtol=0, atol=1e-10*np.max(np.abs(V_ANT)))
+            np.testing.assert_allclose(
+                OTFB_ss.V_ANT[-OTFB_ss.n_coarse:], OTFB_ref.V_ANT[-OTFB_ref.n_coarse:],
+                rtol=0, atol=1e-8*np.max(np.abs(OTFB_ref.V_ANT)))
+        np.testing.assert_allclose(OTFB.V_corr, self.OTFB.V_corr, rtol=1e-8)
+        np.testing.assert_allclose(OTFB.phi_corr, self.OTFB.phi_corr, rtol=0, atol=1e-8)
+
+
+class TestCavityFeedbackScheduler(unittest.TestCase):
+
+    class Feedback(object):
+
+        def __init__(self):
+            self.turns = 0
+
+        def track(self):
+            self.turns += 1
+
+        def fail(self):
+            raise ValueError
+
+    def test_start_wait(self):
+
+        feedbacks = [self.Feedback() for i in range(4)]
+        scheduler = CavityFeedbackScheduler(feedbacks, n_threads=2)
+        scheduler.start()
+        self.assertTrue(scheduler.running)
+        with self.assertRaises(RuntimeError):
+            scheduler.start()
+        scheduler.wait()
+        scheduler.track()
+
+        self.assertFalse(scheduler.running)
+        self.assertEqual([feedback.turns for feedback in feedbacks], [2]*4)
+
+    def test_exception(self):
+
+        for n_threads in [1, 2]:
+            scheduler = CavityFeedbackScheduler([self.Feedback()], n_threads)
+            with self.assertRaises(ValueError):
+                scheduler.track('fail')
+            self.assertFalse(scheduler.running)
+
+    def test_wrong_threads(self):
+
+        with self.assertRaises(RuntimeError):
+            CavityFeedbackScheduler([self.Feedback()], n_threads=0)
+
+
 class TestSPSOneTurnFeedback(unittest.TestCase):
 
     def setUp(self):
@@ -119,6 +119,58 @@ class TestTravelingWaveCavity(unittest.TestCase):
         self.assertListEqual(wake_impSource.tolist(), wake_impResp.tolist(),
                              msg="In TestTravelingWaveCavity test_wake: wake fields differ")
 
+    def test_cached_response(self):
+
+        time_coarse = np.linspace(0, 5e-6, 1001)
+        time_fine = np.linspace(1e-6, 2e-6, 20001)
+        TWC = SPS4Section200MHzTWC()
+
+        for omega_c in TWC.omega_r*np.array([1, 1 + 1e-4, 1 - 2e-4]):
+            TWC.impulse_response_gen(omega_c, time_coarse)
+            TWC.impulse_response_beam(omega_c, time_fine, time_coarse)
+
+            # Same carrier frequency and grids, cached response
+            h_gen = TWC.h_gen
+            TWC.impulse_response_gen(omega_c, time_coarse)
+            self.assertIs(TWC.h_gen, h_gen)
+
+            TWC_ref = SPS4Section200MHzTWC()
+            TWC_ref.impulse_response_gen(omega_c, time_coarse)
+            TWC_ref.impulse_response_beam(omega_c, time_fine, time_coarse)
+
+            d_omega = omega_c - TWC.omega_r
+            t_gen = time_coarse - time_coarse[0]
+            h_gen = TWC.R_gen/TWC.tau*rectangle(t_gen - 0.5*TWC.tau, TWC.tau) \
+                * np.exp(-1j*d_omega*t_gen)
+
+            np.testing.assert_allclose(TWC.h_gen, h_gen, rtol=1e-12)
+            np.testing.assert_array_equal(TWC.h_gen, TWC_ref.h_gen)
+            np.testing.assert_array_equal(TWC.h_beam, TWC_ref.h_beam)
+            np.testing.assert_array_equal(TWC.h_beam_coarse,
+                                          TWC_ref.h_beam_coarse)
+
+    def test_previous_response(self):
+
+        time_coarse = np.linspace(0, 5e-6, 1001)
+        TWC = SPS4Section200MHzTWC()
+        TWC.impulse_response_gen(TWC.omega_r, time_coarse)
+        h_gen = TWC.h_gen
+        h_gen_copy = h_gen.copy()
+
+        # A new carrier frequency does not change the previous response
+        TWC.impulse_response_gen(TWC.omega_r*(1 + 1e-4), time_coarse)
+        self.assertIsNot(TWC.h_gen, h_gen)
+        np.testing.assert_array_equal(h_gen, h_gen_copy)
+
+    def test_cache_eviction(self):
+
+        TWC = SPS4Section200MHzTWC()
+        TWC.cache_size = 2
+        for n_points in [101, 201, 301]:
+            TWC.impulse_response_beam(TWC.omega_r, np.linspace(0, 5e-6, n_points))
+        self.assertEqual(len(TWC._response_cache), 2)
+        self.assertEqual(len(TWC.h_beam), 301)
+
     @unittest.skip("FIXME")
     def test_vind(self):
 
@@ -0,0 +1,100 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unittest for llrf.rf_noise
+
+"""
+
+import unittest
+import numpy as np
+
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Beam, Proton
+from blond.trackers.tracker import RingAndRFTracker
+from blond.llrf.rf_noise import FlatSpectrum
+
+
+class TestFlatSpectrum(unittest.TestCase):
+
+    def setUp(self):
+        n_turns = 50000
+        self.ring = Ring(26658.883, 1/55.759505**2,
+                         np.linspace(450e9, 460e9, n_turns+1), Proton(),
+                         n_turns)
+        self.rf = RFStation(self.ring, 35640, 6e6, 0)
+
+    def noise(self, **kwargs):
+        return FlatSpectrum(self.ring, self.rf, fmin_s0=0.8571, fmax_s0=1.001,
+                            initial_amplitude=1e-5, corr_time=10000,
+                            folder_plots=None, print_option=False, **kwargs)
+
+    def test_batch_size(self):
+
+        dphi = []
+        for batch_size in [1, 2, 10]:
+            noise = self.noise(batch_size=batch_size)
+            noise.generate()
+            dphi.append(noise.dphi)
+
+        np.testing.assert_array_equal(dphi[0], dphi[1])
+        np.testing.assert_array_equal(dphi[0], dphi[2])
+
+        # Same r.m.s. phase as the noise from the legacy seeding, within the
+        # fluctuations of five narrow-band time steps
+        noise = self.noise()
+        noise.generate()
+        self.assertAlmostEqual(np.std(dphi[0]) / np.std(noise.dphi), 1,
+                               delta=0.25)
+
+    def test_stream(self):
+
+        noise = self.noise(batch_size=2)
+        noise.generate()
+        phi_noise = self.noise(batch_size=2).stream()
+
+        for turn in [0, 12345, 40000, 9999, 10000, self.ring.n_turns]:
+            self.assertEqual(phi_noise[:, turn].shape, (1,))
+            self.assertEqual(phi_noise[0, turn], noise.dphi[turn])
+        with self.assertRaises(IndexError):
+            phi_noise[:, self.ring.n_turns + 1]
+
+        with self.assertRaises(RuntimeError):
+            self.noise().stream()
+
+    def test_stream_tracking(self):
+
+        noise = self.noise(batch_size=2)
+        noise.generate()
+
+        rf = RFStation(self.ring, 35640, 6e6, 0,
+                       phi_noise=self.noise(batch_size=2).stream())
+        beam = Beam(self.ring, 1000, 1e11)
+        tracker = RingAndRFTracker(rf, beam)
+        for turn in range(5):
+            tracker.track()
+            self.assertEqual(rf.phi_rf[0, turn], noise.dphi[turn])
+
+        with self.assertRaises(RuntimeError):
+            RFStation(self.ring, [35640, 71280], [6e6, 3e6], [0, 0], 2,
+                      phi_noise=self.noise(batch_size=2).stream())
+
+    def test_continuous_phase(self):
+
+        for batch_size in [None, 3]:
+            noise = self.noise(continuous_phase=True, batch_size=batch_size)
+            noise.generate()
+            self.assertEqual(len(noise.dphi), self.ring.n_turns + 1)
+            self.assertTrue(np.all(np.isfinite(noise.dphi)))
+
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -16,11 +16,15 @@ Unittest for llrf.filters
 import unittest
 import numpy as np
 from scipy.constants import e
+from scipy import signal as sgn
 
 from blond.llrf.signal_processing import moving_average, modulator
 from blond.llrf.signal_processing import polar_to_cartesian, cartesian_to_polar
-from blond.llrf.signal_processing import comb_filter, low_pass_filter
+from blond.llrf.signal_processing import comb_filter, low_pass_filter, \
+    LowPassFilter, butterworth_sos
 from blond.llrf.signal_processing import rf_beam_current, feedforward_filter
+from blond.llrf.signal_processing import FIRFilter, FFTConvolution, \
+    TurnBuffer, TurnBufferAttribute
 from blond.llrf.signal_processing import feedforward_filter_TWC3, \
     feedforward_filter_TWC4, feedforward_filter_TWC5
 
@@ -419,6 +423,34 @@ class TestRFCurrent(unittest.TestCase):
         peak_rf_current = np.max(np.absolute(rf_current_coarse))
         self.assertAlmostEqual(peak_rf_current, 2.9285808008, 7)
 
+    # Test RF beam current on coarse grid against the sum over the fine bins
+    # starting from the last fine bin of the previous coarse bin
+    def test_downsampling(self):
+
+        bigaussian(self.ring, self.rf, self.beam, 1e-9, seed=1234,
+                   reinsertion=True)
+        self.profile.track()
+        T_s = self.rf.t_rf[0, 0]
+
+        for omega in [self.omega, 1.001*self.omega]:
+            rf_current_fine, rf_current_coarse = rf_beam_current(
+                self.profile, omega, self.ring.t_rev[0], lpf=False,
+                downsample={'Ts': T_s, 'points': 10})
+
+            ind_fine = np.floor((self.profile.bin_centers
+                                 - 0.5*self.profile.bin_size)/T_s).astype(int)
+            boundaries = np.concatenate(
+                ([0], np.where(np.diff(ind_fine) == 1)[0]))
+            reference = np.zeros(10, dtype=complex)
+            for i in range(len(boundaries) - 1):
+                reference[ind_fine[0] + i] = np.sum(
+                    rf_current_fine[boundaries[i]:boundaries[i+1]])
+
+            np.testing.assert_allclose(rf_current_coarse, reference,
+                rtol=1e-12, atol=0,
+                err_msg="In TestRFCurrent test_downsampling, mismatch in" +
+                " coarse-grid RF current")
+
 
 class TestComb(unittest.TestCase):
 
@@ -461,6 +493,29 @@ class TestLowPass(unittest.TestCase):
         self.assertAlmostEqual(np.abs(y - xlow).max(), 0.0230316365,
                                places=10)
 
+    def test_complex(self):
+
+        np.random.seed(1)
+        x = np.random.randn(500) + 1j*np.random.randn(500)
+        y = low_pass_filter(x, cutoff_frequency=0.1)
+
+        np.testing.assert_allclose(
+            y, low_pass_filter(x.real, cutoff_frequency=0.1)
+            + 1j*low_pass_filter(x.imag, cutoff_frequency=0.1),
+            rtol=1e-12, atol=1e-14)
+        self.assertIs(butterworth_sos(0.1), butterworth_sos(0.1))
+
+    def test_streaming(self):
+
+        np.random.seed(1)
+        x = np.random.randn(500) + 1j*np.random.randn(500)
+        lpf = LowPassFilter(cutoff_frequency=0.1)
+        y = np.concatenate([lpf.filter(x[i:i+100]) for i in range(0, 500, 100)])
+
+        b, a = sgn.butter(5, 0.1)
+        np.testing.assert_allclose(y, sgn.lfilter(b, a, x),
+                                   rtol=1e-9, atol=1e-12)
+
 
 class TestMovingAverage(unittest.TestCase):
 
@@ -504,6 +559,145 @@ class TestMovingAverage(unittest.TestCase):
             msg="In TestMovingAverage, test_3: arrays differ")
 
 
+class TestFIRFilter(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+
+        np.random.seed(1)
+        self.signal = np.random.randn(3, 100) + 1j*np.random.randn(3, 100)
+
+    def test_blocks(self):
+
+        fir = FIRFilter(feedforward_filter_TWC3)
+        filtered = np.concatenate([fir.filter(self.signal[0, i:i+20])
+                                   for i in range(0, 100, 20)])
+
+        np.testing.assert_allclose(
+            filtered,
+            np.convolve(self.signal[0], feedforward_filter_TWC3)[:100],
+            rtol=1e-12, atol=1e-14,
+            err_msg="In TestFIRFilter, test_blocks: arrays differ")
+
+    def test_channels(self):
+
+        fir = FIRFilter(feedforward_filter_TWC4, n_channels=3)
+        fir.filter(self.signal[:, :50])
+        filtered = fir.filter(self.signal[:, 50:])
+
+        for i in range(3):
+            np.testing.assert_allclose(
+                filtered[i],
+                np.convolve(self.signal[i], feedforward_filter_TWC4)[50:100],
+                rtol=1e-12, atol=1e-14,
+                err_msg="In TestFIRFilter, test_channels: arrays differ")
+
+    def test_channel_coefficients(self):
+
+        coefficients = np.zeros((2, len(feedforward_filter_TWC4)))
+        coefficients[0, :len(feedforward_filter_TWC3)] = \
+            feedforward_filter_TWC3
+        coefficients[1] = feedforward_filter_TWC4
+        fir = FIRFilter(coefficients)
+        fir.filter(self.signal[:2, :50])
+        filtered = fir.filter(self.signal[:2, 50:])
+
+        for i in range(2):
+            np.testing.assert_allclose(
+                filtered[i],
+                np.convolve(self.signal[i], coefficients[i])[50:100],
+                rtol=1e-12, atol=1e-14,
+                err_msg="In TestFIRFilter, test_channel_coefficients: " +
+                "arrays differ")
+
+
+class TestTurnBuffer(unittest.TestCase):
+
+    def test_advance(self):
+
+        buffer = TurnBuffer(10, n_spare=2)
+        reference = np.zeros(20, dtype=complex)
+        for turn in range(10):
+            buffer.advance()
+            reference[:10] = reference[-10:]
+            buffer.present[:] = turn + np.arange(10)
+            reference[-10:] = turn + np.arange(10)
+
+            np.testing.assert_array_equal(buffer.signal, reference)
+            np.testing.assert_array_equal(buffer.previous, reference[:10])
+
+    def test_attribute(self):
+
+        class Signals(object):
+            V = TurnBufferAttribute()
+
+        signals = Signals()
+        signals.V = TurnBuffer(10)
+        signals.V = np.arange(20)
+        self.assertIsInstance(signals.turn_buffers['V'], TurnBuffer)
+        signals.turn_buffers['V'].advance()
+
+        np.testing.assert_array_equal(signals.V[:10], np.arange(10, 20))
+
+    def test_wrong_spare_turns(self):
+
+        with self.assertRaises(RuntimeError):
+            TurnBuffer(10, n_spare=1)
+
+
+class TestFFTConvolution(unittest.TestCase):
+
+    # Run before every test
+    def setUp(self):
+
+        np.random.seed(1)
+        self.signal = np.random.randn(200) + 1j*np.random.randn(200)
+        self.kernel = np.random.randn(100) + 1j*np.random.randn(100)
+
+    def test_last_samples(self):
+
+        conv = FFTConvolution(200, 100)
+        reference = np.convolve(self.signal, self.kernel)[100:200]
+
+        np.testing.assert_allclose(
+            conv.convolve(self.signal, self.kernel), reference,
+            rtol=1e-10, atol=1e-12,
+            err_msg="In TestFFTConvolution, test_last_samples: arrays differ")
+        self.assertEqual(conv.n_fft, 200)
+
+    def test_long_kernel(self):
+
+        conv = FFTConvolution(100)
+        kernel = np.random.randn(300)
+
+        np.testing.assert_allclose(
+            conv.convolve(self.signal[:100], kernel),
+            np.convolve(self.signal[:100], kernel)[:100],
+            rtol=1e-10, atol=1e-12,
+            err_msg="In TestFFTConvolution, test_long_kernel: arrays differ")
+
+    def test_kernel_update(self):
+
+        conv = FFTConvolution(200, 100)
+        conv.convolve(self.signal, self.kernel)
+        spectrum = conv.kernel_spectrum
+        conv.convolve(2*self.signal, self.kernel.copy())
+        self.assertIs(conv.kernel_spectrum, spectrum)
+
+        # A kernel updated in place is detected
+        self.kernel *= 1j
+        np.testing.assert_allclose(
+            conv.convolve(self.signal, self.kernel),
+            np.convolve(self.signal, self.kernel)[100:200],
+            rtol=1e-10, atol=1e-12,
+            err_msg="In TestFFTConvolution, test_kernel_update: arrays differ")
+
+    def test_wrong_output_length(self):
+
+        with self.assertRaises(RuntimeError):
+            FFTConvolution(100, 101)
+
+
 class TestFeedforwardFilter(unittest.TestCase):
 
     # Run before every test
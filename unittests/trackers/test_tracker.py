@@ -15,13 +15,14 @@ Unittest for trackers.tracker.py
 
 import unittest
 import numpy as np
+from scipy.integrate import cumtrapz
 import matplotlib.pyplot as plt
 # import inspect
 
 from blond.utils import bmath as bm
 from blond.input_parameters.ring import Ring
 from blond.input_parameters.rf_parameters import RFStation
-from blond.trackers.tracker import RingAndRFTracker
+from blond.trackers.tracker import RingAndRFTracker, FullRingAndRF
 from blond.beam.beam import Beam, Proton
 from blond.beam.distributions import bigaussian
 from blond.beam.profile import CutOptions, FitOptions, Profile
@@ -250,6 +251,69 @@ class TestRfVoltageCalcWCavityFB(unittest.TestCase):
                 """Phi modulation not added correctly in tracker""")
 
 
+class TestPotentialWell(unittest.TestCase):
+
+    def setUp(self):
+        ring = Ring(6911.56, 1/17.95142852**2,
+                    np.linspace(25.92e9, 26e9, 11), Proton(), 10)
+        self.rf = RFStation(ring, [4620, 4*4620], [4.5e6, 0.45e6],
+                            [0.3, np.pi], n_rf=2)
+        self.tracker = RingAndRFTracker(self.rf, Beam(ring, 10, 1e11))
+        self.full_ring = FullRingAndRF([self.tracker])
+
+    def test_trapezoid(self):
+
+        # Same potential well as the numerical integral of the voltage
+        turn = 3
+        self.full_ring.potential_well_generation(turn=turn, n_points=int(1e5),
+                                                 dt_margin_percent=0.4)
+        time = self.full_ring.potential_well_coordinates
+        voltage = np.sum(self.rf.voltage[:, turn, np.newaxis] *
+                         np.sin(self.rf.omega_rf[:, turn, np.newaxis]*time +
+                                self.rf.phi_rf[:, turn, np.newaxis]), axis=0)
+        potential = - np.sign(self.rf.eta_0[turn]) * self.rf.Particle.charge \
+            / self.rf.t_rev[turn] * cumtrapz(
+                voltage + self.tracker.acceleration_kick[turn] /
+                abs(self.rf.Particle.charge), time, initial=0)
+        potential -= np.min(potential)
+        np.testing.assert_allclose(self.full_ring.potential_well, potential,
+                                   rtol=0, atol=1e-6*np.max(potential))
+        np.testing.assert_allclose(self.full_ring.total_voltage, voltage,
+                                   rtol=0, atol=1e-9*np.max(voltage))
+
+    def test_time_array(self):
+
+        # Analytic on any time array, e.g. not equally spaced
+        self.full_ring.potential_well_generation(n_points=1001)
+        time = self.full_ring.potential_well_coordinates
+        potential = self.full_ring.potential_well
+        indexes = np.unique(np.append(
+            np.round(np.linspace(0, 1, 200)**2 * 1000).astype(int),
+            np.argmin(potential)))
+        self.full_ring.potential_well_generation(time_array=time[indexes])
+        np.testing.assert_allclose(self.full_ring.potential_well,
+                                   potential[indexes], rtol=0,
+                                   atol=1e-12*np.max(potential))
+
+    def test_cache(self):
+
+        self.full_ring.potential_well_generation(turn=2, n_points=1000,
+                                                 cache=True)
+        potential = np.copy(self.full_ring.potential_well)
+        # Changing the output does not change the cached potential well
+        self.full_ring.potential_well += 1
+        self.full_ring.potential_well_generation(turn=2, n_points=1000,
+                                                 cache=True)
+        self.assertEqual(len(self.full_ring._potential_wells), 1)
+        np.testing.assert_array_equal(self.full_ring.potential_well,
+                                      potential)
+
+        self.rf.voltage[0, 2] *= 2
+        self.full_ring.potential_well_generation(turn=2, n_points=1000,
+                                                 cache=True)
+        self.assertEqual(len(self.full_ring._potential_wells), 2)
+
+
 if __name__ == '__main__':
 
     unittest.main()
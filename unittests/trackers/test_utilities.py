@@ -0,0 +1,290 @@
+# coding: utf8
+# Copyright 2014-2017 CERN. This software is distributed under the
+# terms of the GNU General Public Licence version 3 (GPL Version 3),
+# copied verbatim in the file LICENCE.md.
+# In applying this licence, CERN does not waive the privileges and immunities
+# granted to it by virtue of its status as an Intergovernmental Organization or
+# submit itself to any jurisdiction.
+# Project website: http://blond.web.cern.ch/
+
+"""
+Unittest for trackers.utilities
+
+"""
+
+import unittest
+import os
+import tempfile
+import numpy as np
+
+from blond.input_parameters.ring import Ring
+from blond.input_parameters.rf_parameters import RFStation
+from blond.beam.beam import Beam, Proton, Electron
+from blond.beam.distributions import bigaussian
+from blond.trackers.tracker import RingAndRFTracker, FullRingAndRF
+from blond.trackers.utilities import action_from_potential_well, \
+    synchrotron_frequency_distribution, synchrotron_frequency_tracker, \
+    BucketState, hamiltonian, separatrix, is_in_separatrix
+
+
+class TestActionFromPotentialWell(unittest.TestCase):
+
+    def test_harmonic_well(self):
+
+        # J = H / (2 sqrt(k eom_factor_dE)) for U = k t^2
+        time = np.linspace(-1, 1, 10001)
+        H = np.linspace(0, 2.9, 30)
+        J = action_from_potential_well(time, 3*time**2, H, 0.5)
+        np.testing.assert_allclose(J, H / (2*np.sqrt(1.5)), rtol=0,
+                                   atol=1e-8)
+
+    def test_frame_edge(self):
+
+        # Orbits leaving the frame are cut at its edges, with a lower accuracy
+        time = np.linspace(-1, 1, 10001)
+        J = action_from_potential_well(time, time**2, [4], 1)
+        self.assertAlmostEqual(J[0], (np.sqrt(3) + 4*np.arcsin(0.5))/np.pi,
+                               delta=1e-4)
+
+
+class TestSynchrotronFrequencyDistribution(unittest.TestCase):
+
+    def test_small_amplitude(self):
+
+        ring = Ring(6911.56, 1/17.95142852**2, 25.92e9, Proton(), 1)
+        rf = RFStation(ring, 4620, 4.5e6, 0)
+        beam = Beam(ring, 10000, 1e11)
+        full_ring = FullRingAndRF([RingAndRFTracker(rf, beam)])
+        bigaussian(ring, rf, beam, 0.5e-9, seed=1)
+
+        [fs_left, fs_right], [emittance_left, emittance_right], _, \
+            fs_particles, _ = synchrotron_frequency_distribution(beam,
+                                                                 full_ring)
+
+        fs0 = rf.omega_s0[0] / (2*np.pi)
+        self.assertAlmostEqual(fs_right[1] / fs0, 1, delta=1e-4)
+        self.assertAlmostEqual(fs_left[1] / fs0, 1, delta=1e-4)
+        # The frequency decreases with the amplitude in a single RF bucket
+        self.assertTrue(np.all(np.diff(fs_right[10:-1]) < 0))
+        self.assertTrue(np.all((fs_particles > 0) & (fs_particles <= fs0)))
+
+
+class TestSynchrotronFrequencyTracker(unittest.TestCase):
+
+    def setUp(self):
+        self.n_turns = 2000
+        self.ring = Ring(6911.56, 1/17.95142852**2, 25.92e9, Proton(),
+                         self.n_turns)
+        self.rf = RFStation(self.ring, 4620, 4.5e6, 0)
+        beam = Beam(self.ring, 10, 1e11)
+        self.full_ring = FullRingAndRF([RingAndRFTracker(self.rf, beam)])
+        # Particles in the bucket and the neighbouring one
+        self.theta_range = [-2*np.pi/4620*0.99, 2*np.pi/4620*0.99]
+
+    def track(self, **kwargs):
+        tracker = synchrotron_frequency_tracker(self.ring, 200,
+                                                self.theta_range,
+                                                self.full_ring, **kwargs)
+        for turn in range(self.n_turns):
+            tracker.track()
+        return tracker
+
+    def test_frequency(self):
+
+        tracker = self.track()
+        tracker.frequency_calculation(n_sampling=2**16)
+        frequency = np.copy(tracker.frequency_theta_save)
+
+        # Highest peak of the spectrum of each particle
+        for particle in [10, 120, 150]:
+            theta = tracker.theta_save[:, particle]
+            spectrum = np.abs(np.fft.rfft(theta - np.mean(theta), 2**16))
+            self.assertEqual(frequency[particle],
+                             tracker.frequency_array[np.argmax(spectrum)])
+        # Particles reaching the edges of the initial range are lost
+        self.assertEqual(frequency[0], 0)
+        self.assertEqual(frequency[-1], 0)
+
+        tracker.frequency_calculation(n_sampling=2**16, n_particles_block=7,
+                                      n_threads=3)
+        np.testing.assert_array_equal(tracker.frequency_theta_save,
+                                      frequency)
+
+        # Small amplitude particle at the centre of the bucket
+        tracker.frequency_calculation(n_sampling=2**16, interpolate_peak=True)
+        fs0 = self.rf.omega_s0[0] / (2*np.pi)
+        self.assertAlmostEqual(tracker.frequency_theta_save[150] / fs0, 1,
+                               delta=1e-3)
+        self.assertAlmostEqual(tracker.frequency_dE_save[150] / fs0, 1,
+                               delta=1e-3)
+
+    def test_online(self):
+
+        tracker = synchrotron_frequency_tracker(self.ring, 200,
+                                                self.theta_range,
+                                                self.full_ring)
+        for turn in range(1000):
+            tracker.track()
+        tracker.frequency_calculation(n_sampling=2**16,
+                                      start_turn=tracker.counter + 1 - 500)
+        frequency = np.copy(tracker.frequency_theta_save)
+
+        tracker_end = self.track()
+        tracker_end.frequency_calculation(n_sampling=2**16, start_turn=501,
+                                          end_turn=1001)
+        np.testing.assert_array_equal(tracker_end.frequency_theta_save,
+                                      frequency)
+
+    def test_save_file(self):
+
+        tracker = self.track()
+        with tempfile.TemporaryDirectory() as folder:
+            save_file = os.path.join(folder, 'tracker')
+            tracker_file = self.track(save_file=save_file,
+                                      save_dtype=np.float32)
+            np.testing.assert_array_equal(
+                np.load(save_file + '_theta.npy', mmap_mode='r'),
+                tracker.theta_save.astype(np.float32))
+
+            tracker.frequency_calculation(n_sampling=2**16)
+            tracker_file.frequency_calculation(n_sampling=2**16)
+            np.testing.assert_allclose(tracker_file.frequency_theta_save,
+                                       tracker.frequency_theta_save,
+                                       rtol=0, atol=tracker.frequency_array[1])
+            del tracker_file
+
+
+class TestBucketState(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = Ring(6911.56, 1/17.95142852**2, 25.92e9, Proton(), 1)
+        self.beam = Beam(self.ring, 10, 1e11)
+        rng = np.random.default_rng(1)
+        self.dt = rng.uniform(-2.5e-9, 5e-9, 100000)
+        self.dE = rng.uniform(-5e8, 5e8, 100000)
+
+    def test_single_rf(self):
+
+        rf = RFStation(self.ring, 4620, 4.5e6, 0)
+        bucket = BucketState(self.ring, rf, self.beam)
+        H = hamiltonian(self.ring, rf, self.beam, self.dt, self.dE)
+        np.testing.assert_allclose(bucket.hamiltonian(self.dt, self.dE), H,
+                                   rtol=0, atol=1e-12*np.max(np.abs(H)))
+
+        inside = bucket.is_in_separatrix(self.dt, self.dE)
+        np.testing.assert_array_equal(inside, np.abs(H) < abs(bucket.H_sep))
+        self.assertEqual(bucket.n_in_separatrix(self.dt, self.dE),
+                         np.sum(inside))
+        np.testing.assert_array_equal(
+            is_in_separatrix(self.ring, rf, self.beam, self.dt, self.dE),
+            inside)
+
+        # Bucket height at the synchronous phase, zero at the unstable fixed
+        # point
+        height = np.sqrt(2*rf.beta[0]**2*rf.energy[0]*rf.voltage[0, 0]
+                         / (np.pi*rf.harmonic[0, 0]*abs(rf.eta_0[0])))
+        dt_s = rf.phi_s[0] / rf.omega_rf[0, 0]
+        self.assertAlmostEqual(bucket.separatrix(dt_s) / height, 1,
+                               delta=1e-12)
+        self.assertAlmostEqual(bucket.separatrix(bucket.dt_ufp) / height, 0,
+                               delta=1e-6)
+        self.assertAlmostEqual(bucket.hamiltonian(bucket.dt_ufp, 0)
+                               / bucket.H_sep, 1, delta=1e-12)
+
+    def test_negative_charge(self):
+
+        ring = Ring(110.4, 0.0082, 2.5e9, Electron(),
+                    synchronous_data_type='total energy')
+        rf = RFStation(ring, 184, 800e3, 0)
+        beam = Beam(ring, 10000, 1e9)
+        bigaussian(ring, rf, beam, 30e-12, seed=1, reinsertion=True)
+        beam.losses_separatrix(ring, rf)
+        self.assertTrue(np.all(beam.id > 0))
+
+        # Same particles inside as from the Hamiltonian of the separatrix
+        dt = np.linspace(0, 2*np.pi/rf.omega_rf[0, 0], 1001)
+        dE = np.linspace(-2e7, 2e7, 1001)
+        dt_sep = (np.pi - rf.phi_s[0] - rf.phi_rf_d[0, 0])/rf.omega_rf[0, 0]
+        H_sep = hamiltonian(ring, rf, beam, dt_sep, 0)
+        np.testing.assert_array_equal(
+            is_in_separatrix(ring, rf, beam, dt, dE),
+            np.abs(hamiltonian(ring, rf, beam, dt, dE)) < abs(H_sep))
+
+    def numpy_separatrix(self, ring, rf, dt):
+
+        # Previous implementation of separatrix(), at the first turn
+        voltage = ring.Particle.charge*rf.voltage[:, 0]
+        omega_rf = rf.omega_rf[:, 0]
+        phi_rf = rf.phi_rf[:, 0]
+        eta_0 = rf.eta_0[0]
+        delta_E = rf.delta_E[0]
+        T_rf_0 = 2*np.pi/omega_rf[0]
+
+        if eta_0 < 0:
+            dt = dt - T_rf_0*np.floor((dt + (phi_rf[0] - np.pi)/omega_rf[0])
+                                      / T_rf_0)
+        else:
+            dt = dt - T_rf_0*np.floor((dt + phi_rf[0]/omega_rf[0]) / T_rf_0)
+
+        dt_ufp = np.linspace(-float(phi_rf[0]/omega_rf[0] - T_rf_0/1000),
+                             float(T_rf_0 - phi_rf[0]/omega_rf[0]
+                                   + T_rf_0/1000), 1002)
+        if eta_0 < 0:
+            dt_ufp += 0.5*T_rf_0
+        Vtot = np.zeros(len(dt_ufp))
+        for i in range(rf.n_rf):
+            Vtot += voltage[i]*np.sin(omega_rf[i]*dt_ufp + phi_rf[i])
+        Vtot -= delta_E
+
+        zero_crossings = np.where(np.diff(np.sign(Vtot)))[0]
+        if eta_0 < 0:
+            i = -1
+            ind = zero_crossings[i]
+            while (Vtot[ind+1] - Vtot[ind]) > 0:
+                i -= 1
+                ind = zero_crossings[i]
+        else:
+            i = 0
+            ind = zero_crossings[i]
+            while (Vtot[ind+1] - Vtot[ind]) < 0:
+                i += 1
+                ind = zero_crossings[i]
+        dt_ufp = dt_ufp[ind] + Vtot[ind]/(Vtot[ind] - Vtot[ind+1]) * \
+            (dt_ufp[ind+1] - dt_ufp[ind])
+
+        Vtot = np.zeros(len(dt))
+        for i in range(rf.n_rf):
+            Vtot += voltage[i]*(np.cos(omega_rf[i]*dt_ufp + phi_rf[i]) -
+                                np.cos(omega_rf[i]*dt + phi_rf[i]))/omega_rf[i]
+        separatrix_sq = 2*rf.beta[0]**2*rf.energy[0]/(eta_0*ring.t_rev[0]) \
+            * (Vtot + delta_E*(dt_ufp - dt))
+        separatrix_array = np.full(len(dt), np.nan)
+        separatrix_array[separatrix_sq >= 0] = \
+            np.sqrt(separatrix_sq[separatrix_sq >= 0])
+        return separatrix_array
+
+    def test_double_rf(self):
+
+        # Above and below transition
+        for momentum in [25.92e9, 10e9]:
+            ring = Ring(6911.56, 1/17.95142852**2, momentum, Proton(), 1)
+            rf = RFStation(ring, [4620, 4*4620], [4.5e6, 0.45e6],
+                           [0, np.pi], 2)
+            bucket = BucketState(ring, rf)
+            dE_sep = self.numpy_separatrix(ring, rf, self.dt)
+            self.assertGreater(np.sum(np.isfinite(dE_sep)), 1000)
+            np.testing.assert_array_equal(np.isnan(dE_sep),
+                                          np.isnan(bucket.separatrix(self.dt)))
+            np.testing.assert_allclose(bucket.separatrix(self.dt), dE_sep,
+                                       rtol=0, atol=1e-6*np.nanmax(dE_sep))
+            np.testing.assert_array_equal(separatrix(ring, rf, self.dt),
+                                          bucket.separatrix(self.dt))
+
+        self.assertEqual(bucket.separatrix(self.dt.reshape(100, -1)).shape,
+                         (100, 1000))
+        with self.assertRaises(RuntimeError):
+            bucket.hamiltonian(self.dt, self.dE)
+
+if __name__ == '__main__':
+
+    unittest.main()
@@ -610,6 +610,64 @@ class TestCumTrapz(unittest.TestCase):
                                        decimal=8)
 
 
+class TestAbelTransform(unittest.TestCase):
+
+    def test_abel_transform_1(self):
+        # Line density (1-x^2)^(3/2) in the potential x^2, for x in [-1, 0]:
+        # the distribution function is proportional to 1-H
+        x = np.linspace(-1, 0, 1001)
+        f = -3 * x * np.sqrt(1 - x**2)
+        result = bm.abel_transform(x**2, f, dx=x[1]-x[0])
+
+        np.testing.assert_allclose(result, 3*np.pi/4 * (1 - x**2),
+                                   rtol=0, atol=2e-3)
+
+    def test_abel_transform_2(self):
+        potential = np.random.rand(50)[::-1].cumsum()[::-1]
+        f = np.random.randn(50)
+        result = bm.abel_transform(potential, f, dx=0.1)
+
+        # Trapezoid rule up to the last interval, which is integrated
+        # analytically
+        for i in [2, 10, 49]:
+            integrand = f[:i] / np.sqrt(potential[:i] - potential[i])
+            last = (4*f[i] + 2*f[i-1]) / 3 / np.sqrt(potential[i-1]
+                                                     - potential[i])
+            np.testing.assert_almost_equal(
+                result[i], np.trapz(integrand, dx=0.1) + 0.1*last, decimal=8)
+
+
+class TestPhilox(unittest.TestCase):
+
+    def test_known_answers(self):
+        # Known-answer vectors of Philox4x32-10 from Random123
+        vectors = [
+            ([0, 0, 0, 0], [0, 0],
+             [0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8]),
+            ([0xffffffff]*4, [0xffffffff]*2,
+             [0x408f276d, 0x41c83b0e, 0xa20bc7c6, 0x6d5451fd]),
+            ([0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344],
+             [0xa4093822, 0x299f31d0],
+             [0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1])]
+
+        for ctr, key, result in vectors:
+            np.testing.assert_array_equal(bm.philox4x32_10(ctr, key),
+                                          np.array(result, dtype=np.uint32))
+
+    def test_uniform(self):
+        # Uniform numbers from the Philox block (first + i, stream) with the
+        # 64-bit seed as key
+        seed = 0x299f31d0a4093822
+        u1, u2 = bm.philox_uniform(3, seed, first=5, stream=2)
+        for i in range(3):
+            block = bm.philox4x32_10([5 + i, 0, 2, 0],
+                                     [seed & 0xffffffff, seed >> 32])
+            self.assertEqual(u1[i], ((block[0] >> 5) * 2.**26 + (block[1] >> 6)
+                                     + 0.5) * 2.**-53)
+            self.assertEqual(u2[i], ((block[2] >> 5) * 2.**26 + (block[3] >> 6)
+                                     + 0.5) * 2.**-53)
+
+
 class TestSort(unittest.TestCase):
 
     # Run before every test